@@ -0,0 +1,78 @@
+"""
+Handle table commands per mesh send.
+
+Sends a skewed stream of packets (node *i* is picked with weight
+1 / (i + 1)) to fleets of several sizes, and counts the serial commands
+the :class:`~ttgwlib.dev_manager.HandleManager` sends to add and remove
+device keys and addresses. The device is simulated, rejecting device
+keys once its table is full.
+
+    python benchmarks/handle_cache.py [sends]
+
+"""
+import os
+import sys
+import random
+import struct
+import collections
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ttgwlib.dev_manager import HandleManager
+
+
+class SimulatedTables:
+    """ Answers the handle table commands, like the device manager. """
+    STATUS_REJECTED = 0x8E
+
+    def __init__(self, devkey_limit):
+        self.devkey_limit = devkey_limit
+        self.devkeys = set()
+        self.handle = 0
+        self.commands = collections.Counter()
+
+    def send_cmd_wait_rsp(self, cmd, timeout=None):
+        name = type(cmd).__name__
+        self.commands[name] += 1
+        if name == "DevkeyAdd" and len(self.devkeys) >= self.devkey_limit:
+            return {"result": self.STATUS_REJECTED, "rsp_data": b""}
+        if name == "DevkeyDelete":
+            self.devkeys.discard(struct.unpack_from("<H",
+                cmd.serialize(), 2)[0])
+        self.handle += 1
+        if name == "DevkeyAdd":
+            self.devkeys.add(self.handle)
+        return {"result": 0, "rsp_data": struct.pack("<H", self.handle)}
+
+
+class Node:
+    def __init__(self, address):
+        self.unicast_addr = address
+        self.devkey = address.to_bytes(16, "big")
+        self.netkey_index = 0
+
+
+def run(fleet, sends, max_devkeys=None, devkey_limit=10):
+    rnd = random.Random(1)
+    nodes = [Node(100 + i) for i in range(fleet)]
+    weights = [1 / (i + 1) for i in range(fleet)]
+    tables = SimulatedTables(devkey_limit)
+    handles = HandleManager(tables, max_devkeys=max_devkeys)
+    for node in rnd.choices(nodes, weights, k=sends):
+        handles.get_devkey_handle(node)
+        handles.get_address_handle(node.unicast_addr)
+    return sum(tables.commands.values()) / sends, dict(tables.commands)
+
+
+def main():
+    sends = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for fleet in (12, 40, 200):
+        per_send, commands = run(fleet, sends)
+        print(f"fleet {fleet:3d}: {per_send:.3f} commands/send {commands}")
+    per_send, commands = run(40, sends, max_devkeys=32)
+    print(f"fleet  40, max_devkeys 32 on a 10 key device: {per_send:.3f} "
+        f"commands/send {commands}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Model message decode cost.
+
+Measures, for a set of common opcodes, the time to build the model event
+and read its data, and the size of the data object. The mesh header
+parse is measured on its own.
+
+    python benchmarks/model_decode.py [runs]
+
+"""
+import os
+import sys
+import struct
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ttgwlib.events import model_events
+
+
+HEADER = struct.pack("<HHHHBB6sbHI", 120, 1, 0, 0, 5, 0, bytes(range(6)),
+    -60, 10, 777)
+
+CASES = {
+    "TempData": b"\x10\x09\x32\x01\x02\x03\x07",
+    "IaqData": b"\x01\x02\x00\x03\x04\x00\x05",
+    "Co2Data": b"\x90\x01\x01\x10\x00\x05",
+    "BatData": b"\x10\x0e\x03",
+    "WakeNotify": b"\x03\x01",
+    "TaskAck": b"\x01\x02",
+    "TaskData": b"\x05\x01\x02\x03\x04\x10\x0e\x00",
+    "RssiNeighbrData": b"\x78\x00\xc4",
+    "WakeAckWait": b"",
+    "PwmtData": bytes([0b0101]) + b"\x10\x00\x20\x00\x30\x00",
+}
+
+
+def parse_header(data):
+    header = model_events.MESH_HEADER.unpack_from(data)
+    return model_events.MeshHeader._make(header[:6] + (header[6][::-1],)
+        + header[7:])
+
+
+def best(function, runs):
+    times = timeit.repeat(function, number=runs, repeat=5)
+    return min(times) / runs * 1e9
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    header = parse_header(HEADER)
+    for name, raw in CASES.items():
+        event_class = getattr(model_events, name)
+        elapsed = best(lambda: event_class(header, raw, None, None).data,
+            runs)
+        size = sys.getsizeof(event_class(header, raw, None, None).data)
+        print(f"{name:16s} {elapsed:6.0f} ns  ({size} B)")
+    elapsed = best(lambda: parse_header(HEADER), runs)
+    print(f"{'Mesh header':16s} {elapsed:6.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
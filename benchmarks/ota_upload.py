@@ -0,0 +1,84 @@
+"""
+OTA image upload time.
+
+Uploads a random image with :func:`~ttgwlib.ota_helper.OtaHelper.copy_update`
+through a :class:`~ttgwlib.uart.Uart` connected to a pseudo terminal, and
+measures the time until every byte has been written, and the number of
+serial writes. It is run with the default block size and with the data
+credit of a nRF52 device.
+
+    python benchmarks/ota_upload.py [image size in KiB]
+
+"""
+import os
+import pty
+import sys
+import time
+import random
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ttgwlib import uart as uart_module
+from ttgwlib.ota_helper import OtaHelper
+
+
+class CountingSerial(uart_module.serial.Serial):
+    writes = 0
+
+    def write(self, b):
+        CountingSerial.writes += 1
+        return super().write(b)
+
+
+class SentBytes:
+    """ Forwards the messages to the uart, counting their bytes. """
+    def __init__(self, uart):
+        self.uart = uart
+        self.size = 0
+
+    def send_msg(self, msg):
+        self.size += len(msg)
+        self.uart.send_msg(msg)
+
+
+def run(image, chunk_size):
+    master, slave = pty.openpty()
+    os.set_blocking(master, True)
+    uart_module.serial.Serial = CountingSerial
+    uart = uart_module.Uart(os.ttyname(slave))
+    uart.set_tx_chunk_size(chunk_size)
+    CountingSerial.writes = 0
+    sender = SentBytes(uart)
+
+    start = time.perf_counter()
+    OtaHelper(sender).copy_update(image, "00" * 64)
+    received = 0
+    while received < sender.size:
+        received += len(os.read(master, 65536))
+    elapsed = time.perf_counter() - start
+    writes = CountingSerial.writes
+    uart.stop()
+    time.sleep(1.2)
+    os.close(master)
+    os.close(slave)
+    return elapsed, writes, received
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    image = {0x27000 + i: random.randrange(256) for i in range(size * 1024)}
+    original = uart_module.serial.Serial
+    try:
+        for name, chunk_size in (("40 byte blocks", 40),
+                ("255 byte credit", 255)):
+            elapsed, writes, received = min(run(image, chunk_size)
+                for _ in range(3))
+            print(f"{name:16s} {size} KiB image, {received} bytes: "
+                f"{elapsed:.3f} s, {writes} writes")
+    finally:
+        uart_module.serial.Serial = original
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Wake up reply latency under a transport flood.
+
+Runs a simulated fleet whose nodes wake up every 2 seconds, while the
+application floods every node and a group address with messages, and
+prints the queue time of each traffic class, from the
+:class:`~ttgwlib.tx_manager.FairQueue` counters.
+
+    python benchmarks/tx_fairness.py [seconds] [nodes]
+
+"""
+import os
+import sys
+import time
+import logging
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ttgwlib import Gateway, Config, NodeDatabase
+from ttgwlib.platform.simulator import SimulatedDevice
+
+
+class SimulatedNodes(NodeDatabase):
+    def __init__(self, device):
+        self.nodes = {n.unicast_addr: n.node for n in device.nodes}
+
+    def get_address(self):
+        return 1
+
+    def get_netkey(self):
+        return bytes(16)
+
+    def get_nodes(self):
+        return list(self.nodes.values())
+
+    def get_node_by_address(self, address):
+        return self.nodes.get(address)
+
+    def get_node_by_mac(self, mac):
+        return None
+
+    def store_node(self, node):
+        pass
+
+    def remove_node(self, node):
+        pass
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    logging.basicConfig(level=logging.ERROR)
+    device = SimulatedDevice(count, sleep_period=2, data_period=600)
+    gw = Gateway()
+    gw.init(Config(SimulatedNodes(device), "simulator", device,
+        seq_number_file="/tmp/tx_fairness.seq"))
+    for node in device.nodes:
+        gw.add_node_to_whitelist(node.node)
+
+    running = True
+
+    def flood():
+        while running:
+            for _ in range(5):
+                for node in device.nodes:
+                    gw.send_msg(node.unicast_addr, bytes(4))
+            gw.send_msg(0xC000, bytes(500))
+            time.sleep(0.5)
+
+    threading.Thread(target=flood, daemon=True).start()
+    time.sleep(duration)
+    running = False
+
+    stats = gw.tx_manager.get_stats()
+    for name, counters in stats.pop("classes").items():
+        print(f"{name:5s} sent {counters['sent']:6d}, "
+            f"expired {counters['expired']:4d}, "
+            f"queued {counters['queued']:5d}: "
+            f"avg {counters['latency_avg'] * 1000:7.1f} ms, "
+            f"max {counters['latency_max'] * 1000:7.1f} ms")
+    print(f"window {stats['window']}, completed {stats['completed']}, "
+        f"reclaimed {stats['reclaimed']}")
+    gw.close()
+
+
+if __name__ == "__main__":
+    main()
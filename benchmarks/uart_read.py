@@ -0,0 +1,71 @@
+"""
+Serial reader throughput.
+
+Writes a burst of frames into a pseudo terminal and measures how fast the
+:class:`~ttgwlib.uart.Uart` reader splits them into frames, read with
+``get_frame``, and with the ``get_byte`` compatibility path.
+
+    python benchmarks/uart_read.py [frames] [frame size]
+
+"""
+import os
+import pty
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ttgwlib.uart import Uart
+from ttgwlib.frame_buffer import START_FRAME
+
+
+def make_frames(count, size):
+    payload = bytes(range(size - 2))
+    frame = bytes([size - 1, 0x82]) + payload
+    return START_FRAME + bytes(2) + frame * count
+
+
+def run(count, size, by_byte):
+    master, slave = pty.openpty()
+    os.set_blocking(master, True)
+    uart = Uart(os.ttyname(slave))
+    data = make_frames(count, size)
+
+    def writer():
+        view = memoryview(data)
+        while view:
+            written = os.write(master, view[:4096])
+            view = view[written:]
+
+    start = time.perf_counter()
+    threading.Thread(target=writer, daemon=True).start()
+    uart.get_frame(5) # Start frame
+    frames = 0
+    if by_byte:
+        received = 0
+        while received < count * size and uart.get_byte(5):
+            received += 1
+        frames = received // size
+    else:
+        while frames < count and uart.get_frame(5):
+            frames += 1
+    elapsed = time.perf_counter() - start
+    uart.stop()
+    time.sleep(1.2)
+    os.close(master)
+    os.close(slave)
+    return frames, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    for name, by_byte in (("get_frame", False), ("get_byte", True)):
+        frames, elapsed = run(count, size, by_byte)
+        print(f"{name:10s} {frames} frames of {size} bytes in "
+            f"{elapsed:.3f} s: {frames / elapsed:,.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ TTGWLib
 
 # Imports
 from .gateway import Gateway
+from .async_gateway import AsyncGateway
 from .config import Config, ConfigPassthrough
 from .platform.exception import GatewayError
 from .node import Node
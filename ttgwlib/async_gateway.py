@@ -0,0 +1,385 @@
+"""
+:mod:`~ttgwlib.async_gateway`
+===============================
+
+This module contains the class :class:`AsyncGateway`, an asyncio facade of
+:class:`~ttgwlib.gateway.Gateway`. The uart, the event parser and the event
+handler run in the asyncio event loop, so the event handlers are called in
+the loop thread, and the node operations return awaitables that are
+resolved when the node acknowledges them.
+
+Some parts of the gateway still run in their own threads, and talk to
+the loop through thread safe calls:
+
+* The :class:`~ttgwlib.tx_manager.TxManager` thread, which sends the mesh
+  packets and adds the node handles to the microcontroller, waiting for
+  its responses.
+* The microcontroller start up, in a thread of the
+  :class:`~ttgwlib.dev_manager.DeviceManager`.
+* The :class:`~ttgwlib.seq_number_store.SeqNumberStore` writer thread.
+* The :class:`~ttgwlib.events.scheduler.TimerScheduler` thread, unless a
+  virtual clock is configured.
+
+The command responses those threads wait for are dispatched by the loop,
+so the gateway functions that wait for the microcontroller must not be
+called from the loop thread: they are run in an executor by the
+coroutines of :class:`AsyncGateway` (:func:`AsyncGateway.init`,
+:func:`AsyncGateway.close`, :func:`AsyncGateway.reset` and
+:func:`AsyncGateway.check_connection`).
+"""
+import asyncio
+
+from ttgwlib.gateway import Gateway
+from ttgwlib.events.event import EventType
+from ttgwlib.platform.exception import GatewayError
+
+
+class AsyncGateway:
+    """ Asyncio version of :class:`~ttgwlib.gateway.Gateway`.
+
+    The node operations (:func:`set_rate`, :func:`ping_to_node`,
+    :func:`get_node_tasks`, etc.) are coroutines that return the ACK event
+    sent by the node. As low power nodes only receive messages when they
+    wake up, they may take as long as the node sleep period. A timeout, in
+    seconds, can be given to every operation; if it expires,
+    :class:`asyncio.TimeoutError` is raised.
+
+    Any other gateway function that does not wait for the microcontroller
+    can be called directly on the wrapped :attr:`gateway`, from the event
+    loop thread. Waiting there would block the dispatch of the response
+    being waited for; see the module documentation.
+
+    :ivar gateway: Wrapped gateway.
+    :vartype gateway: :class:`~ttgwlib.gateway.Gateway`
+    """
+    def __init__(self):
+        self.gateway = Gateway()
+        self.loop = None
+        self.waiters = [] # List[(node, event_types, future)]
+        self.handlers = {} # Dict[handler, wrapper]
+
+    async def init(self, config):
+        """ Initializes the gateway in the running event loop. See
+        :func:`~ttgwlib.gateway.Gateway.init`.
+
+        :param config: Gateway library configuration.
+        :type: :class:`~ttgwlib.config.Config`
+        """
+        self.loop = asyncio.get_running_loop()
+        self.gateway.loop = self.loop
+        # Flashing and starting the device block, so they are done outside
+        # the loop, which keeps dispatching the device events meanwhile
+        await self.loop.run_in_executor(None, self.gateway.init, config)
+        self.gateway.add_event_handler(self.ack_handler)
+
+    async def close(self):
+        """ Stops the microcontroller. See
+        :func:`~ttgwlib.gateway.Gateway.close`.
+        """
+        # Stopping waits for the microcontroller responses and the
+        # background threads, so it is done outside the loop
+        await self.loop.run_in_executor(None, self.gateway.close)
+        for _, _, future in self.waiters:
+            future.cancel()
+
+    async def reset(self):
+        """ Resets the microcontroller. """
+        await self.loop.run_in_executor(None, self.gateway.reset)
+
+    async def check_connection(self):
+        """ Checks the uart connection with the microcontroller.
+
+        :return: True if the connection is alive, false otherwise.
+        :rtype: bool
+        """
+        return await self.loop.run_in_executor(None,
+            self.gateway.check_connection)
+
+    def add_event_handler(self, handler, event_types=None, node=None):
+        """ Adds an event handler, called in the event loop thread for every
+        event. It can be a function or a coroutine function; coroutines are
+        scheduled as new tasks. See
+        :func:`~ttgwlib.gateway.Gateway.add_event_handler` for the filters.
+
+        :param handler: Handler to be added.
+        :type handler: Callable
+        :param event_types: Event types to process. Optional, defaults to
+            every event type.
+        :type event_types: iterable of
+            :class:`~ttgwlib.events.event.EventType`
+        :param node: Node whose events are processed. Optional, defaults to
+            every event.
+        :type node: :class:`~ttgwlib.node.Node`
+        """
+        if asyncio.iscoroutinefunction(handler):
+            def wrapper(event):
+                self.loop.create_task(handler(event))
+        else:
+            wrapper = handler
+        if handler in self.handlers:
+            self.gateway.remove_event_handler(self.handlers[handler])
+        self.handlers[handler] = wrapper
+        self.gateway.add_event_handler(wrapper, event_types, node)
+
+    def remove_event_handler(self, handler):
+        """ Removes a previosly added event handler.
+
+        :param handler: Handler to be removed.
+        :type handler: Callable
+        """
+        wrapper = self.handlers.pop(handler, None)
+        if wrapper is not None:
+            self.gateway.remove_event_handler(wrapper)
+
+    def ack_handler(self, event):
+        # Waiters are resolved in order, one per event
+        for node, event_types, future in self.waiters:
+            if (event.event_type in event_types and event.node == node
+                    and not future.done()):
+                future.set_result(event)
+                return
+
+    async def _request(self, node, event_types, function, *args,
+            timeout=None):
+        if self.gateway.is_listener() or self.gateway.is_provisioner_mode():
+            raise GatewayError("Nodes can not be managed in listener or " +
+                "provisioner mode")
+        future = self.loop.create_future()
+        waiter = (node, event_types, future)
+        self.waiters.append(waiter)
+        try:
+            # Each request waits for its own acknowledgement
+            with self.gateway.models.task_queue.no_coalescing():
+                function(node, *args)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.waiters.remove(waiter)
+
+    async def ping_to_node(self, node, timeout=None):
+        """ Sends a ping to the given node.
+
+        :param node: Node to ping.
+        :type node: :class:`~ttgwlib.node.Node`
+        :param timeout: Maximum time to wait, in seconds. Optional.
+        :type timeout: float
+
+        :return: Ping ACK event.
+        :rtype: :class:`~ttgwlib.events.event.Event`
+        """
+        return await self._request(node, (EventType.RSSI_PING_ACK,),
+            self.gateway.ping_to_node, timeout=timeout)
+
+    async def get_neighbr_rssi(self, node, timeout=None):
+        """ Requests the neighbour rssi messages of the given node. """
+        return await self._request(node, (EventType.RSSI_NEIGHBR_ACK,),
+            self.gateway.get_neighbr_rssi, timeout=timeout)
+
+    async def get_status_rssi(self, node, timeout=None):
+        """ Requests the rssi mean of the given node.
+
+        :return: Rssi status event, with the mean in its rssi field.
+        :rtype: :class:`~ttgwlib.events.event.Event`
+        """
+        return await self._request(node, (EventType.RSSI_STATUS_ACK,),
+            self.gateway.get_status_rssi, timeout=timeout)
+
+    async def get_node_tasks(self, node, timeout=None):
+        """ Requests the active tasks of the given node. The tasks are
+        received as TASK_SEND_TASKS events before the returned ACK.
+        """
+        return await self._request(node, (EventType.TASK_GET_TASKS_ACK,),
+            self.gateway.get_node_tasks, timeout=timeout)
+
+    async def get_node_selftest(self, node, timeout=None):
+        """ Requests the selftest of the given node. The result is received
+        as a HWM_DATA event.
+        """
+        return await self._request(node, (EventType.HWM_ACK,),
+            self.gateway.get_node_selftest, timeout=timeout)
+
+    async def get_node_ota_status(self, node, timeout=None):
+        """ Requests the ota status of the given node.
+
+        :return: Ota status event, with the status in its status field.
+        :rtype: :class:`~ttgwlib.events.event.Event`
+        """
+        return await self._request(node, (EventType.OTA_STATUS_ACK,),
+            self.gateway.get_node_ota_status, timeout=timeout)
+
+    async def reset_node(self, node, timeout=None):
+        """ Resets a node, and removes it from the Mesh. """
+        return await self._request(node, (EventType.NODE_RESET,),
+            self.gateway.reset_node, timeout=timeout)
+
+    async def set_rate(self, node, rate, timeout=None):
+        """ Changes the NRFTemp model sending rate of the given node.
+
+        :param node: Node whose rate is to be changed.
+        :type node: :class:`~ttgwlib.node.Node`
+        :param rate: New sending rate, in seconds.
+        :type rate: integer
+        :param timeout: Maximum time to wait, in seconds. Optional.
+        :type timeout: float
+
+        :return: Task change ACK event.
+        :rtype: :class:`~ttgwlib.events.event.Event`
+        """
+        return await self._request(node, (EventType.TASK_CHANGE_ACK,),
+            self.gateway.set_rate, rate, timeout=timeout)
+
+    async def set_rate_legacy(self, node, rate, timeout=None):
+        """ Changes the NRFTemp model sending rate of the given node
+        (legacy).
+        """
+        return await self._request(node, (EventType.TASK_ACK,),
+            self.gateway.set_rate_legacy, rate, timeout=timeout)
+
+    async def set_iaq_rate(self, node, rate, timeout=None):
+        """ Changes the NRFTemp model sending IAQ rate of the given node. """
+        return await self._request(node, (EventType.TASK_CHANGE_ACK,),
+            self.gateway.set_iaq_rate, rate, timeout=timeout)
+
+    async def set_co2_rate(self, node, rate, timeout=None):
+        """ Changes the NRFTemp model sending CO2 rate of the given node. """
+        return await self._request(node, (EventType.TASK_CHANGE_ACK,),
+            self.gateway.set_co2_rate, rate, timeout=timeout)
+
+    async def set_pwmt_rate(self, node, rate, timeout=None):
+        """ Changes the pwmt model sending rate of the given node. """
+        return await self._request(node, (EventType.TASK_CHANGE_ACK,),
+            self.gateway.set_pwmt_rate, rate, timeout=timeout)
+
+    async def set_ia(self, node, status, skip, timeout=None):
+        """ Changes the NRFTemp model intelligence config of the given node.
+
+        :raises ValueError: Incorrect parameter value.
+        """
+        return await self._request(node, (EventType.IA_ACK,),
+            self.gateway.set_ia, status, skip, timeout=timeout)
+
+    async def set_temp_mode(self, node, mode, timeout=None):
+        """ Changes the NRFTemp model sensor mode of the given node.
+
+        :raises ValueError: Incorrect parameter value.
+        """
+        return await self._request(node, (EventType.TEMP_CONFIG_ACK,),
+            self.gateway.set_temp_mode, mode, timeout=timeout)
+
+    async def set_calibration(self, node, temp_offset, humd_offset,
+            press_offset, timeout=None):
+        """ Changes the NRFTemp model calibration of the given node. """
+        return await self._request(node, (EventType.TEMP_CALIB_ACK,),
+            self.gateway.set_calibration, temp_offset, humd_offset,
+            press_offset, timeout=timeout)
+
+    async def reset_calibration(self, node, temp, humd, press, timeout=None):
+        """ Resets the NRFTemp model calibration of the given node. """
+        return await self._request(node, (EventType.TEMP_CALIB_RESET_ACK,),
+            self.gateway.reset_calibration, temp, humd, press,
+            timeout=timeout)
+
+    async def set_pwmt_conf(self, node, phases, stats, values_ph, values_tot,
+            timeout=None):
+        """ Changes the pwmt model config of the given node. Returns None
+        if the node is not a power meter.
+
+        :raises ValueError: Incorrect parameter value.
+        """
+        if not node.is_power_meter():
+            return None
+        return await self._request(node, (EventType.PWMT_CONFIG_ACK,),
+            self.gateway.set_pwmt_conf, phases, stats, values_ph, values_tot,
+            timeout=timeout)
+
+    async def set_pwmt_conv(self, node, kv, ki, timeout=None):
+        """ Changes the pwmt channels conversion factor of the given node.
+        Returns None if the node is not a power meter.
+
+        :raises ValueError: Incorrect parameter value.
+        """
+        if not node.is_power_meter():
+            return None
+        return await self._request(node, (EventType.PWMT_CONV_ACK,),
+            self.gateway.set_pwmt_conv, kv, ki, timeout=timeout)
+
+    async def set_dac_output(self, node, value, timeout=None):
+        """ Sets the DAC output of the given node. """
+        return await self._request(node, (EventType.OUTPUT_DAC_ACK,),
+            self.gateway.set_dac_output, value, timeout=timeout)
+
+    async def set_digital_output(self, node, status, timeout=None):
+        """ Sets the digital output of the given node. """
+        return await self._request(node, (EventType.OUTPUT_DIG_ACK,),
+            self.gateway.set_digital_output, status, timeout=timeout)
+
+    async def set_accel(self, node, state, timeout=None):
+        """ Changes the Tap model accelerometer state of the given node.
+
+        :raises ValueError: Incorrect parameter value.
+        """
+        return await self._request(node, (EventType.TAP_ACK_CONF,),
+            self.gateway.set_accel, state, timeout=timeout)
+
+    async def set_led(self, node, color, timeout=None):
+        """ Sets a LED for Light model of the given node.
+
+        :raises ValueError: Incorrect parameter value.
+        """
+        return await self._request(node, (EventType.LIGHT_ACK,),
+            self.gateway.set_led, color, timeout=timeout)
+
+    async def set_power(self, node, radio_power, dcdc_mode, timeout=None):
+        """ Changes the Power configuration of the given node.
+
+        :raises ValueError: Incorrect parameter value.
+        """
+        return await self._request(node, (EventType.POWER_ACK,),
+            self.gateway.set_power, radio_power, dcdc_mode, timeout=timeout)
+
+    async def set_datetime(self, node, timeout=None):
+        """ Sets node datetime reference. """
+        return await self._request(node, (EventType.DATETIME_ACK,),
+            self.gateway.set_datetime, timeout=timeout)
+
+    async def config_task(self, node, opcode, period, wait_time=0,
+            timeout=None):
+        """ Sets a new config task. See
+        :func:`~ttgwlib.gateway.Gateway.config_task`.
+        """
+        return await self._request(node, (EventType.TASK_CHANGE_ACK,),
+            self.gateway.config_task, opcode, period, wait_time,
+            timeout=timeout)
+
+    async def set_task(self, node, opcode, date_event, period, task_type,
+            timeout=None):
+        """ Sets a new task for TaskGw model of the given node. """
+        return await self._request(node, (EventType.TASK_ACK,),
+            self.gateway.set_task, opcode, date_event, period, task_type,
+            timeout=timeout)
+
+    async def change_task(self, node, opcode, date_event, period, task_type,
+            timeout=None):
+        """ Changes a task for TaskGw model of the given node. """
+        return await self._request(node, (EventType.TASK_CHANGE_ACK,),
+            self.gateway.change_task, opcode, date_event, period, task_type,
+            timeout=timeout)
+
+    async def delete_task(self, node, index, timeout=None):
+        """ Deletes an existing task for TaskGw model of the given node. """
+        return await self._request(node, (EventType.TASK_DELETE_ACK,),
+            self.gateway.delete_task, index, timeout=timeout)
+
+    async def delete_task_op(self, node, opcode, timeout=None):
+        """ Deletes the tasks with the given opcode of the given node. """
+        return await self._request(node, (EventType.TASK_DELETE_OP_ACK,),
+            self.gateway.delete_task_op, opcode, timeout=timeout)
+
+    async def start_node_beacon(self, node, period_ms, timeout=None):
+        """ Starts BLE beacon for the given node. """
+        return await self._request(node, (EventType.BEACON_START_ACK,),
+            self.gateway.start_node_beacon, period_ms, timeout=timeout)
+
+    async def stop_node_beacon(self, node, timeout=None):
+        """ Stops BLE beacon for the given node. """
+        return await self._request(node, (EventType.BEACON_STOP_ACK,),
+            self.gateway.stop_node_beacon, timeout=timeout)
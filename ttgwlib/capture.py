@@ -0,0 +1,272 @@
+"""
+ttgwlib.capture
+~~~~~~~~~~~~~~~
+
+Uart traffic capture and replay. :class:`CaptureWriter` appends every frame
+sent or received by a transport to a binary file, and :class:`ReplayUart`
+is a transport that feeds a capture back to the gateway, to reproduce a
+real load without the device.
+
+The file starts with :data:`MAGIC`, followed by one record per frame: a
+:data:`RECORD_HEADER` (monotonic timestamp in nanoseconds, direction and
+frame length) and the frame itself, including its length byte.
+
+"""
+import os
+import mmap
+import time
+import queue
+import struct
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"TTGWCAP1"
+RECORD_HEADER = struct.Struct("<QBH")
+
+RX = 0
+TX = 1
+
+
+class CaptureWriter:
+    """ Appends frames to a capture file. It can be shared by several
+    threads. If the file already exists, it is replaced: the timestamps
+    of another session would not share its time base.
+
+    The file is flushed every :attr:`FLUSH_PERIOD` seconds, so a crash
+    only loses the last frames.
+
+    :param path: Capture file.
+    :type path: str
+    """
+    FLUSH_PERIOD = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.next_flush = time.monotonic_ns()
+
+    def write(self, direction, frame):
+        """ Appends a frame, timestamped with the current monotonic time.
+
+        :param direction: :data:`RX` or :data:`TX`.
+        :type direction: int
+        :param frame: Frame, including its length byte.
+        :type frame: bytes, bytearray or memoryview
+        """
+        now = time.monotonic_ns()
+        header = RECORD_HEADER.pack(now, direction, len(frame))
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(header)
+            self.file.write(frame)
+            if now >= self.next_flush:
+                self.file.flush()
+                self.next_flush = now + self.FLUSH_PERIOD * 1_000_000_000
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class CaptureReader:
+    """ Reads a capture file through a memory map, so big captures are
+    not loaded in memory.
+
+    :param path: Capture file.
+    :type path: str
+
+    :raises ValueError: The file is not a capture file.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size <= len(MAGIC):
+                self.map = None
+            else:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map is not None and self.map[:len(MAGIC)] != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a capture file")
+
+    def __iter__(self):
+        """ Yields the records in order, as (timestamp, direction, frame)
+        tuples. The timestamp is in nanoseconds, and the frame is a
+        memoryview over the file, valid until :func:`close` is called.
+        """
+        if self.map is None:
+            return
+        view = memoryview(self.map)
+        offset = len(MAGIC)
+        end = len(view) - RECORD_HEADER.size
+        while offset <= end:
+            timestamp, direction, size = RECORD_HEADER.unpack_from(view,
+                offset)
+            offset += RECORD_HEADER.size
+            if offset + size > len(view):
+                logger.warning("Truncated capture record")
+                break
+            yield timestamp, direction, view[offset:offset + size]
+            offset += size
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+
+
+class ReplayUart:
+    """ Transport that replays the frames received in a capture file, with
+    the same interface as :class:`~ttgwlib.uart_socket.UartSocket`.
+
+    The received frames are replayed in order, at the recorded speed
+    multiplied by *speed*, or as fast as possible if *speed* is 0. When
+    the capture ends, :attr:`finished` is set. The transport keeps
+    connected, so the gateway can still send commands.
+
+    Recorded command responses belong to the commands sent by the
+    gateway while recording, so they are not replayed. Instead, every
+    command sent to the transport is answered at once with a successful
+    response, every packet send with its token and tx complete events,
+    and every echo with its data, as the device would do.
+
+    :param path: Capture file.
+    :type path: str
+    :param speed: Replay speed factor. 0 for as fast as possible.
+    :type speed: float
+    """
+    SKIPPED_OPCODES = (0x84, 0xD2) # CmdResponse, MeshTxComplete
+    PACKET_SEND = 0xAB
+    ECHO = 0x02
+    ECHO_RSP = 0x82
+
+    def __init__(self, path, speed=1.0):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.speed = speed
+        self.reader = CaptureReader(path)
+        self.capture = None
+        self.read_running = False
+        self.connected = True
+        self.read_queue = queue.Queue()
+        self.rx_pending = bytes()
+        self.rx_pending_index = 0
+        self.token = 0
+        self.handle = 0
+        self.token_lock = threading.Lock()
+        self.finished = threading.Event()
+        self.read_thd = threading.Thread(target=self.read, name='Replay')
+
+    def start(self):
+        """ Starts the replay. Unlike the other transports, it is not
+        started by the constructor, so no frame is lost before the
+        gateway is ready.
+        """
+        self.read_running = True
+        self.read_thd.start()
+
+    def stop(self):
+        self.read_running = False
+        self.connected = False
+
+    def read(self):
+        """ Replay loop function, executed by the thread. """
+        start = None
+        records = iter(self.reader)
+        for timestamp, direction, frame in records:
+            if not self.read_running:
+                break
+            if (direction != RX or len(frame) < 2
+                    or frame[1] in self.SKIPPED_OPCODES):
+                continue
+            if self.speed:
+                if start is None:
+                    start = (timestamp, time.monotonic_ns())
+                delay = ((timestamp - start[0]) / self.speed
+                    - (time.monotonic_ns() - start[1]))
+                if delay > 0:
+                    time.sleep(delay / 1e9)
+            self.receive(bytes(frame))
+        # Views over the map must be released before closing it
+        frame = None
+        records.close()
+        self.reader.close()
+        self.finished.set()
+
+    def receive(self, frame):
+        if self.capture:
+            self.capture.write(RX, frame)
+        self.read_queue.put(frame)
+
+    def respond(self, msg):
+        opcode = msg[1]
+        with self.token_lock:
+            if opcode == self.ECHO:
+                self.receive(bytes([msg[0], self.ECHO_RSP]) + bytes(msg[2:]))
+            elif opcode == self.PACKET_SEND:
+                self.token += 1
+                token = struct.pack("<I", self.token)
+                self.receive(bytes([7, 0x84, opcode, 0]) + token)
+                self.receive(bytes([5, 0xD2]) + token)
+            else:
+                self.handle = (self.handle + 1) & 0xFFFF
+                handle = struct.pack("<H", self.handle)
+                self.receive(bytes([5, 0x84, opcode, 0]) + handle)
+
+    def get_frame(self, timeout=None):
+        """ Returns read frames in order, one at a time. Each frame
+        includes its length byte.
+
+        :return: Read frame, or empty if the timeout expires.
+        :rtype: bytes
+        """
+        if self.rx_pending_index < len(self.rx_pending):
+            frame = self.rx_pending[self.rx_pending_index:]
+            self.rx_pending = bytes()
+            self.rx_pending_index = 0
+            return frame
+        try:
+            return self.read_queue.get(timeout=timeout)
+        except queue.Empty:
+            return bytes()
+
+    def get_byte(self, timeout=None):
+        """ Returns read bytes in order, one at a time. Kept for
+        compatibility, :function:`get_frame` should be used instead.
+
+        :return: Read byte, or empty if the timeout expires.
+        :rtype: bytes
+        """
+        if self.rx_pending_index >= len(self.rx_pending):
+            self.rx_pending = self.get_frame(timeout)
+            self.rx_pending_index = 0
+            if not self.rx_pending:
+                return bytes()
+        index = self.rx_pending_index
+        self.rx_pending_index += 1
+        return self.rx_pending[index:index + 1]
+
+    def send_msg(self, msg):
+        self.logger.log(9, f"TX: {msg.hex()}")
+        if self.capture:
+            self.capture.write(TX, msg)
+        if len(msg) >= 2:
+            self.respond(msg)
+
+    def set_capture(self, capture):
+        self.capture = capture
+
+    def set_tx_chunk_size(self, size):
+        pass
+
+    def is_connected(self):
+        return self.connected
+
+    def clean(self):
+        self.read_queue.queue.clear()
+        self.rx_pending = bytes()
+        self.rx_pending_index = 0
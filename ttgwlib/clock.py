@@ -0,0 +1,87 @@
+import time
+import threading
+
+
+class SystemClock:
+    """ Wall clock time, used by default. """
+    virtual = False
+
+    def time(self):
+        """ Returns the current time, in seconds since the epoch. """
+        return time.time()
+
+    def monotonic(self):
+        """ Returns the value of a monotonic clock, in seconds. """
+        return time.monotonic()
+
+
+class VirtualClock:
+    """ Simulated time, which only moves when :func:`advance` is called.
+
+    Timer schedulers using this clock do not start a thread; their calls
+    are executed by :func:`advance`, in deadline order, with the clock set
+    to each call deadline. A simulated day of timeouts runs as fast as its
+    callbacks, instead of taking a day.
+
+    :param start: Initial time, in seconds since the epoch. Optional,
+        defaults to the current time.
+    :type start: float
+    """
+    virtual = True
+
+    def __init__(self, start=None):
+        self.epoch = time.time() if start is None else start
+        self.now = 0.0 # Seconds since the clock was created
+        self.schedulers = []
+        self.lock = threading.RLock()
+
+    def time(self):
+        """ Returns the simulated time, in seconds since the epoch. """
+        return self.epoch + self.now
+
+    def monotonic(self):
+        """ Returns the simulated seconds since the clock was created. """
+        return self.now
+
+    def attach(self, scheduler):
+        """ Registers a scheduler to be run by :func:`advance`.
+
+        :param scheduler: Timer scheduler.
+        :type scheduler: :class:`~ttgwlib.events.scheduler.TimerScheduler`
+        """
+        with self.lock:
+            self.schedulers.append(scheduler)
+
+    def detach(self, scheduler):
+        with self.lock:
+            if scheduler in self.schedulers:
+                self.schedulers.remove(scheduler)
+
+    def advance(self, seconds):
+        """ Moves the clock forward, executing the scheduled calls that
+        become due, including the calls they schedule.
+
+        :param seconds: Seconds to move forward.
+        :type seconds: float
+
+        :return: Number of executed calls.
+        :rtype: int
+        """
+        with self.lock:
+            target = self.now + seconds
+            executed = 0
+            while True:
+                deadlines = [d for d in (s.next_deadline()
+                    for s in self.schedulers) if d is not None]
+                if not deadlines or min(deadlines) > target:
+                    break
+                self.now = max(self.now, min(deadlines))
+                for scheduler in self.schedulers:
+                    executed += scheduler.run_due()
+            self.now = target
+            return executed
+
+    def sleep(self, seconds):
+        """ Same as :func:`advance`, for code expecting a sleep function.
+        """
+        self.advance(seconds)
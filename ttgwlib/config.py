@@ -4,12 +4,17 @@ class Config:
     :type node_db: :class:`~ttgwlib.node_db.NodeDatabase`
 
     :param platform: Platform/board to use. It can be one of the
-        following options: desktop, heimdall, cloud.
+        following options: desktop, heimdall, cloud, replay, simulator.
     :type platform: str
 
     :param port: For desktop platform, manually selects microcontroller
         port. If left to None, the port will be selected automatically.
-        For cloud platform, this must be the network socket.
+        For cloud platform, this must be the network socket. For replay
+        platform, this must be the capture file to replay. For simulator
+        platform, it can be a
+        :class:`~ttgwlib.platform.simulator.SimulatedDevice`, or the
+        serial port returned by its
+        :func:`~ttgwlib.platform.simulator.SimulatedDevice.open_pty`.
     :type port: str
 
     :param config_cb: Node configuration callback function. It only has
@@ -25,9 +30,82 @@ class Config:
 
     :param config_mode: Configuration mode. Optional, defaults to legacy.
     :type config_mode: str
+
+    :param capture_file: File where all the uart traffic is captured, see
+        :mod:`ttgwlib.capture`. Optional, defaults to no capture.
+    :type capture_file: str
+
+    :param replay_speed: For replay platform, speed factor relative to the
+        recorded speed. 0 to replay as fast as possible. Optional,
+        defaults to 1.
+    :type replay_speed: float
+
+    :param node_cache: Cache the nodes read from the node database, see
+        :class:`~ttgwlib.node_cache.NodeCache`. Cached nodes do not
+        expire, so if the database is modified other than through the
+        gateway, ``gateway.node_db.invalidate()`` must be called.
+        Optional, defaults to false.
+    :type node_cache: bool
+
+    :param unknown_node_ttl: Seconds an address not found in the node
+        database is cached as unknown. Optional, defaults to 30.
+    :type unknown_node_ttl: float
+
+    :param dispatch_workers: Threads dispatching node events, sharded by
+        node, see :class:`~ttgwlib.events.event_handler.EventHandler`.
+        Handlers must be thread safe if set. Optional, defaults to 0,
+        every event is dispatched by the same thread.
+    :type dispatch_workers: int
+
+    :param clock: Clock used by the timeouts and the models timestamps.
+        A :class:`~ttgwlib.clock.VirtualClock` allows simulating long
+        periods of time instantly. Optional, defaults to the system clock.
+    :type clock: :class:`~ttgwlib.clock.SystemClock`
+
+    :param warm_restart: Keep the device keys and addresses added to the
+        microcontroller between restarts, instead of clearing them on
+        start up, see :class:`~ttgwlib.dev_manager.HandleManager`. The
+        stored handles are discarded when the firmware is updated, and
+        the device is configured again from scratch if it rejects them.
+        Optional, defaults to false.
+    :type warm_restart: bool
+
+    :param handle_file: File to store the key and address handles, for
+        warm restarts. Optional, defaults to file .handles in current
+        directory.
+    :type handle_file: str
+
+    :param max_devkeys: Device keys the microcontroller can hold. The
+        least recently used ones are removed to add new ones. Optional,
+        defaults to 10.
+    :type max_devkeys: int
+
+    :param max_addresses: Publication addresses the microcontroller can
+        hold. The least recently used ones are removed to add new ones.
+        Optional, defaults to 30.
+    :type max_addresses: int
+
+    :param max_tx_window: Mesh packets the microcontroller can be sending
+        at the same time. The window adapts to the network congestion up
+        to this size, see :class:`~ttgwlib.tx_manager.SendWindow`.
+        Optional, defaults to 5 (nRF52832).
+    :type max_tx_window: int
+
+    :param tx_weights: Share of the mesh packets sent of each traffic
+        class, in packets per turn, at least 1, see
+        :class:`~ttgwlib.tx_manager.FairQueue`. Optional, the classes not
+        given keep their default weight: 4 for wake up replies, 2 for
+        other messages and 1 for low priority messages.
+    :type tx_weights: Dict[:class:`~ttgwlib.tx_manager.TrafficClass`, int]
+
+    :raises ValueError: A traffic class weight is lower than 1.
     """
     def __init__(self, node_db, platform, port=None, config_cb=None,
-            seq_number_file=None, prov_mode=False, config_mode="legacy"):
+            seq_number_file=None, prov_mode=False, config_mode="legacy",
+            capture_file=None, replay_speed=1.0, node_cache=False,
+            unknown_node_ttl=30.0, dispatch_workers=0, clock=None,
+            warm_restart=False, handle_file=None, max_devkeys=10,
+            max_addresses=30, max_tx_window=5, tx_weights=None):
         self.node_db = node_db
         self.platform = platform
         self.port = port
@@ -37,6 +115,22 @@ class Config:
         self.seq_number_file = seq_number_file
         self.prov_mode = prov_mode
         self.config_mode = config_mode
+        self.capture_file = capture_file
+        self.replay_speed = replay_speed
+        self.node_cache = node_cache
+        self.unknown_node_ttl = unknown_node_ttl
+        self.dispatch_workers = dispatch_workers
+        self.clock = clock
+        self.warm_restart = warm_restart
+        if not handle_file:
+            handle_file = ".handles"
+        self.handle_file = handle_file
+        self.max_devkeys = max_devkeys
+        self.max_addresses = max_addresses
+        self.max_tx_window = max_tx_window
+        if tx_weights and not all(w >= 1 for w in tx_weights.values()):
+            raise ValueError(f"Invalid tx_weights: {tx_weights}")
+        self.tx_weights = tx_weights
 
 
 class ConfigPassthrough:
@@ -1,11 +1,18 @@
+import os
+import json
 import time
+import bisect
 import struct
+import hashlib
 import logging
 import threading
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError
 
 import ttgwlib.events.mesh_events as events
 from ttgwlib import commands
+from ttgwlib.platform.exception import GatewayError
+from ttgwlib.seq_number_store import SeqNumberStore
 
 
 APP_KEY = bytes.fromhex("4F68AD85D9F48AC8589DF665B6B49B8A")
@@ -17,90 +24,489 @@ class GroupAddress:
     NRFTEMP = 49400
 
 
+class HandleCache:
+    """ Least recently used table of device handles, limited to the
+    capacity of the device.
+
+    :param name: Table name, for logging.
+    :type name: str
+    :param capacity: Maximum number of entries.
+    :type capacity: int
+    """
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.entries = OrderedDict() # Dict[key, value], oldest first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """ Returns the value of a key, and marks it as the most recently
+        used, or None if the key is not in the table.
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+    def pop(self, key):
+        return self.entries.pop(key)
+
+    def demote(self, key):
+        """ Marks a key as the least recently used, if it is in the table.
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key, last=False)
+
+    def pop_lru(self):
+        """ Removes the least recently used entry.
+
+        :return: Key and value.
+        :rtype: tuple
+        """
+        self.evictions += 1
+        return self.entries.popitem(last=False)
+
+    def is_full(self):
+        return len(self.entries) >= self.capacity
+
+    def items(self):
+        return self.entries.items()
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_stats(self):
+        """ Returns the table counters.
+
+        :return: Entries, capacity, hits, misses and evictions.
+        :rtype: dict
+        """
+        return {
+            "entries": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
 class HandleManager:
+    """ Device key and address handles of the device.
+
+    The device can only hold a few device keys and publication addresses,
+    so they are added when a message is sent, and the least recently used
+    ones are removed when the tables are full. The capacities are
+    configurable; if the device rejects an add before its table is full,
+    the capacity is lowered to the current size.
+
+    If a handle file is given, the handle tables are stored in it every
+    time they change, so they can be restored after a restart, instead of
+    clearing the device and adding every key and address again (see
+    :func:`DeviceManager.config_device`). The file is only restored if its
+    fingerprint (device address, gateway address and keys) matches, and it
+    is discarded when the device is flashed, or rejects a stored handle.
+
+    :param dev_manager: Device manager.
+    :type dev_manager: :class:`DeviceManager`
+    :param handle_file: File to store the handle tables. Optional,
+        defaults to no file.
+    :type handle_file: str
+    :param max_devkeys: Device keys the device can hold. Optional.
+    :type max_devkeys: int
+    :param max_addresses: Publication addresses the device can hold.
+        Optional.
+    :type max_addresses: int
+    """
     MAX_DEVKEYS = 10
     MAX_ADDRESSES = 30
-    def __init__(self, dev_manager):
+    STATUS_REJECTED = 0x8E # Returned by the device when a table is full
+    CMD_TIMEOUT = 5 # Seconds to wait for the response of a table command
+
+    def __init__(self, dev_manager, handle_file=None, max_devkeys=None,
+            max_addresses=None):
+        self.logger = logging.getLogger(__name__)
         self.dev_manager = dev_manager
+        self.handle_file = handle_file
+        self.fingerprint = None
         self.netkey = None
         self.appkey = None
-        self.devkeys = OrderedDict() # Dict[devkey, key_handle]
-        self.devkeys_addr = [] # List[address]
+        # Dict[devkey, (address, key_handle)]
+        self.devkeys = HandleCache("devkeys", max_devkeys or self.MAX_DEVKEYS)
+        self.devkey_owners = {} # Dict[address, devkey]
 
         self.wake_addr = None
         self.nrftemp_addr = None
-        self.addresses = OrderedDict() # Dict[address, address_handle]
+        # Dict[address, address_handle]
+        self.addresses = HandleCache("addresses",
+            max_addresses or self.MAX_ADDRESSES)
+        # Prefetched devkeys, until the node goes to sleep again
+        self.prefetched = set()
+        self.prefetches = 0
+        self.prefetch_adds = 0
+        self.prefetch_skips = 0
 
     def get_devkey_handle(self, node):
-        if node.devkey in self.devkeys:
-            return self.devkeys[node.devkey]
-        if node.unicast_addr in self.devkeys_addr:
-            index = self.devkeys_addr.index(node.unicast_addr)
-            key = list(self.devkeys)[index]
-            key_handle = self.devkeys[key]
-            self.devkeys_addr.pop(index)
-            del self.devkeys[key]
+        entry = self.devkeys.get(node.devkey)
+        if entry is not None:
+            return entry[1]
+        old_devkey = self.devkey_owners.get(node.unicast_addr)
+        if old_devkey is not None:
+            # Provisioned again, with a new device key
+            _, key_handle = self.devkeys.pop(old_devkey)
+            del self.devkey_owners[node.unicast_addr]
             msg = commands.DevkeyDelete(key_handle)
-            self.dev_manager.send_cmd_wait_rsp(msg)
-        elif len(self.devkeys) >= self.MAX_DEVKEYS:
-            _, old_key_handle = self.devkeys.popitem(last=False)
-            self.devkeys_addr.pop(0)
-            msg = commands.DevkeyDelete(old_key_handle)
-            self.dev_manager.send_cmd_wait_rsp(msg)
+            self.send_cmd(msg)
+        while self.devkeys.is_full():
+            self.evict_devkey()
         msg = commands.DevkeyAdd(node.unicast_addr, node.netkey_index,
             node.devkey)
-        rsp = self.dev_manager.send_cmd_wait_rsp(msg)
+        rsp = self.send_cmd(msg)
+        if rsp["result"] == self.STATUS_REJECTED and len(self.devkeys) > 0:
+            self.shrink(self.devkeys)
+            self.evict_devkey()
+            rsp = self.send_cmd(msg)
+        self.check_result(rsp, msg)
         key_handle = struct.unpack("<H", rsp["rsp_data"])[0]
-        self.devkeys[node.devkey] = key_handle
-        self.devkeys_addr.append(node.unicast_addr)
+        self.devkeys.put(node.devkey, (node.unicast_addr, key_handle))
+        self.devkey_owners[node.unicast_addr] = node.devkey
+        self.save()
         return key_handle
 
+    def evict_devkey(self):
+        devkey, (address, key_handle) = self.devkeys.pop_lru()
+        self.prefetched.discard(devkey)
+        if self.devkey_owners.get(address) == devkey:
+            del self.devkey_owners[address]
+        msg = commands.DevkeyDelete(key_handle)
+        self.send_cmd(msg)
+
     def get_address_handle(self, address):
-        if address in self.addresses:
-            return self.addresses[address]
-        if len(self.addresses) >= self.MAX_ADDRESSES:
-            _, old_addr_handle = self.addresses.popitem(last=False)
-            msg = commands.AddrPublicationRemove(old_addr_handle)
-            self.dev_manager.send_cmd_wait_rsp(msg)
+        addr_handle = self.addresses.get(address)
+        if addr_handle is not None:
+            return addr_handle
+        while self.addresses.is_full():
+            self.evict_address()
         msg = commands.AddrPublicationAdd(address)
-        rsp = self.dev_manager.send_cmd_wait_rsp(msg)
+        rsp = self.send_cmd(msg)
+        if rsp["result"] == self.STATUS_REJECTED and len(self.addresses) > 0:
+            self.shrink(self.addresses)
+            self.evict_address()
+            rsp = self.send_cmd(msg)
+        self.check_result(rsp, msg)
         addr_handle = struct.unpack("<H", rsp["rsp_data"])[0]
-        self.addresses[address] = addr_handle
+        self.addresses.put(address, addr_handle)
+        self.save()
         return addr_handle
 
+    def evict_address(self):
+        _, old_addr_handle = self.addresses.pop_lru()
+        msg = commands.AddrPublicationRemove(old_addr_handle)
+        self.send_cmd(msg)
+
+    def send_cmd(self, msg):
+        return self.dev_manager.send_cmd_wait_rsp(msg, self.CMD_TIMEOUT)
+
+    @staticmethod
+    def check_result(rsp, msg):
+        if rsp["result"] != 0:
+            raise GatewayError(f"{type(msg).__name__} failed: "
+                f"{rsp['result']}")
+
+    def prefetch(self, node):
+        """ Adds the device key and address handles of a node, if they are
+        not in the tables, so they are ready when a message is sent to it.
+
+        Prefetched nodes can take half of the device key table at most, so
+        prefetching does not evict the handles of the nodes awake.
+
+        :param node: Node expected to receive messages soon.
+        :type node: :class:`~ttgwlib.node.Node`
+        """
+        if (node.devkey not in self.prefetched
+                and len(self.prefetched) >= self.devkeys.capacity // 2):
+            self.prefetch_skips += 1
+            return
+        self.prefetched.add(node.devkey)
+        self.prefetches += 1
+        if node.devkey not in self.devkeys:
+            self.prefetch_adds += 1
+        if node.unicast_addr not in self.addresses:
+            self.prefetch_adds += 1
+        self.get_devkey_handle(node)
+        self.get_address_handle(node.unicast_addr)
+
+    def release(self, node):
+        """ Marks the handles of a node as the first to be removed when
+        the tables are full, because no message is expected to be sent to
+        it soon (it went to sleep).
+
+        :param node: Node.
+        :type node: :class:`~ttgwlib.node.Node`
+        """
+        self.prefetched.discard(node.devkey)
+        self.devkeys.demote(node.devkey)
+        self.addresses.demote(node.unicast_addr)
+
+    def shrink(self, cache):
+        self.logger.info("Device %s capacity is %d, not %d", cache.name,
+            len(cache), cache.capacity)
+        cache.capacity = len(cache)
+
+    def get_stats(self):
+        """ Returns the counters of the device key and address tables, see
+        :func:`HandleCache.get_stats`.
+
+        Prefetched nodes, handles added by prefetching and prefetches
+        skipped are also returned; the lookups of the prefetches are counted
+        in the tables too.
+
+        :return: Dict[table name, counters dictionary], and prefetch
+            counters.
+        :rtype: dict
+        """
+        return {
+            "devkeys": self.devkeys.get_stats(),
+            "addresses": self.addresses.get_stats(),
+            "prefetch": {
+                "nodes": self.prefetches,
+                "added": self.prefetch_adds,
+                "skipped": self.prefetch_skips,
+            },
+        }
+
+    def clear(self):
+        self.fingerprint = None
+        self.netkey = None
+        self.appkey = None
+        self.devkeys.clear()
+        self.devkey_owners.clear()
+        self.prefetched.clear()
+        self.wake_addr = None
+        self.nrftemp_addr = None
+        self.addresses.clear()
+
+    @staticmethod
+    def get_fingerprint(device_address, address, netkey):
+        """ Returns the fingerprint of a device state.
+
+        :param device_address: Device Bluetooth address.
+        :type device_address: bytes
+        :param address: Gateway unicast address.
+        :type address: int
+        :param netkey: Net key.
+        :type netkey: bytes
+
+        :return: Hex digest.
+        :rtype: str
+        """
+        digest = hashlib.sha256()
+        digest.update(bytes(device_address))
+        digest.update(struct.pack("<H", address))
+        digest.update(bytes(netkey))
+        digest.update(APP_KEY)
+        return digest.hexdigest()
+
+    def save(self):
+        """ Stores the handle tables in the handle file, if any. The file
+        is replaced atomically, so it is never left half written.
+        """
+        if self.handle_file is None or self.fingerprint is None:
+            return
+        state = {
+            "fingerprint": self.fingerprint,
+            "netkey": self.netkey,
+            "appkey": self.appkey,
+            "wake_addr": self.wake_addr,
+            "nrftemp_addr": self.nrftemp_addr,
+            # Least recently used first
+            "devkeys": [[devkey.hex(), address, handle]
+                for devkey, (address, handle) in self.devkeys.items()],
+            "addresses": list(self.addresses.items()),
+        }
+        tmp_file = self.handle_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.handle_file)
+
+    def discard(self):
+        """ Removes the handle file, so the next start up is cold. """
+        self.fingerprint = None
+        if self.handle_file is None:
+            return
+        try:
+            os.remove(self.handle_file)
+        except FileNotFoundError:
+            pass
+
+    def load(self, fingerprint):
+        """ Restores the handle tables from the handle file.
+
+        :param fingerprint: Fingerprint of the current device state, see
+            :func:`get_fingerprint`.
+        :type fingerprint: str
+
+        :return: True if restored, false if there is no file, or it is
+            invalid or for another device state.
+        :rtype: bool
+        """
+        if self.handle_file is None:
+            return False
+        try:
+            with open(self.handle_file) as f:
+                state = json.load(f)
+            if state["fingerprint"] != fingerprint:
+                return False
+            devkeys = [(bytes.fromhex(devkey), (address, handle))
+                for devkey, address, handle in state["devkeys"]]
+            addresses = [(address, handle)
+                for address, handle in state["addresses"]]
+            netkey = state["netkey"]
+            appkey = state["appkey"]
+            wake_addr = state["wake_addr"]
+            nrftemp_addr = state["nrftemp_addr"]
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return False
+        self.fingerprint = fingerprint
+        self.netkey = netkey
+        self.appkey = appkey
+        self.wake_addr = wake_addr
+        self.nrftemp_addr = nrftemp_addr
+        self.devkeys.clear()
+        self.devkey_owners.clear()
+        for devkey, (address, handle) in devkeys:
+            self.devkeys.put(devkey, (address, handle))
+            self.devkey_owners[address] = devkey
+        self.addresses.clear()
+        for address, handle in addresses:
+            self.addresses.put(address, handle)
+        return True
+
+
+class CommandStats:
+    """ Response latency counters of a command type.
+
+    :param name: Command name.
+    :type name: str
+    """
+    # Histogram bucket upper bounds, in seconds. The last bucket is open.
+    BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.latency_total = 0
+        self.latency_max = 0
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+
+    def add(self, latency):
+        self.count += 1
+        self.latency_total += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+        self.histogram[bisect.bisect_left(self.BUCKETS, latency)] += 1
+
+    def get_stats(self):
+        """ Returns the counters.
+
+        :return: Responses, average and maximum latency, in seconds, and
+            the latency histogram, as Dict[bucket upper bound, responses].
+            The upper bound of the last bucket is infinite.
+        :rtype: dict
+        """
+        bounds = self.BUCKETS + (float("inf"),)
+        return {
+            "count": self.count,
+            "latency_avg": (self.latency_total / self.count
+                if self.count else 0),
+            "latency_max": self.latency_max,
+            "histogram": dict(zip(bounds, self.histogram)),
+        }
+
 
 class DeviceManager:
     SEQ_BLOCK = 100
-
-    def __init__(self, gateway, seq_number_file, remote=False):
+    SEND_OPCODE = 0xab # PacketSend, answered with a RSP_SEND event
+    CONFIG_TIMEOUT = 5 # Seconds to wait for a configuration response
+    # Seconds after which a command without response is considered lost,
+    # when a newer response with the same opcode arrives
+    CMD_TIMEOUT = 5
+    # Commands that fail if a handle restored on a warm start is stale
+    HANDLE_OPCODES = (SEND_OPCODE, commands.DevkeyDelete.OPCODE,
+        commands.AddrPublicationRemove.OPCODE)
+
+    def __init__(self, gateway, seq_number_file, remote=False,
+            handle_file=None, max_devkeys=None, max_addresses=None):
         self.logger = logging.getLogger(__name__)
         self.gw = gateway
         self.seq_number_file = seq_number_file
+        self.seq_store = SeqNumberStore(seq_number_file, self.SEQ_BLOCK)
         self.remote = remote
-        self.handles = HandleManager(self)
+        self.handles = HandleManager(self, handle_file, max_devkeys,
+            max_addresses)
 
         self.dev_started = False
-        self.check_connection_flag = False
+        self.started = threading.Event() # Set when configured after a reset
+        self.config_ok = False # Result of the last configuration
+        # Warm start, and no packet sent with the restored handles yet
+        self.warm_unverified = False
+        # Incremented on every reset, so the configuration of a previous
+        # reset does not set started
+        self.config_generation = 0
+        self.config_lock = threading.Lock()
+        self.reset_time = None
+        self.start_timing = {}
+        self.check_connection_flag = threading.Event()
         self.cache_size = 0
-        self.gw.add_event_handler(self.started_handler)
-        self.gw.add_event_handler(self.connection_handler)
-        self.gw.add_event_handler(self.seq_handler)
-        self.gw.add_event_handler(self.cache_size_handler)
-
-        self.cmd_opcode_wait = None
-        self.cmd_complete = False
-        self.cmd_response = None
-        self.gw.add_event_handler(self.rsp_handler)
+        self.gw.add_event_handler(self.started_handler,
+            (events.EventType.DEV_RESET,))
+        self.gw.add_event_handler(self.connection_handler,
+            (events.EventType.ECHO,))
+        self.gw.add_event_handler(self.seq_handler,
+            (events.EventType.SEQ_UPDATE,))
+        self.gw.add_event_handler(self.cache_size_handler,
+            (events.EventType.CACHE_SIZE,))
+
+        # The device answers the commands in order, so the response to an
+        # opcode is for the oldest command with that opcode not answered yet
+        self.cmd_lock = threading.Lock()
+        self.pending_cmds = {} # Dict[opcode, Deque[(future, name, time)]]
+        self.cmd_stats = {} # Dict[command name, CommandStats]
+        self.gw.add_event_handler(self.rsp_handler,
+            (events.EventType.RSP_EVENT, events.EventType.RSP_SEND))
 
     def started_handler(self, event):
         if event.event_type == events.EventType.DEV_RESET:
-            threading.Thread(target=self.config_device).start()
+            self.gw.uart.set_tx_chunk_size(
+                event.data["data_credit_available"])
+            # Commands sent before the reset are never answered
+            self.fail_pending_cmds(GatewayError("Device reset"))
+            # Resets not requested by start_device have no reset time
+            self.start_timing = {"reset": (time.monotonic() - self.reset_time
+                if self.reset_time is not None else None)}
+            self.reset_time = None
+            generation = self.next_config_generation()
+            threading.Thread(target=self.config_device, args=(generation,),
+                name="DevConfig").start()
             self.dev_started = True
 
     def seq_handler(self, event):
         if event.event_type == events.EventType.SEQ_UPDATE:
-            with open(self.seq_number_file, "w") as f:
-                f.write(str(event.data["seq_number"]))
+            self.seq_store.update(event.data["seq_number"])
 
     def cache_size_handler(self, event):
         if event.event_type == events.EventType.CACHE_SIZE:
@@ -110,116 +516,327 @@ class DeviceManager:
     def connection_handler(self, event):
         if event.event_type == events.EventType.ECHO:
             if event.data["echo"] == bytes.fromhex("0204FF"):
-                self.check_connection_flag = True
+                self.check_connection_flag.set()
 
     def rsp_handler(self, event):
         if event.event_type == events.EventType.RSP_EVENT:
-            if event.data["opcode"] == self.cmd_opcode_wait:
-                self.cmd_response = event.data
-                self.cmd_complete = True
-
+            opcode = event.data["opcode"]
         elif event.event_type == events.EventType.RSP_SEND:
-            if self.cmd_opcode_wait == 0xab:
-                self.cmd_response = event.data
-                self.cmd_complete = True
-
-    def send_cmd_wait_rsp(self, cmd):
-        """ Can not be used in event callback (blocks evt handler thread). """
-        self.cmd_complete = False
-        self.cmd_opcode_wait = cmd.get_opcode()
-        self.gw.uart.send_msg(cmd.serialize())
-        while not self.cmd_complete:
-            time.sleep(0.1)
-        return self.cmd_response
+            opcode = self.SEND_OPCODE
+        else:
+            return
+        now = time.monotonic()
+        lost = []
+        with self.cmd_lock:
+            pending = self.pending_cmds.get(opcode)
+            # Commands nobody waits for are not dropped on a timeout, so
+            # the ones whose response was lost are dropped here, or every
+            # later response would be given to the previous command
+            while pending and pending[0][2] < now - self.CMD_TIMEOUT:
+                lost.append(pending.popleft())
+            if pending:
+                future, name, sent = pending.popleft()
+                if name not in self.cmd_stats:
+                    self.cmd_stats[name] = CommandStats(name)
+                self.cmd_stats[name].add(now - sent)
+            else:
+                future = None
+        for lost_future, name, _ in lost:
+            self.logger.warning("%s response lost", name)
+            if lost_future.set_running_or_notify_cancel():
+                lost_future.set_exception(TimeoutError(f"{name} response "
+                    "lost"))
+        # False if cancelled by the caller
+        if future is not None and future.set_running_or_notify_cancel():
+            future.set_result(event.data)
+        if self.warm_unverified and opcode in self.HANDLE_OPCODES:
+            self.check_warm_handles(opcode, event.data["result"])
+
+    def check_warm_handles(self, opcode, result):
+        """ Checks the first responses using the handles restored on a
+        warm start. If the device rejects one, its tables do not match the
+        handle file, so the file is discarded and the device is reset, to
+        be configured cold.
+        """
+        if result == 0:
+            if opcode == self.SEND_OPCODE:
+                # A packet was sent with the restored handles
+                self.warm_unverified = False
+            return
+        self.warm_unverified = False
+        self.logger.warning("Restored handle rejected (%d), restarting "
+            "cold", result)
+        self.handles.discard()
+        self.reset_device()
+
+    def send_cmd(self, cmd):
+        """ Sends a command without waiting for its response. Several
+        commands can be waiting for their response at the same time.
+
+        :param cmd: Command to be sent.
+        :type cmd: :class:`~ttgwlib.commands.CommandPacket`
+
+        :return: Future resolved with the response event data. It fails
+            with :class:`~ttgwlib.platform.exception.GatewayError` if the
+            device is reset before answering, and with
+            :class:`concurrent.futures.TimeoutError` if a newer command
+            with the same opcode is answered after :attr:`CMD_TIMEOUT`
+            seconds without a response to this one.
+        :rtype: :class:`concurrent.futures.Future`
+        """
+        future = Future()
+        opcode = cmd.get_opcode()
+        # Commands are registered in the same order they are sent
+        with self.cmd_lock:
+            if opcode not in self.pending_cmds:
+                self.pending_cmds[opcode] = deque()
+            self.pending_cmds[opcode].append((future,
+                type(cmd).__name__, time.monotonic()))
+            try:
+                self.gw.uart.send_msg(cmd.serialize())
+            except Exception:
+                # Not sent, no response will come
+                self.pending_cmds[opcode].pop()
+                raise
+        return future
+
+    def send_cmd_wait_rsp(self, cmd, timeout=None):
+        """ Sends a command and waits for its response.
+        Can not be used in event callback (blocks evt handler thread).
+
+        :param cmd: Command to be sent.
+        :type cmd: :class:`~ttgwlib.commands.CommandPacket`
+        :param timeout: Seconds to wait. Optional, defaults to no limit.
+        :type timeout: float
+
+        :return: Response event data.
+        :rtype: dict
+
+        :raises concurrent.futures.TimeoutError: No response in time.
+        :raises GatewayError: The device was reset before answering.
+        """
+        future = self.send_cmd(cmd)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # The response is lost, it must not be taken as the response
+            # of the next command with the same opcode
+            self.drop_cmd(cmd.get_opcode(), future)
+            raise
+
+    def drop_cmd(self, opcode, future):
+        with self.cmd_lock:
+            pending = self.pending_cmds.get(opcode, ())
+            for entry in pending:
+                if entry[0] is future:
+                    pending.remove(entry)
+                    break
+
+    def fail_pending_cmds(self, error):
+        with self.cmd_lock:
+            pending = [entry[0] for entries in self.pending_cmds.values()
+                for entry in entries]
+            self.pending_cmds.clear()
+        for future in pending:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def get_cmd_stats(self):
+        """ Returns the response latency counters, by command name, see
+        :func:`CommandStats.get_stats`.
+
+        :return: Dict[command name, counters dictionary].
+        :rtype: dict
+        """
+        with self.cmd_lock:
+            return {name: stats.get_stats()
+                for name, stats in self.cmd_stats.items()}
 
     def check_connection(self):
-        self.check_connection_flag = False
+        self.check_connection_flag.clear()
         msg = commands.Echo(bytes.fromhex("0204FF"))
         self.gw.uart.send_msg(msg.serialize())
-        n = 0
-        # TODO: do it with lock
-        while not self.check_connection_flag:
-            if n < 10:
-                time.sleep(0.50)
-                n += 1
-            else:
-                break
-        return self.check_connection_flag
+        return self.check_connection_flag.wait(5)
 
     def reset_device(self):
         msg = commands.Reset()
         self.gw.uart.send_msg(msg.serialize())
 
-    def start_device(self):
+    def start_device(self, timeout=None):
+        """ Resets the device and waits until it is configured.
+
+        :param timeout: Seconds to wait. Optional, defaults to no limit.
+        :type timeout: float
+
+        :return: True if the device was configured in time, false if the
+            configuration failed or timed out.
+        :rtype: bool
+        """
         self.dev_started = False
+        self.next_config_generation()
+        self.reset_time = time.monotonic()
         self.reset_device()
-        while not self.dev_started:
-            pass
-
-    def config_device(self):
+        return self.started.wait(timeout) and self.config_ok
+
+    def next_config_generation(self):
+        with self.config_lock:
+            self.config_generation += 1
+            self.config_ok = False
+            self.started.clear()
+            return self.config_generation
+
+    def config_device(self, generation=None):
+        """ Configures the device after a reset. Every command is sent
+        before waiting for the first response; the device executes them in
+        order, so they do not need to wait for each other.
+
+        The device is cleared first (cold start), unless there is a handle
+        file for the same device state (warm start): then the stored handles
+        are restored, and the keys and subscriptions, which the device kept,
+        are not added again.
+
+        The configuration stops at the first step that fails or is not
+        answered in :attr:`CONFIG_TIMEOUT` seconds. :attr:`started` is set
+        when it ends, unless the device was reset again meanwhile, and
+        :attr:`config_ok` tells whether it succeeded.
+
+        :param generation: Configuration generation, see
+            :func:`next_config_generation`. Optional, defaults to the
+            current one.
+        :type generation: int
+        """
+        if generation is None:
+            generation = self.config_generation
         self.logger.info("Configuring gateway")
-
-        #msg = commands.AdvertisingAddressGet()
-        #self.send_cmd_wait_rsp(msg)
-
-        msg = commands.StateClear()
-        self.send_cmd_wait_rsp(msg)
-
-        # Get cache_size
-        msg = commands.GetReplayCacheSize()
-        self.send_cmd_wait_rsp(msg)
-        self.gw.add_event_handler(self.cache_size_handler)
-
-        # Set unicast address
-        self.logger.debug("Setting gateway unicast address to %d",
-            self.gw.node_db.get_address())
-        msg = commands.AddrLocalUnicastSet(self.gw.node_db.get_address(), 1)
-        self.send_cmd_wait_rsp(msg)
-
-        # Consistent sequence number
+        start = time.monotonic()
+        timing = {} # Dict[step, seconds until its response]
+        sent = [] # List[(opcode, future)]
+
+        def send(name, cmd):
+            def done(_):
+                timing[name] = time.monotonic() - start
+            future = self.send_cmd(cmd)
+            future.add_done_callback(done)
+            sent.append((cmd.get_opcode(), future))
+            return future
+
+        def result(name, future):
+            rsp = future.result(self.CONFIG_TIMEOUT)
+            if rsp["result"] != 0:
+                raise GatewayError(f"Configuration step {name} failed: "
+                    f"{rsp['result']}")
+            return rsp
+
+        warm = False
+        ok = False
         try:
-            with open(self.seq_number_file) as f:
-                seq = int(f.read())
-            seq = self.SEQ_BLOCK * (seq // self.SEQ_BLOCK + 1)
-        except (FileNotFoundError, ValueError):
-            seq = 0
-        with open(self.seq_number_file, "w") as f:
-            f.write(str(seq))
-        msg = commands.SetNetState(0, 0, 0, seq)
-        self.send_cmd_wait_rsp(msg)
-
-        self.logger.debug("Adding keys")
-        # Netkey
-        msg = commands.SubnetAdd(0, self.gw.node_db.get_netkey())
-        rsp = self.send_cmd_wait_rsp(msg)
-        self.handles.netkey = struct.unpack("<H", rsp["rsp_data"])[0]
-        # Appkey
-        msg = commands.AppkeyAdd(0, 0, APP_KEY)
-        rsp = self.send_cmd_wait_rsp(msg)
-        self.handles.appkey = struct.unpack("<H", rsp["rsp_data"])[0]
-
-        # WakeUp subscription
-        self.logger.debug("Wake Up subscription (%d)", GroupAddress.WAKE)
-        msg = commands.AddrSubscriptionAdd(GroupAddress.WAKE)
-        rsp = self.send_cmd_wait_rsp(msg)
-        self.handles.wake_addr = struct.unpack("<H", rsp["rsp_data"])[0]
-
-        # NRFTemp subscription
-        self.logger.debug("NRFTemp subscription (%d)", GroupAddress.NRFTEMP)
-        msg = commands.AddrSubscriptionAdd(GroupAddress.NRFTEMP)
-        rsp = self.send_cmd_wait_rsp(msg)
-        self.handles.nrftemp_addr = struct.unpack("<H", rsp["rsp_data"])[0]
+            # Consistent sequence number
+            seq = self.seq_store.start()
+
+            address = self.gw.node_db.get_address()
+            netkey = self.gw.node_db.get_netkey()
+            fingerprint = None
+            if self.handles.handle_file is not None:
+                rsp = result("device_address", send("device_address",
+                    commands.AdvertisingAddressGet()))
+                fingerprint = self.handles.get_fingerprint(rsp["rsp_data"],
+                    address, netkey)
+                warm = self.handles.load(fingerprint)
+
+            # Cache size is received in a CACHE_SIZE event
+            self.gw.add_event_handler(self.cache_size_handler,
+                (events.EventType.CACHE_SIZE,))
+
+            self.logger.debug("Setting gateway unicast address to %d",
+                address)
+            steps = []
+            if not warm:
+                self.handles.clear()
+                steps.append(("state_clear", commands.StateClear()))
+            steps += [
+                ("cache_size", commands.GetReplayCacheSize()),
+                ("unicast_address", commands.AddrLocalUnicastSet(address, 1)),
+                ("net_state", commands.SetNetState(0, 0, 0, seq)),
+            ]
+            if not warm:
+                self.logger.debug("Adding keys and subscriptions (%d, %d)",
+                    GroupAddress.WAKE, GroupAddress.NRFTEMP)
+                steps += [
+                    ("netkey", commands.SubnetAdd(0, netkey)),
+                    ("appkey", commands.AppkeyAdd(0, 0, APP_KEY)),
+                    ("wake_subscription",
+                        commands.AddrSubscriptionAdd(GroupAddress.WAKE)),
+                    ("nrftemp_subscription",
+                        commands.AddrSubscriptionAdd(GroupAddress.NRFTEMP)),
+                ]
+            futures = [send(name, cmd) for name, cmd in steps]
+            rsps = {}
+            for (name, _), future in zip(steps, futures):
+                rsps[name] = result(name, future)
+
+            if not warm:
+                self.handles.netkey = struct.unpack("<H",
+                    rsps["netkey"]["rsp_data"])[0]
+                self.handles.appkey = struct.unpack("<H",
+                    rsps["appkey"]["rsp_data"])[0]
+                self.handles.wake_addr = struct.unpack("<H",
+                    rsps["wake_subscription"]["rsp_data"])[0]
+                self.handles.nrftemp_addr = struct.unpack("<H",
+                    rsps["nrftemp_subscription"]["rsp_data"])[0]
+                self.handles.fingerprint = fingerprint
+                self.handles.save()
+            ok = True
+        except TimeoutError:
+            self.logger.error("Gateway configuration timed out")
+        except GatewayError as e:
+            self.logger.error("Gateway configuration failed: %s",
+                e.get_error_msg())
+        except Exception:
+            self.logger.exception("Gateway configuration failed")
+        finally:
+            # The responses not received are not waited for anymore
+            for opcode, future in sent:
+                if not future.done():
+                    self.drop_cmd(opcode, future)
+            self.start_timing["warm"] = warm
+            self.start_timing["commands"] = timing
+            self.start_timing["config"] = time.monotonic() - start
+            with self.config_lock:
+                if generation == self.config_generation:
+                    self.config_ok = ok
+                    self.warm_unverified = ok and warm
+                    self.started.set()
+            if ok:
+                self.logger.info("Gateway configured in %.3f s (%s start)",
+                    self.start_timing["config"], "warm" if warm else "cold")
+
+    def get_start_timing(self):
+        """ Returns the duration of the last start up.
+
+        :return: Seconds from the reset command to the device started
+            event (None if the reset was not requested), whether the handles
+            were restored (warm start), seconds to configure the device, and
+            Dict[configuration step, seconds from the start of the
+            configuration to its response].
+        :rtype: dict
+        """
+        return dict(self.start_timing)
 
     def stop_device(self):
-        msg = commands.AddrSubscriptionRemove(self.handles.wake_addr)
-        self.gw.uart.send_msg(msg.serialize())
-        msg = commands.AddrSubscriptionRemove(self.handles.nrftemp_addr)
-        self.gw.uart.send_msg(msg.serialize())
+        # The subscriptions are kept for the next warm start
+        if self.handles.handle_file is None:
+            msg = commands.AddrSubscriptionRemove(self.handles.wake_addr)
+            self.send_cmd(msg)
+            msg = commands.AddrSubscriptionRemove(self.handles.nrftemp_addr)
+            self.send_cmd(msg)
         self.reset_device()
 
+    def stop(self):
+        self.seq_store.stop()
+
     def clear_replay_cache(self, unicast_address):
         """ Now it removes msg cache (replay cache does not exist inside
         nRF anymore).
         """
         msg = commands.ClearNodeReplayCache(unicast_address)
-        self.gw.uart.send_msg(msg.serialize())
+        self.send_cmd(msg)
@@ -1,62 +1,265 @@
+import time
 import queue
 import logging
+import itertools
 import threading
+from enum import IntEnum
 
 from ttgwlib.events.event import EventType
 
-class EventHandler:
-    def __init__(self):
-        self.logger = logging.getLogger(__name__)
 
-        self.handler_list = []
-        self.handler_list_lock = threading.RLock()
+class Priority(IntEnum):
+    """ Dispatch priority classes. Lower values are dispatched first. """
+    CONTROL = 0
+    DATA = 1
+
+
+# Events the tx pipeline waits on
+CONTROL_EVENTS = frozenset((
+    EventType.RSP_EVENT,
+    EventType.RSP_SEND,
+    EventType.MESH_TX_COMPLETE,
+    EventType.DEV_RESET,
+    EventType.ECHO,
+    EventType.SEQ_UPDATE,
+    EventType.CACHE_SIZE,
+    EventType.UART_DISCONNECTION,
+))
 
-        self.event_queue = queue.Queue()
+
+class DispatchLane:
+    """ Events queue, dispatched by a dedicated thread. Control events are
+    dispatched before the data events queued before them; events of the
+    same class are dispatched in order.
+
+    :param name: Thread name.
+    :type name: str
+    :param dispatch: Function called for each event.
+    :type dispatch: Callable
+    """
+    def __init__(self, name, dispatch):
+        self.name = name
+        self.dispatch = dispatch
+        # Queue[(priority, sequence, timestamp, event)]
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
         self.running = True
-        threading.Thread(target=self.process_packets, name='EvtHandler').start()
+        self.dispatched = dict.fromkeys(Priority, 0)
+        self.latency_total = dict.fromkeys(Priority, 0)
+        self.latency_max = dict.fromkeys(Priority, 0)
+        threading.Thread(target=self.run, name=name).start()
 
-    def process_packets(self):
+    def put(self, event, priority=Priority.DATA):
+        self.queue.put((priority, next(self.sequence), time.monotonic(),
+            event))
+
+    def run(self):
         while self.running:
             try:
-                event = self.event_queue.get(timeout=1)
+                priority, _, timestamp, event = self.queue.get(timeout=1)
             except queue.Empty:
                 continue
+            latency = time.monotonic() - timestamp
+            self.dispatched[priority] += 1
+            self.latency_total[priority] += latency
+            if latency > self.latency_max[priority]:
+                self.latency_max[priority] = latency
+            self.dispatch(event)
+
+    def stop(self):
+        self.running = False
+
+    def get_stats(self):
+        """ Returns the lane counters, total and by priority class.
+        Latencies are in seconds, from the event being queued until it is
+        dispatched.
+
+        :return: Queued events, and dispatched events and average and
+            maximum latency, total and in a dict for each class, by class
+            name.
+        :rtype: dict
+        """
+        stats = {"queued": self.queue.qsize()}
+        for priority in Priority:
+            dispatched = self.dispatched[priority]
+            stats[priority.name.lower()] = {
+                "dispatched": dispatched,
+                "latency_avg": (self.latency_total[priority] / dispatched
+                    if dispatched else 0),
+                "latency_max": self.latency_max[priority],
+            }
+        dispatched = sum(self.dispatched.values())
+        stats["dispatched"] = dispatched
+        stats["latency_avg"] = (sum(self.latency_total.values()) / dispatched
+            if dispatched else 0)
+        stats["latency_max"] = max(self.latency_max.values())
+        return stats
+
+
+class EventHandler:
+    """ Dispatches every event to the registered handlers, in order.
+
+    A handler can be registered for some event types and for a node only.
+    Handlers are looked up by event type, so the cost of dispatching an
+    event depends on the handlers interested in it, not on the total.
+
+    By default, events are queued and dispatched by a dedicated thread.
+    If *workers* is given, node events are dispatched by that many
+    threads instead, sharded by node address, so the events of a node are
+    still handled in order, and a slow handler only delays the nodes of
+    its shard. Events without a node (command responses, tx complete,
+    device events...) are dispatched by their own control thread, so they
+    are never delayed by node events. Handlers must be thread safe in
+    this mode.
 
-            if event.event_type in (EventType.WAKE_NOTIFY,
-                    EventType.WAKE_RESET, EventType.TASK_TIMEOUT,
-                    EventType.CONFIGURATION_TIMEOUT):
-                node = event.node
-                self.logger.debug(f'Event: {event.event_type.name}, '
-                    + f'Node: ({node.mac.hex()}, {node.unicast_addr})')
+    In both modes, the events the tx pipeline waits on (see
+    :data:`CONTROL_EVENTS`) are dispatched before any queued data event.
+
+    If an asyncio event loop is given, events are dispatched in the loop
+    thread instead, and no thread is started.
+
+    :param loop: Event loop used to dispatch the events. Optional.
+    :type loop: :class:`asyncio.AbstractEventLoop`
+    :param workers: Threads dispatching node events. Optional, defaults
+        to 0, every event is dispatched by the same thread.
+    :type workers: int
+    """
+    def __init__(self, loop=None, workers=0):
+        self.logger = logging.getLogger(__name__)
+
+        self.handler_list = [] # List[(handler, event types, node)]
+        self.handler_list_lock = threading.RLock()
+        # Dict[event type, Tuple[(handler, node)]], rebuilt on every change
+        # so dispatch needs no lock. Wildcard handlers are in every entry.
+        self.handler_table = {}
+        self.wildcard_handlers = ()
+
+        self.loop = loop
+        self.running = True
+        self.control_lane = None
+        self.lanes = [] # Node event lanes, by address
+        if self.loop is None:
+            self.control_lane = DispatchLane('EvtHandler', self.dispatch)
+            for i in range(workers):
+                self.lanes.append(DispatchLane(f'EvtHandler-{i}',
+                    self.dispatch))
+
+    def get_lane(self, event):
+        if not self.lanes:
+            return self.control_lane
+        node = getattr(event, "node", None)
+        if node is not None:
+            address = node.unicast_addr
+        elif hasattr(event, "mesh_data"):
+            # Messages from unknown nodes or other gateways
+            address = event.mesh_data.src
+        else:
+            return self.control_lane
+        return self.lanes[address % len(self.lanes)]
+
+    def dispatch(self, event):
+        if not self.running:
+            return
+        if event.event_type in (EventType.WAKE_NOTIFY,
+                EventType.WAKE_RESET, EventType.TASK_TIMEOUT,
+                EventType.CONFIGURATION_TIMEOUT):
+            node = event.node
+            self.logger.debug(f'Event: {event.event_type.name}, '
+                + f'Node: ({node.mac.hex()}, {node.unicast_addr})')
+        else:
+            if (event.event_type == EventType.RSP_EVENT
+                    or event.event_type == EventType.RSP_SEND
+                    or event.event_type == EventType.MESH_TX_COMPLETE
+                    or event.event_type == EventType.TRANSPORT_FR_DATA):
+                self.logger.log(9, f'Event: {event.event_type.name}')
             else:
-                if (event.event_type == EventType.RSP_EVENT
-                        or event.event_type == EventType.RSP_SEND
-                        or event.event_type == EventType.MESH_TX_COMPLETE
-                        or event.event_type == EventType.TRANSPORT_FR_DATA):
-                    self.logger.log(9, f'Event: {event.event_type.name}')
-                else:
-                    self.logger.log(9, f'Event: {event.event_type.name}')
+                self.logger.log(9, f'Event: {event.event_type.name}')
+        handlers = self.handler_table.get(event.event_type,
+            self.wildcard_handlers)
 # pylint: disable=bare-except
-            try:
-                with self.handler_list_lock:
-                    for handler in self.handler_list:
-                        handler(event)
-            except:
-                self.logger.exception("Event handler error")
+        try:
+            for handler, node in handlers:
+                if node is None or node == getattr(event, "node", None):
+                    handler(event)
+        except:
+            self.logger.exception("Event handler error")
 # pylint: enable=bare-except
 
     def add_event(self, event):
-        self.event_queue.put(event)
+        if self.loop is None:
+            if event.event_type in CONTROL_EVENTS:
+                self.get_lane(event).put(event, Priority.CONTROL)
+            else:
+                self.get_lane(event).put(event, Priority.DATA)
+        else:
+            self.loop.call_soon_threadsafe(self.dispatch, event)
 
-    def add_handler(self, handler):
+    def add_handler(self, handler, event_types=None, node=None):
+        """ Registers a handler. If it is already registered, its filters
+        are replaced, and it keeps its position in the calling order.
+
+        :param handler: Handler to be added.
+        :type handler: Callable
+        :param event_types: Event types the handler is called for. Optional,
+            defaults to every event type.
+        :type event_types: iterable of
+            :class:`~ttgwlib.events.event.EventType`
+        :param node: Only call the handler for the events of this node.
+            Optional, defaults to every event.
+        :type node: :class:`~ttgwlib.node.Node`
+        """
+        if event_types is not None:
+            event_types = frozenset(event_types)
+        entry = (handler, event_types, node)
         with self.handler_list_lock:
-            if handler not in self.handler_list:
-                self.handler_list.append(handler)
+            for i, h in enumerate(self.handler_list):
+                if h[0] == handler:
+                    self.handler_list[i] = entry
+                    break
+            else:
+                self.handler_list.append(entry)
+            self.build_handler_table()
 
     def remove_handler(self, handler):
         with self.handler_list_lock:
-            if handler in self.handler_list:
-                self.handler_list.remove(handler)
+            self.handler_list = [h for h in self.handler_list
+                if h[0] != handler]
+            self.build_handler_table()
+
+    def build_handler_table(self):
+        table = {}
+        for _, event_types, _ in self.handler_list:
+            for event_type in event_types or ():
+                table[event_type] = []
+        wildcards = []
+        for handler, event_types, node in self.handler_list:
+            if event_types is None:
+                wildcards.append((handler, node))
+                for handlers in table.values():
+                    handlers.append((handler, node))
+            else:
+                for event_type in event_types:
+                    table[event_type].append((handler, node))
+        self.handler_table = {event_type: tuple(handlers)
+            for event_type, handlers in table.items()}
+        self.wildcard_handlers = tuple(wildcards)
+
+    def get_stats(self):
+        """ Returns the counters of every dispatch lane, see
+        :func:`DispatchLane.get_stats`. It is empty if events are
+        dispatched in an asyncio event loop.
+
+        :return: Dict[lane name, lane counters].
+        :rtype: dict
+        """
+        if self.control_lane is None:
+            return {}
+        return {lane.name: lane.get_stats()
+            for lane in [self.control_lane] + self.lanes}
 
     def stop(self):
         self.running = False
+        if self.control_lane is not None:
+            self.control_lane.stop()
+        for lane in self.lanes:
+            lane.stop()
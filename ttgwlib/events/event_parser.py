@@ -1,10 +1,10 @@
-import struct
 import logging
 import threading
 
 from ttgwlib.events import mesh_events
 from ttgwlib.events import model_events
 from ttgwlib.events.uart_events import UartDisconnection
+from ttgwlib.uart_async import AsyncTransport
 
 
 logger = logging.getLogger(__name__)
@@ -86,30 +86,26 @@ class EventParser:
         self.uart = self.gw.uart
         self.event_handler = self.gw.event_handler
         self.running = True
-        threading.Thread(target=self.rx_process, name='EvtParser').start()
+        if isinstance(self.uart, AsyncTransport):
+            # Frames are processed in the event loop as they are received
+            self.uart.set_handlers(self.process_packet, self.disconnected)
+        else:
+            threading.Thread(target=self.rx_process, name='EvtParser').start()
 
     def rx_process(self):
-        start = bytearray.fromhex("048102")
-        msg = bytearray(5)
-        # Ignore incoming messages until the start message is received
-        while start != msg[:3]:
-            msg = msg[1:5] + self.uart.get_byte()
-        self.process_packet(msg)
-
+        # The uart ignores incoming bytes until the start message is received
         while self.running:
             if not self.uart.is_connected():
-                event = UartDisconnection(self.gw)
-                self.event_handler.add_event(event)
-                self.stop()
-            msg = bytearray()
-            msg += self.uart.get_byte(1)
+                self.disconnected()
+            msg = self.uart.get_frame(1)
             if msg:
-                while len(msg) < msg[0] + 1:
-                    if not self.running:
-                        return
-                    msg += self.uart.get_byte(1)
                 self.process_packet(msg)
 
+    def disconnected(self):
+        event = UartDisconnection(self.gw)
+        self.event_handler.add_event(event)
+        self.stop()
+
     def stop(self):
         self.running = False
 
@@ -128,45 +124,37 @@ class EventParser:
         if opcode in MESH_EVENT_OPCODES:
             return MESH_EVENT_OPCODES[opcode](data[2:], self.gw)
         if opcode == 0xD0 or opcode == 0xD1:
-            return self.model_deserialize(data[2:])
+            # Model payloads are decoded on demand, see ModelMessageEvent
+            return self.model_deserialize(memoryview(data)[2:])
         return None
 
     def model_deserialize(self, data):
-        data_unpacked = struct.unpack("<HHHHBB6sbHI", data[0:23])
-        mesh_data = {}
-        mesh_data["src"] = data_unpacked[0]
-        mesh_data["dst"] = data_unpacked[1]
-        mesh_data["appkey_handle"] = data_unpacked[2]
-        mesh_data["subnet_handle"] = data_unpacked[3]
-        mesh_data["ttl"] = data_unpacked[4]
-        mesh_data["adv_addr_type"] = data_unpacked[5]
-        adv_addr = bytearray(data_unpacked[6])
-        adv_addr.reverse()
-        mesh_data["adv_addr"] = bytes(adv_addr)
-        mesh_data["rssi"] = data_unpacked[7]
-        mesh_data["actual_length"] = data_unpacked[8]
-        mesh_data["sequence_number"] = data_unpacked[9]
-        raw_model_data = data[23:] # Variable length
+        header = model_events.MESH_HEADER.unpack_from(data)
+        # Advertisement address is received in little endian
+        mesh_data = model_events.MeshHeader._make(header[:6]
+            + (header[6][::-1],) + header[7:])
+        # Variable length
+        raw_model_data = data[model_events.MESH_HEADER.size:]
 
         # Check replay cache
-        if (not self.gw.replay_cache.check_seq_number(mesh_data["src"],
-                mesh_data["sequence_number"])):
+        if (not self.gw.replay_cache.check_seq_number(mesh_data.src,
+                mesh_data.sequence_number)):
             return None
 
-        logger.log(9, f"{mesh_data['src']=}, {mesh_data['dst']=}, " +
-                     f"{mesh_data['ttl']=}, {mesh_data['sequence_number']=}")
+        logger.log(9, f"{mesh_data.src=}, {mesh_data.dst=}, " +
+                     f"{mesh_data.ttl=}, {mesh_data.sequence_number=}")
 
         # Check node exists
         # If addr <= 10, msg is from another gateway (transport model)
         #TODO Create some object or class to reference other gateways
-        node = self.gw.node_db.get_node_by_address(mesh_data["src"])
-        if node is None and mesh_data["src"] > 10:
+        node = self.gw.node_db.get_node_by_address(mesh_data.src)
+        if node is None and mesh_data.src > 10:
             return model_events.UnknownNode(mesh_data, self.gw)
 
         opcode, model_data = self.model_get_opcode(raw_model_data)
         if opcode in MODEL_EVENT_OPCODES:
             return MODEL_EVENT_OPCODES[opcode](mesh_data, model_data, node,
-                self.gw)
+                self.gw, opcode)
         return None
 
     def model_get_opcode(self, data):
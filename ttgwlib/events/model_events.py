@@ -1,6 +1,17 @@
 import struct
 
 from ttgwlib.events.event import Event, EventType
+from ttgwlib.events.record import record
+
+
+# Header of the mesh model messages, see :class:`ModelEvent`
+MESH_HEADER = struct.Struct("<HHHHBB6sbHI")
+MeshHeader = record("MeshHeader", ("src", "dst", "appkey_handle",
+    "subnet_handle", "ttl", "adv_addr_type", "adv_addr", "rssi",
+    "actual_length", "sequence_number"))
+
+# Header fields copied to every model event data
+MESH_FIELDS = ("rssi", "ttl", "src", "sequence_number")
 
 
 class ModelEvent(Event):
@@ -45,627 +56,390 @@ class ModelEvent(Event):
         self.node = node
 
 
+class ModelMessageEvent(ModelEvent):
+    """ Base class for the events decoded from a model message. Decoding is
+    table driven: each subclass sets its event type, the precompiled
+    :class:`struct.Struct` of its payload, and the record class of its
+    data, made of the payload fields followed by :data:`MESH_FIELDS`.
+    Subclasses only override :func:`decode` if a field needs converting.
+
+    The payload is decoded the first time :attr:`data` is read, and the
+    result is cached, so the events that no handler looks into are never
+    decoded. Until then, the event keeps the header and the raw payload.
+
+    :param mesh_data: Message header.
+    :type mesh_data: :data:`MeshHeader`
+    :param raw_data: Message payload, after the opcode.
+    :type raw_data: bytes or memoryview
+    :param node: Node generating the event.
+    :type node: :class:`~node.Node`
+    :param opcode: Model message opcode.
+    :type opcode: int
+    """
+    EVENT_TYPE = None
+    PAYLOAD = None
+    RECORD = record("ModelMessage", MESH_FIELDS)
+
+    def __init__(self, mesh_data, raw_data, node, gw, opcode=None):
+        # Hot path: the base class attributes are set here, instead of
+        # chaining the base constructors
+        self.event_type = self.EVENT_TYPE
+        self.gw = gw
+        self.node = node
+        self.opcode = opcode
+        self.mesh_data = mesh_data
+        self.raw_data = raw_data
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.make_data(self.mesh_data, self.raw_data)
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+
+    def make_data(self, mesh_data, raw_data):
+        """ Decodes the event data. """
+        # The record class can be selected by decode
+        values = self.decode(raw_data)
+        return tuple.__new__(self.RECORD, values + (mesh_data.rssi,
+            mesh_data.ttl, mesh_data.src, mesh_data.sequence_number))
+
+    def decode(self, raw_data):
+        """ Returns the payload field values, in record order. """
+        if self.PAYLOAD is None:
+            return ()
+        return self.PAYLOAD.unpack(raw_data)
+
+
+def message_record(name, fields):
+    return record(name, fields + MESH_FIELDS)
+
+
 class UnknownNode(ModelEvent):
+    RECORD = message_record("UnknownNode", ("mac",))
+
     def __init__(self, mesh_data, gw):
-        data = {}
-        data["mac"] = mesh_data["adv_addr"].hex()
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
+        self.mesh_data = mesh_data
+        data = self.RECORD._make((mesh_data.adv_addr.hex(), mesh_data.rssi,
+            mesh_data.ttl, mesh_data.src, mesh_data.sequence_number))
         super().__init__(EventType.UNKNOWN_NODE, data, None, gw)
 
 
-class NodeReset(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        super().__init__(EventType.NODE_RESET, data, node, gw)
-
-
-class TempData(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<HB3sB", raw_data)
-        data["temp"] = data_unpacked[0]
-        data["hum"] =  data_unpacked[1]
-        data["press"] = int.from_bytes(data_unpacked[2], "little")
-        data["tid"] =  data_unpacked[3]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TEMP_DATA, data, node, gw)
-
-
-class TempDataReliable(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<HB3sB", raw_data)
-        data["temp"] = data_unpacked[0]
-        data["hum"] =  data_unpacked[1]
-        data["press"] = int.from_bytes(data_unpacked[2], "little")
-        data["tid"] =  data_unpacked[3]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TEMP_DATA_RELIABLE, data, node, gw)
-
-
-class IaAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.IA_ACK, data, node, gw)
-
-
-class TempConfigAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TEMP_CONFIG_ACK, data, node, gw)
-
-
-class TempCalibAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TEMP_CALIB_ACK, data, node, gw)
-
-
-class TempCalResetAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TEMP_CALIB_RESET_ACK, data, node, gw)
-
-
-class TempHeaterNotify(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TEMP_HEATER_NOTIFY, data, node, gw)
-
-
-class IaqData(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<BHBHB", raw_data)
-        data["iaq"] = data_unpacked[0]
-        data["tvoc"] = data_unpacked[1]
-        data["etoh"] = data_unpacked[2]
-        data["eco2"] = data_unpacked[3]
-        data["tid"] = data_unpacked[4]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.IAQ_DATA, data, node, gw)
-
-
-class Co2Data(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<HBHB", raw_data)
-        data["co2"] = data_unpacked[0]
-        data["cal_status"] = data_unpacked[1]
-        data["abc_time"] = data_unpacked[2]
-        data["tid"] = data_unpacked[3]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.CO2_DATA, data, node, gw)
-
-
-class PwmtData(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<B", raw_data[:1])
-        data["ctl"] = data_unpacked[0]
-        phase_id = data["ctl"] & 0b11
-        message_id = (data["ctl"] >> 2) & 0b11
-        # value_type = (data["ctl"] >> 4) & 0b11
-        # calc_status = (data["ctl"] >> 6) & 0b11
-        if phase_id == 0:
-            if message_id == 0:
-                data_unpacked = struct.unpack("<Bhhh", raw_data)
-                data["p_tot"] = data_unpacked[1]
-                data["q_tot"] = data_unpacked[2]
-                data["s_tot"] = data_unpacked[3]
-            elif message_id == 1:
-                data_unpacked = struct.unpack("<Bhhh", raw_data)
-                data["ph12"] = data_unpacked[1] / 100
-                data["ph23"] = data_unpacked[2] / 100
-                data["ph31"] = data_unpacked[3] / 100
-            elif message_id == 2:
-                data_unpacked = struct.unpack("<BHHH", raw_data)
-                data["v12"] = data_unpacked[1] / 100
-                data["v23"] = data_unpacked[2] / 100
-                data["v31"] = data_unpacked[3] / 100
-            elif message_id == 3:
-                data_unpacked = struct.unpack("<Bi", raw_data[:-2])
-                data["e_tot"] = data_unpacked[1]
-        else:
-            if message_id == 0:
-                data_unpacked = struct.unpack("<BHHH", raw_data)
-                data["v"] = data_unpacked[1] / 100
-                data["i"] = data_unpacked[2] / 100
-                data["f"] = data_unpacked[3] / 100
-            elif message_id == 1:
-                data_unpacked = struct.unpack("<Bhh", raw_data[:-2])
-                data["p"] = data_unpacked[1]
-                data["pf"] = (data_unpacked[2] & 0x7F) / 100
-                data["ind"] = data_unpacked[2] >> 16 & 1
-            elif message_id == 2:
-                data_unpacked = struct.unpack("<Bhhh", raw_data)
-                data["q"] = data_unpacked[1]
-                data["s"] = data_unpacked[2]
-                data["ph"] = data_unpacked[3] / 100
-            elif message_id == 3:
-                data_unpacked = struct.unpack("<Bi", raw_data[:-2])
-                data["e"] = data_unpacked[1]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.PWMT_DATA, data, node, gw)
-
-
-class PwmtConfigAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.PWMT_CONFIG_ACK, data, node, gw)
-
-
-class PwmtConvAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.PWMT_CONV_ACK, data, node, gw)
-
-
-class OutputDacAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.OUTPUT_DAC_ACK, data, node, gw)
-
-
-class OutputDigAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.OUTPUT_DIG_ACK, data, node, gw)
-
-
-class BatData(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<HB", raw_data)
-        data["bat"] = data_unpacked[0]
-        data["tid"] = data_unpacked[1]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.BAT_DATA, data, node, gw)
-
-
-class LightAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.LIGHT_ACK, data, node, gw)
-
-
-class TapNotify(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<BBB", raw_data)
-        data["type"] = data_unpacked[0]
-        data["color"] = data_unpacked[1]
-        data["tid"] = data_unpacked[2]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TAP_NOTIFY, data, node, gw)
-
-
-class TapAckConf(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TAP_ACK_CONF, data, node, gw)
-
-
-class RssiNeighbrAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.RSSI_NEIGHBR_ACK, data, node, gw)
-
-
-class RssiNeighbrData(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<Hb", raw_data)
-        data["addr"] = data_unpacked[0]
-        data["rssi"] = data_unpacked[1]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.RSSI_NEIGHBR_DATA, data, node, gw)
-
-
-class RssiStatusAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<b", raw_data)
-        data["rssi"] = data_unpacked[0]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.RSSI_STATUS_ACK, data, node, gw)
-
-
-class RssiPing(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.RSSI_PING, data, node, gw)
-
-
-class RssiPingAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.RSSI_PING_ACK, data, node, gw)
-
-
-class PowerAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.POWER_ACK, data, node, gw)
-
-
-class HwmData(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<BBBB", raw_data)
-        data["hts"] = data_unpacked[0]
-        data["sht"] = data_unpacked[1]
-        data["fxx"] = data_unpacked[2]
-        data["lps"] = data_unpacked[3]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.HWM_DATA, data, node, gw)
-
-class HwmAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.HWM_ACK, data, node, gw)
-
-
-class DatetimeReq(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<B", raw_data)
-        data["tid"] = data_unpacked[0]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.DATETIME_REQ, data, node, gw)
-
-
-class DatetimeAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.DATETIME_ACK, data, node, gw)
-
-
-class TaskAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<bB", raw_data)
-        data["task_index"] = data_unpacked[0]
-        data["tid"] = data_unpacked[1]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TASK_ACK, data, node, gw)
-
-
-class TaskChangeAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<bB", raw_data)
-        data["task_index"] = data_unpacked[0]
-        data["tid"] = data_unpacked[1]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TASK_CHANGE_ACK, data, node, gw)
-
-
-class TaskDeleteAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<bB", raw_data)
-        data["delete_code"] = data_unpacked[0]
-        data["tid"] = data_unpacked[1]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TASK_DELETE_ACK, data, node, gw)
-
-
-class TaskDeleteOpAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<bB", raw_data)
-        data["delete_code"] = data_unpacked[0]
-        data["tid"] = data_unpacked[1]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TASK_DELETE_OP_ACK, data, node, gw)
-
-
-class TaskData(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<BI3s", raw_data)
-        data["opcode"] = data_unpacked[0]
-        data["event_date"] = data_unpacked[1]
-        data["period"] = int.from_bytes(data_unpacked[2], "little")
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TASK_SEND_TASKS, data, node, gw)
-
-
-class TaskGetTasksAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TASK_GET_TASKS_ACK, data, node, gw)
-
-
-class WakeNotify(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        if len(raw_data) == 2:
-            data_unpacked = struct.unpack("<BB", raw_data)
-            data["tid"] = data_unpacked[0]
-            data["conf"] = bool(data_unpacked[1])
-        else:
-            data_unpacked = struct.unpack("<B", raw_data)
-            data["tid"] = data_unpacked[0]
-        super().__init__(EventType.WAKE_NOTIFY, data, node, gw)
-
-
-class WakeReset(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<BB", raw_data)
-        data["board_id"] = data_unpacked[0]
-        data["reset_reason"] = data_unpacked[1]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.WAKE_RESET, data, node, gw)
-
-
-class WakeAckSleep(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.WAKE_ACK_SLEEP, data, node, gw)
-
-
-class WakeAckWait(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.WAKE_ACK_WAIT, data, node, gw)
-
-
-class WakeAckAlive(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.WAKE_ACK_ALIVE, data, node, gw)
-
-
-class OtaVersionAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<B", raw_data)
-        data["status"] = data_unpacked[0]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.OTA_VERSION_ACK, data, node, gw)
-
-
-class OtaStatusAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<B", raw_data)
-        data["status"] = data_unpacked[0]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.OTA_STATUS_ACK, data, node, gw)
-
-class OtaStoreAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<B", raw_data)
-        data["status"] = data_unpacked[0]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.OTA_STORE_ACK, data, node, gw)
-
-class OtaRelayAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<B", raw_data)
-        data["status"] = data_unpacked[0]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.OTA_RELAY_ACK, data, node, gw)
-
-class BeaconStartAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<B", raw_data)
-        data["tid"] = data_unpacked[0]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.BEACON_START_ACK, data, node, gw)
-
-
-class BeaconStopAck(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<B", raw_data)
-        data["tid"] = data_unpacked[0]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.BEACON_STOP_ACK, data, node, gw)
-
-class TransportRecv(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["data"] = raw_data
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TRANSPORT_RECV, data, node, gw)
-
-class TransportFrStart(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<H", raw_data)
-        data["len"] = data_unpacked[0]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TRANSPORT_FR_START, data, node, gw)
-
-class TransportFrEnd(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data_unpacked = struct.unpack("<6p",raw_data)
-        data["sum"] = data_unpacked[0]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TRANSPORT_FR_END, data, node, gw)
-
-class TransportFrData(ModelEvent):
-    def __init__(self, mesh_data, raw_data, node, gw):
-        data = {}
-        data["seq"], = struct.unpack("<H", raw_data[0:2])
-        data["data"] = raw_data[2:]
-        data["rssi"] = mesh_data["rssi"]
-        data["ttl"] = mesh_data["ttl"]
-        data["src"] = mesh_data["src"]
-        data["sequence_number"] = mesh_data["sequence_number"]
-        super().__init__(EventType.TRANSPORT_FR_DATA, data, node, gw)
+class NodeReset(ModelMessageEvent):
+    EVENT_TYPE = EventType.NODE_RESET
+
+
+class TempData(ModelMessageEvent):
+    EVENT_TYPE = EventType.TEMP_DATA
+    PAYLOAD = struct.Struct("<HB3sB")
+    RECORD = message_record("TempData", ("temp", "hum", "press", "tid"))
+
+    def decode(self, raw_data):
+        temp, hum, press, tid = self.PAYLOAD.unpack(raw_data)
+        return temp, hum, int.from_bytes(press, "little"), tid
+
+
+class TempDataReliable(TempData):
+    EVENT_TYPE = EventType.TEMP_DATA_RELIABLE
+
+
+class IaAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.IA_ACK
+
+
+class TempConfigAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.TEMP_CONFIG_ACK
+
+
+class TempCalibAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.TEMP_CALIB_ACK
+
+
+class TempCalResetAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.TEMP_CALIB_RESET_ACK
+
+
+class TempHeaterNotify(ModelMessageEvent):
+    EVENT_TYPE = EventType.TEMP_HEATER_NOTIFY
+
+
+class IaqData(ModelMessageEvent):
+    EVENT_TYPE = EventType.IAQ_DATA
+    PAYLOAD = struct.Struct("<BHBHB")
+    RECORD = message_record("IaqData", ("iaq", "tvoc", "etoh", "eco2",
+        "tid"))
+
+
+class Co2Data(ModelMessageEvent):
+    EVENT_TYPE = EventType.CO2_DATA
+    PAYLOAD = struct.Struct("<HBHB")
+    RECORD = message_record("Co2Data", ("co2", "cal_status", "abc_time",
+        "tid"))
+
+
+class PwmtData(ModelMessageEvent):
+    """ Power meter data. The payload layout depends on the phase and the
+    message id, encoded in the first byte (ctl).
+    """
+    EVENT_TYPE = EventType.PWMT_DATA
+    # Dict[(phase_id != 0, message_id), (payload, record)]
+    VARIANTS = {
+        (False, 0): (struct.Struct("<Bhhh"), message_record("PwmtTotal",
+            ("ctl", "p_tot", "q_tot", "s_tot"))),
+        (False, 1): (struct.Struct("<Bhhh"), message_record("PwmtPhases",
+            ("ctl", "ph12", "ph23", "ph31"))),
+        (False, 2): (struct.Struct("<BHHH"), message_record("PwmtVoltages",
+            ("ctl", "v12", "v23", "v31"))),
+        (False, 3): (struct.Struct("<Bixx"), message_record("PwmtEnergyTotal",
+            ("ctl", "e_tot"))),
+        (True, 0): (struct.Struct("<BHHH"), message_record("PwmtPhase",
+            ("ctl", "v", "i", "f"))),
+        (True, 1): (struct.Struct("<Bhhxx"), message_record("PwmtPower",
+            ("ctl", "p", "pf", "ind"))),
+        (True, 2): (struct.Struct("<Bhhh"), message_record("PwmtPowerPhase",
+            ("ctl", "q", "s", "ph"))),
+        (True, 3): (struct.Struct("<Bixx"), message_record("PwmtEnergy",
+            ("ctl", "e"))),
+    }
+    SCALED = {(False, 1), (False, 2), (True, 0)}
+
+    def decode(self, raw_data):
+        ctl = raw_data[0]
+        variant = (ctl & 0b11 != 0, (ctl >> 2) & 0b11)
+        # value_type = (ctl >> 4) & 0b11
+        # calc_status = (ctl >> 6) & 0b11
+        payload, self.RECORD = self.VARIANTS[variant]
+        values = payload.unpack(raw_data)
+        if variant in self.SCALED:
+            return (ctl, values[1] / 100, values[2] / 100, values[3] / 100)
+        if variant == (True, 1):
+            return (ctl, values[1], (values[2] & 0x7F) / 100,
+                values[2] >> 16 & 1)
+        if variant == (True, 2):
+            return (ctl, values[1], values[2], values[3] / 100)
+        return values
+
+
+class PwmtConfigAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.PWMT_CONFIG_ACK
+
+
+class PwmtConvAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.PWMT_CONV_ACK
+
+
+class OutputDacAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.OUTPUT_DAC_ACK
+
+
+class OutputDigAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.OUTPUT_DIG_ACK
+
+
+class BatData(ModelMessageEvent):
+    EVENT_TYPE = EventType.BAT_DATA
+    PAYLOAD = struct.Struct("<HB")
+    RECORD = message_record("BatData", ("bat", "tid"))
+
+
+class LightAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.LIGHT_ACK
+
+
+class TapNotify(ModelMessageEvent):
+    EVENT_TYPE = EventType.TAP_NOTIFY
+    PAYLOAD = struct.Struct("<BBB")
+    RECORD = message_record("TapNotify", ("type", "color", "tid"))
+
+
+class TapAckConf(ModelMessageEvent):
+    EVENT_TYPE = EventType.TAP_ACK_CONF
+
+
+class RssiNeighbrAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.RSSI_NEIGHBR_ACK
+
+
+class RssiNeighbrData(ModelMessageEvent):
+    """ The rssi field is the rssi of the neighbour, not of the message. """
+    EVENT_TYPE = EventType.RSSI_NEIGHBR_DATA
+    PAYLOAD = struct.Struct("<Hb")
+    RECORD = record("RssiNeighbrData", ("addr", "rssi", "ttl", "src",
+        "sequence_number"))
+
+    def make_data(self, mesh_data, raw_data):
+        return self.RECORD._make(self.PAYLOAD.unpack(raw_data)
+            + (mesh_data.ttl, mesh_data.src, mesh_data.sequence_number))
+
+
+class RssiStatusAck(ModelMessageEvent):
+    """ The rssi field is the rssi mean of the node, not of the message. """
+    EVENT_TYPE = EventType.RSSI_STATUS_ACK
+    PAYLOAD = struct.Struct("<b")
+    RECORD = record("RssiStatusAck", ("rssi", "ttl", "src",
+        "sequence_number"))
+
+    def make_data(self, mesh_data, raw_data):
+        return self.RECORD._make(self.PAYLOAD.unpack(raw_data)
+            + (mesh_data.ttl, mesh_data.src, mesh_data.sequence_number))
+
+
+class RssiPing(ModelMessageEvent):
+    EVENT_TYPE = EventType.RSSI_PING
+
+
+class RssiPingAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.RSSI_PING_ACK
+
+
+class PowerAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.POWER_ACK
+
+
+class HwmData(ModelMessageEvent):
+    EVENT_TYPE = EventType.HWM_DATA
+    PAYLOAD = struct.Struct("<BBBB")
+    RECORD = message_record("HwmData", ("hts", "sht", "fxx", "lps"))
+
+
+class HwmAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.HWM_ACK
+
+
+class DatetimeReq(ModelMessageEvent):
+    EVENT_TYPE = EventType.DATETIME_REQ
+    PAYLOAD = struct.Struct("<B")
+    RECORD = message_record("DatetimeReq", ("tid",))
+
+
+class DatetimeAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.DATETIME_ACK
+
+
+class TaskAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.TASK_ACK
+    PAYLOAD = struct.Struct("<bB")
+    RECORD = message_record("TaskAck", ("task_index", "tid"))
+
+
+class TaskChangeAck(TaskAck):
+    EVENT_TYPE = EventType.TASK_CHANGE_ACK
+
+
+class TaskDeleteAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.TASK_DELETE_ACK
+    PAYLOAD = struct.Struct("<bB")
+    RECORD = message_record("TaskDeleteAck", ("delete_code", "tid"))
+
+
+class TaskDeleteOpAck(TaskDeleteAck):
+    EVENT_TYPE = EventType.TASK_DELETE_OP_ACK
+
+
+class TaskData(ModelMessageEvent):
+    EVENT_TYPE = EventType.TASK_SEND_TASKS
+    PAYLOAD = struct.Struct("<BI3s")
+    RECORD = message_record("TaskData", ("opcode", "event_date", "period"))
+
+    def decode(self, raw_data):
+        opcode, event_date, period = self.PAYLOAD.unpack(raw_data)
+        return opcode, event_date, int.from_bytes(period, "little")
+
+
+class TaskGetTasksAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.TASK_GET_TASKS_ACK
+
+
+class WakeNotify(ModelMessageEvent):
+    """ Legacy nodes only send the tid, so the data has no conf field. """
+    EVENT_TYPE = EventType.WAKE_NOTIFY
+    PAYLOAD = struct.Struct("<BB")
+    RECORD = message_record("WakeNotify", ("tid", "conf"))
+    LEGACY_PAYLOAD = struct.Struct("<B")
+    LEGACY_RECORD = message_record("WakeNotifyLegacy", ("tid",))
+
+    def decode(self, raw_data):
+        if len(raw_data) != 2:
+            self.RECORD = self.LEGACY_RECORD
+            return self.LEGACY_PAYLOAD.unpack(raw_data)
+        tid, conf = self.PAYLOAD.unpack(raw_data)
+        return tid, bool(conf)
+
+
+class WakeReset(ModelMessageEvent):
+    EVENT_TYPE = EventType.WAKE_RESET
+    PAYLOAD = struct.Struct("<BB")
+    RECORD = message_record("WakeReset", ("board_id", "reset_reason"))
+
+
+class WakeAckSleep(ModelMessageEvent):
+    EVENT_TYPE = EventType.WAKE_ACK_SLEEP
+
+
+class WakeAckWait(ModelMessageEvent):
+    EVENT_TYPE = EventType.WAKE_ACK_WAIT
+
+
+class WakeAckAlive(ModelMessageEvent):
+    EVENT_TYPE = EventType.WAKE_ACK_ALIVE
+
+
+class OtaVersionAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.OTA_VERSION_ACK
+    PAYLOAD = struct.Struct("<B")
+    RECORD = message_record("OtaAck", ("status",))
+
+
+class OtaStatusAck(OtaVersionAck):
+    EVENT_TYPE = EventType.OTA_STATUS_ACK
+
+
+class OtaStoreAck(OtaVersionAck):
+    EVENT_TYPE = EventType.OTA_STORE_ACK
+
+
+class OtaRelayAck(OtaVersionAck):
+    EVENT_TYPE = EventType.OTA_RELAY_ACK
+
+
+class BeaconStartAck(ModelMessageEvent):
+    EVENT_TYPE = EventType.BEACON_START_ACK
+    PAYLOAD = struct.Struct("<B")
+    RECORD = message_record("BeaconAck", ("tid",))
+
+
+class BeaconStopAck(BeaconStartAck):
+    EVENT_TYPE = EventType.BEACON_STOP_ACK
+
+
+class TransportRecv(ModelMessageEvent):
+    EVENT_TYPE = EventType.TRANSPORT_RECV
+    RECORD = message_record("TransportRecv", ("data",))
+
+    def decode(self, raw_data):
+        return (bytes(raw_data),)
+
+
+class TransportFrStart(ModelMessageEvent):
+    EVENT_TYPE = EventType.TRANSPORT_FR_START
+    PAYLOAD = struct.Struct("<H")
+    RECORD = message_record("TransportFrStart", ("len",))
+
+
+class TransportFrEnd(ModelMessageEvent):
+    EVENT_TYPE = EventType.TRANSPORT_FR_END
+    PAYLOAD = struct.Struct("<6p")
+    RECORD = message_record("TransportFrEnd", ("sum",))
+
+
+class TransportFrData(ModelMessageEvent):
+    EVENT_TYPE = EventType.TRANSPORT_FR_DATA
+    PAYLOAD = struct.Struct("<H")
+    RECORD = message_record("TransportFrData", ("seq", "data"))
+
+    def decode(self, raw_data):
+        return self.PAYLOAD.unpack_from(raw_data) + (bytes(raw_data[2:]),)
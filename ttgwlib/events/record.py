@@ -0,0 +1,90 @@
+"""
+ttgwlib.events.record
+~~~~~~~~~~~~~~~~~~~~~
+
+Compact, read only event data records. A record is a named tuple (so it
+has no per instance dict, and its fields can be read as attributes), that
+can also be used as a read only dict: ``data["temp"]``, ``"conf" in data``,
+``data.get(...)``, ``data.items()``, ``dict(data)``, etc.
+
+"""
+from collections import namedtuple
+from collections.abc import Mapping
+
+
+class Record:
+    """ Dict compatible access for the named tuples created by
+    :func:`record`. Iterating over a record returns its field names, as a
+    dict would do.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self._asdict())
+
+    def __getnewargs__(self):
+        return tuple(tuple.__iter__(self))
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        if index is None:
+            return default
+        return tuple.__getitem__(self, index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self):
+        return list(tuple.__iter__(self))
+
+    def items(self):
+        return list(zip(self._fields, tuple.__iter__(self)))
+
+    def _asdict(self):
+        return dict(zip(self._fields, tuple.__iter__(self)))
+
+
+Mapping.register(Record)
+
+
+def record(name, fields):
+    """ Creates a record class with the given fields.
+
+    :param name: Class name.
+    :type name: str
+    :param fields: Field names, in order.
+    :type fields: tuple of str
+
+    :return: New record class. Instances are created from the field
+        values, in order, with ``cls._make(values)``.
+    :rtype: type
+    """
+    base = namedtuple(name, fields)
+    return type(name, (Record, base), {
+        "__slots__": (),
+        "_index": {field: i for i, field in enumerate(fields)},
+    })
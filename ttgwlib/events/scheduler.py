@@ -0,0 +1,173 @@
+import heapq
+import logging
+import itertools
+import threading
+
+from ttgwlib.clock import SystemClock
+
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledCall:
+    """ Handle of a call scheduled with :func:`TimerScheduler.schedule`. """
+    def __init__(self, scheduler, deadline, callback, args):
+        self.scheduler = scheduler
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """ Cancels the call, if it has not been executed yet. """
+        if not self.cancelled:
+            self.cancelled = True
+            self.scheduler.cancelled()
+
+
+class TimerScheduler:
+    """ Executes delayed calls from a single thread, so timeouts do not
+    need a thread each, as :class:`threading.Timer` does.
+
+    Calls are kept in a heap ordered by deadline. Cancelling a call only
+    marks it; cancelled calls are dropped when they reach the top of the
+    heap, or all at once when they are more than half of the heap.
+
+    Calls are executed in the scheduler thread, so they should be short,
+    like queueing an event.
+
+    With a virtual clock, no thread is started: calls are executed by
+    :func:`~ttgwlib.clock.VirtualClock.advance` instead.
+
+    :param clock: Clock the deadlines refer to. Optional, defaults to the
+        system clock.
+    :type clock: :class:`~ttgwlib.clock.SystemClock` or
+        :class:`~ttgwlib.clock.VirtualClock`
+    """
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else SystemClock()
+        self.heap = [] # List[(deadline, sequence, call)]
+        self.sequence = itertools.count()
+        self.cancelled_calls = 0
+        self.condition = threading.Condition()
+        self.running = True
+        if self.clock.virtual:
+            self.clock.attach(self)
+        else:
+            threading.Thread(target=self.run, name="Scheduler").start()
+
+    def time(self):
+        return self.clock.monotonic()
+
+    def schedule(self, delay, callback, *args):
+        """ Schedules a call.
+
+        :param delay: Seconds until the call.
+        :type delay: float
+        :param callback: Function to call.
+        :type callback: Callable
+        :param args: Function arguments.
+
+        :return: Handle to cancel the call.
+        :rtype: :class:`ScheduledCall`
+        """
+        call = ScheduledCall(self, self.time() + delay, callback, args)
+        with self.condition:
+            heapq.heappush(self.heap, (call.deadline, next(self.sequence),
+                call))
+            # Only wake up the thread if the next deadline changed
+            if self.heap[0][2] is call:
+                self.condition.notify()
+        return call
+
+    def cancelled(self):
+        with self.condition:
+            self.cancelled_calls += 1
+            if self.cancelled_calls > len(self.heap) // 2:
+                self.heap = [entry for entry in self.heap
+                    if not entry[2].cancelled]
+                heapq.heapify(self.heap)
+                self.cancelled_calls = 0
+
+    def pop_due(self, block=True):
+        """ Waits for the next due call and returns it, or None if the
+        scheduler is stopped.
+
+        :param block: Wait for a call to be due. If false, None is returned
+            if no call is due now.
+        :type block: bool
+        """
+        with self.condition:
+            while self.running:
+                if not self.heap:
+                    if not block:
+                        return None
+                    self.condition.wait()
+                    continue
+                deadline, _, call = self.heap[0]
+                if call.cancelled:
+                    heapq.heappop(self.heap)
+                    self.cancelled_calls = max(self.cancelled_calls - 1, 0)
+                    continue
+                now = self.time()
+                if deadline > now:
+                    if not block:
+                        return None
+                    self.condition.wait(deadline - now)
+                    continue
+                heapq.heappop(self.heap)
+                # A call can not be cancelled once it is due
+                call.cancelled = True
+                return call
+        return None
+
+    def next_deadline(self):
+        """ Returns the deadline of the next call, or None if there is no
+        call scheduled.
+        """
+        with self.condition:
+            while self.heap and self.heap[0][2].cancelled:
+                heapq.heappop(self.heap)
+                self.cancelled_calls = max(self.cancelled_calls - 1, 0)
+            return self.heap[0][0] if self.heap else None
+
+    def run_due(self):
+        """ Executes the calls due now, without waiting.
+
+        :return: Number of executed calls.
+        :rtype: int
+        """
+        executed = 0
+        while True:
+            call = self.pop_due(block=False)
+            if call is None:
+                return executed
+            self.execute(call)
+            executed += 1
+
+    def run(self):
+        while self.running:
+            call = self.pop_due()
+            if call is None:
+                break
+            self.execute(call)
+
+    def execute(self, call):
+# pylint: disable=bare-except
+        try:
+            call.callback(*call.args)
+        except:
+            logger.exception("Scheduled call error")
+# pylint: enable=bare-except
+
+    def pending(self):
+        """ Returns the number of calls waiting to be executed. """
+        with self.condition:
+            return len(self.heap) - self.cancelled_calls
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.clock.virtual:
+            self.clock.detach(self)
@@ -1,6 +1,4 @@
 
-import threading
-
 from ttgwlib.events.event import Event, EventType
 
 
@@ -20,9 +18,8 @@ class TimeEvent(Event):
         self.start()
 
     def start(self):
-        self.timer = threading.Timer(self.timeout,
-            self.gw.event_handler.add_event, [self])
-        self.timer.start()
+        self.timer = self.gw.scheduler.schedule(self.timeout,
+            self.gw.event_handler.add_event, self)
 
     def cancel(self):
         self.timer.cancel()
@@ -0,0 +1,141 @@
+"""
+ttgwlib.frame_buffer
+~~~~~~~~~~~~~~~~~~~~
+
+Receive buffer shared by the serial and socket transports. It splits the
+incoming byte stream into the length prefixed frames used by the device
+serial protocol.
+
+"""
+
+
+# First bytes of the DeviceStarted event, sent by the device after a reset
+START_FRAME = bytes.fromhex("048102")
+
+
+class FrameBuffer:
+    """ Preallocated receive buffer that extracts complete frames in place.
+
+    Every frame starts with a length byte, followed by that many bytes
+    (opcode and payload). Received bytes are appended at the tail of the
+    buffer, either copied with :func:`feed` or written directly into the
+    memoryview returned by :func:`reserve` and confirmed with
+    :func:`commit`. Complete frames are then returned by :func:`frames`
+    as memoryviews over the buffer, without copying them.
+
+    The buffer is used as a ring: when the free space at the end runs out,
+    the unconsumed bytes (at most one partial frame) are moved back to the
+    start, so frames are always contiguous. Because of this, the returned
+    memoryviews are only valid until the next write into the buffer.
+
+    Optionally, a synchronization prefix can be given. Until it is found,
+    received bytes are discarded. It is used to skip any garbage received
+    before the device start message.
+
+    :param size: Buffer size, in bytes.
+    :type size: int
+    :param sync: Prefix to wait for before extracting frames. Optional.
+    :type sync: bytes
+    """
+    MAX_FRAME = 256 # Length byte + up to 255 bytes
+
+    def __init__(self, size=4096, sync=None):
+        if size < 2 * self.MAX_FRAME:
+            raise ValueError(f"Buffer size must be at least {2*self.MAX_FRAME}")
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.head = 0 # First unconsumed byte
+        self.tail = 0 # First free byte
+        self.sync = sync
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def free(self):
+        """ Returns the number of bytes that can be written. """
+        return len(self.buffer) - len(self)
+
+    def reserve(self):
+        """ Returns a writable memoryview over the free space of the buffer.
+        After writing into it, :func:`commit` must be called with the
+        number of bytes written.
+
+        :return: Free space.
+        :rtype: memoryview
+        """
+        if len(self.buffer) - self.tail < self.MAX_FRAME:
+            self._compact()
+        return self.view[self.tail:]
+
+    def commit(self, size):
+        """ Confirms the bytes written in the view returned by
+        :func:`reserve`.
+
+        :param size: Number of bytes written.
+        :type size: int
+        """
+        self.tail += size
+
+    def feed(self, data):
+        """ Copies received bytes into the buffer.
+
+        :param data: Received bytes.
+        :type data: bytes or bytearray
+
+        :raises BufferError: Not enough free space.
+        """
+        size = len(data)
+        if size > len(self.buffer) - self.tail:
+            self._compact()
+            if size > len(self.buffer) - self.tail:
+                raise BufferError(f"Frame buffer full: {size}/{self.free()}")
+        self.view[self.tail:self.tail + size] = data
+        self.tail += size
+
+    def frames(self):
+        """ Yields the complete frames in the buffer, in order. Each frame
+        includes its length byte. Partial frames are kept until the rest
+        of their bytes are received.
+
+        :return: Complete frames.
+        :rtype: iterator of memoryview
+        """
+        if self.sync is not None and not self._synchronize():
+            return
+        buffer = self.buffer
+        while self.tail > self.head:
+            end = self.head + buffer[self.head] + 1
+            if end > self.tail:
+                break
+            frame = self.view[self.head:end]
+            self.head = end
+            yield frame
+        if self.head == self.tail:
+            self.head = self.tail = 0
+
+    def clear(self):
+        """ Discards every buffered byte. """
+        self.head = self.tail = 0
+
+    def discard(self):
+        """ Discards the buffered bytes, like :func:`clear`, but keeps
+        the bytes being written into the view returned by :func:`reserve`,
+        which can still be committed.
+        """
+        self.head = self.tail
+
+    def _synchronize(self):
+        index = self.buffer.find(self.sync, self.head, self.tail)
+        if index < 0:
+            # Keep the last bytes, in case the prefix is partially received
+            self.head = max(self.head, self.tail - len(self.sync) + 1)
+            return False
+        self.head = index
+        self.sync = None
+        return True
+
+    def _compact(self):
+        size = len(self)
+        self.buffer[:size] = self.buffer[self.head:self.tail]
+        self.head = 0
+        self.tail = size
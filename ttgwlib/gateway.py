@@ -8,13 +8,15 @@ made by a Nordic nRF52 microcontroller which acts both as provisioner and as
 gateway. The microcontroller is managed by this library through serial
 interface.
 """
-import time
 
 from ttgwlib.version import VERSION
 from ttgwlib.uart import Uart
 from ttgwlib.uart_socket import UartSocket
+from ttgwlib.uart_async import AsyncUart, AsyncUartSocket
+from ttgwlib.capture import CaptureWriter, ReplayUart
 from ttgwlib.tx_manager import TxManager
 from ttgwlib.events.event_handler import EventHandler
+from ttgwlib.events.scheduler import TimerScheduler
 from ttgwlib.events.replay_cache import ReplayCache
 from ttgwlib.events.event_parser import EventParser
 from ttgwlib.ota_helper import OtaHelper
@@ -22,8 +24,11 @@ from ttgwlib.provisioning.prov_manager import ProvManager
 from ttgwlib.dev_manager import DeviceManager
 from ttgwlib.models.model_loader import ModelLoader
 from ttgwlib.platform.board import Platform
+from ttgwlib.platform.exception import GatewayError
 from ttgwlib.passthrough import Passthrough
 from ttgwlib.whitelist import Whitelist
+from ttgwlib.node_cache import NodeCache
+from ttgwlib.clock import SystemClock
 
 
 class Gateway:
@@ -44,6 +49,8 @@ class Gateway:
     application the function :func:`close` should be called to prevent from
     serial syncronization errors.
     """
+    START_TIMEOUT = 30 # Seconds to wait for the microcontroller start up
+
     def __init__(self):
         self.listener = False
         self.prov_mode = False
@@ -51,6 +58,8 @@ class Gateway:
         self.node_db = None
         self.uart = None
         self.event_handler = None
+        self.scheduler = None
+        self.clock = SystemClock()
         self.replay_cache = None
         self.event_parser = None
         self.ota_helper = None
@@ -59,9 +68,12 @@ class Gateway:
         self.dev_manager = None
         self.tx_manager = None
         self.programmer = None
+        self.fw_flashed = False # The device tables were wiped by a flash
         self.passthrough = None
         self.whitelist = None
         self.remote = None
+        self.capture = None
+        self.loop = None # Set by AsyncGateway to run on an asyncio loop
 
     def init(self, config):
         """ Initializes all needed objects and the microcontroller.
@@ -71,15 +83,27 @@ class Gateway:
         :type: :class:`~ttgwlib.config.Config`
 
         :raises SerialException: If it can not connect to the provided port.
-        :raises GatewayError: Error connecting to the microcontroller.
+        :raises GatewayError: Error connecting to the microcontroller, or
+            it was not configured in :attr:`START_TIMEOUT` seconds. The
+            background threads are stopped.
         """
         self.prov_mode = config.prov_mode
         self.config_mode = config.config_mode
-        self.node_db = config.node_db
+        if config.clock is not None:
+            self.clock = config.clock
+        if config.node_cache:
+            self.node_db = NodeCache(config.node_db, config.unknown_node_ttl)
+        else:
+            self.node_db = config.node_db
         self.whitelist = Whitelist(self)
-        self.config_platform(config.platform, config.port)
-
-        self.event_handler = EventHandler()
+        self.config_platform(config.platform, config.port,
+            config.replay_speed)
+        if config.capture_file:
+            self.capture = CaptureWriter(config.capture_file)
+            self.uart.set_capture(self.capture)
+
+        self.event_handler = EventHandler(self.loop, config.dispatch_workers)
+        self.scheduler = TimerScheduler(self.clock)
         self.ota_helper = OtaHelper(self.uart)
         self.replay_cache = ReplayCache()
         self.event_parser = EventParser(self)
@@ -88,10 +112,19 @@ class Gateway:
         self.models = ModelLoader(self)
 
         self.dev_manager = DeviceManager(self, config.seq_number_file,
-            self.remote)
-        self.tx_manager = TxManager(self)
+            self.remote, config.handle_file if config.warm_restart else None,
+            config.max_devkeys, config.max_addresses)
+        if self.fw_flashed:
+            # The stored handles are not in the device anymore
+            self.dev_manager.handles.discard()
+        self.tx_manager = TxManager(self, config.max_tx_window,
+            config.tx_weights)
         if not self.remote:
-            self.dev_manager.start_device()
+            if not self.dev_manager.start_device(self.START_TIMEOUT):
+                self.close()
+                raise GatewayError("Device configuration failed")
+        elif isinstance(self.uart, ReplayUart):
+            self.uart.start()
 
         if config.config_cb:
             self.models.task_queue.set_confifuration_cb(config.config_cb)
@@ -118,18 +151,25 @@ class Gateway:
         """ Stops the microcontroller and the background threads.
         Should be called before exiting the application.
         """
-        if self.dev_manager is not None and self.dev_manager.dev_started:
-            self.stop_scan()
-            if isinstance(self.uart, Uart):
-                self.dev_manager.stop_device()
+        if self.dev_manager is not None:
+            # The microcontroller is only stopped if it was configured
+            if self.dev_manager.dev_started and self.dev_manager.config_ok:
+                self.stop_scan()
+                if not self.remote:
+                    self.dev_manager.stop_device()
             self.uart.stop()
             self.event_parser.stop()
             self.event_handler.stop()
+            self.scheduler.stop()
             self.tx_manager.stop()
+            self.dev_manager.stop()
         elif self.passthrough is not None:
             self.passthrough.stop()
+        if self.capture is not None:
+            self.uart.set_capture(None)
+            self.capture.close()
 
-    def config_platform(self, platform, port):
+    def config_platform(self, platform, port, replay_speed=1.0):
         """ Configurates the platform, which includes the uart, the programmer,
         and the firmware update.
         """
@@ -143,21 +183,49 @@ class Gateway:
             from ttgwlib.platform.openocd import OpenOCD
             self.programmer = OpenOCD()
 
-        if platform == Platform.CLOUD:
-            self.uart = UartSocket(port)
+        if platform == Platform.REPLAY:
+            self.uart = ReplayUart(port, replay_speed)
+            self.remote = True
+        elif platform == Platform.SIMULATOR:
+            from ttgwlib.platform.simulator import SimulatedDevice
+            if port is None:
+                port = SimulatedDevice()
+            if isinstance(port, str):
+                # Pseudo terminal of a simulated device, see open_pty
+                if self.loop:
+                    self.uart = AsyncUart(port, self.loop)
+                else:
+                    self.uart = Uart(port)
+            elif self.loop:
+                self.uart = AsyncUartSocket(port.connect(), self.loop)
+            else:
+                self.uart = UartSocket(port.connect())
+            self.remote = False
+        elif platform == Platform.CLOUD:
+            if self.loop:
+                self.uart = AsyncUartSocket(port, self.loop)
+            else:
+                self.uart = UartSocket(port)
             self.remote = True
         else:
             self.programmer.init()
-            self.programmer.update_fw()
+            self.fw_flashed = bool(self.programmer.update_fw())
             if not port:
                 port = self.programmer.get_serial_port()
-            self.uart = Uart(port)
+            if self.loop:
+                self.uart = AsyncUart(port, self.loop)
+            else:
+                self.uart = Uart(port)
             self.remote = False
 
     def reset(self):
-        """ Resets the microcontroller.
+        """ Resets the microcontroller, and waits until it is configured.
+
+        :raises GatewayError: The configuration failed, or did not end in
+            :attr:`START_TIMEOUT` seconds.
         """
-        self.dev_manager.start_device()
+        if not self.dev_manager.start_device(self.START_TIMEOUT):
+            raise GatewayError("Device configuration failed")
 
     def check_connection(self):
         """ Checks the uart connection with the microcontroller.
@@ -167,18 +235,29 @@ class Gateway:
         """
         return self.dev_manager.check_connection()
 
-    def add_event_handler(self, handler):
+    def add_event_handler(self, handler, event_types=None, node=None):
         """ Adds an event handler that will be called every time a new
         event is generated by the library. The handler must be a
         Callable object that receives a
         :class:`~ttgwlib.events.event.Event` object as the only
-        parameter. It may want to filter the event type to process
-        only the events wanted.
+        parameter.
+
+        The handler can be restricted to some event types, and to the
+        events of one node. Restricted handlers are only called for the
+        matching events, which is cheaper than filtering in the handler.
+        If the handler is already added, its filters are replaced.
 
         :param handler: Handler to be added.
         :type handler: Callable
+        :param event_types: Event types to process. Optional, defaults to
+            every event type.
+        :type event_types: iterable of
+            :class:`~ttgwlib.events.event.EventType`
+        :param node: Node whose events are processed. Optional, defaults to
+            every event.
+        :type node: :class:`~ttgwlib.node.Node`
         """
-        self.event_handler.add_handler(handler)
+        self.event_handler.add_handler(handler, event_types, node)
 
     def remove_event_handler(self, handler):
         """ Removes a previosly added event handler.
@@ -222,6 +301,76 @@ class Gateway:
             "netkey": self.node_db.get_netkey().hex()
         }
 
+    def get_dispatch_stats(self):
+        """ Returns the event dispatch counters, by dispatch thread: queued
+        and dispatched events, and average and maximum time waited in the
+        queue, in seconds, in total and for each priority class (control
+        and data), see :class:`~ttgwlib.events.event_handler.EventHandler`.
+
+        :return: Dict[thread name, counters dictionary].
+        :rtype: dict
+        """
+        return self.event_handler.get_stats()
+
+    def get_command_stats(self):
+        """ Returns the response latency of the serial commands, by
+        command name: responses, average and maximum latency, in seconds,
+        and latency histogram, see
+        :class:`~ttgwlib.dev_manager.CommandStats`.
+
+        :return: Dict[command name, counters dictionary].
+        :rtype: dict
+        """
+        return self.dev_manager.get_cmd_stats()
+
+    def get_handle_stats(self):
+        """ Returns the counters of the device key and publication address
+        tables of the microcontroller: entries, capacity, hits, misses and
+        evictions, see :class:`~ttgwlib.dev_manager.HandleManager`.
+
+        :return: Dict[table name, counters dictionary].
+        :rtype: dict
+        """
+        return self.dev_manager.handles.get_stats()
+
+    def get_tx_stats(self):
+        """ Returns the mesh send window state and counters: window size,
+        packets in flight, completed and failed, window decreases, packets
+        reclaimed after a lost completion or a device reset, and average
+        and maximum completion time, in seconds, see
+        :class:`~ttgwlib.tx_manager.SendWindow`. The packets queued, sent
+        and dropped past their deadline, and their queue time, of each
+        traffic class are in *classes*, see
+        :class:`~ttgwlib.tx_manager.FairQueue`.
+
+        :return: Send window counters.
+        :rtype: dict
+        """
+        return self.tx_manager.get_stats()
+
+    def get_task_stats(self):
+        """ Returns the node task counters: nodes with tasks, tasks
+        pending, and tasks replaced by a newer one of the same kind before
+        being sent, each one a mesh round trip saved, see
+        :func:`~ttgwlib.models.task.Task.coalesce_key`.
+
+        :return: Task counters.
+        :rtype: dict
+        """
+        return self.models.task_queue.get_stats()
+
+    def get_start_timing(self):
+        """ Returns the duration of the last microcontroller start up:
+        seconds from the reset to the microcontroller started event, total
+        seconds to configure it, and seconds until the response of each
+        configuration step, see
+        :func:`~ttgwlib.dev_manager.DeviceManager.get_start_timing`.
+
+        :return: Start up timing.
+        :rtype: dict
+        """
+        return self.dev_manager.get_start_timing()
+
     def set_listener(self, on):
         """ Activates/Deactivates listener mode, used to listen with
         more than one gateway in the same Mesh net, to avoid
@@ -698,7 +847,8 @@ class Gateway:
         :param wait_time: Seconds to wait until first execution.
         :type wait_time: integer
         """
-        self.change_task(node, opcode, int(time.time()) + wait_time, period, 0)
+        self.change_task(node, opcode, int(self.clock.time()) + wait_time,
+            period, 0)
 
     def config_task_legacy(self, node, opcode, period, wait_time=0):
         """ Sets a new config task (legacy).
@@ -711,7 +861,8 @@ class Gateway:
         :param wait_time: Seconds to wait until first execution.
         :type wait_time: integer
         """
-        self.set_task(node, opcode, int(time.time()) + wait_time, period, 0)
+        self.set_task(node, opcode, int(self.clock.time()) + wait_time,
+            period, 0)
 
     def node_reboot(self, node):
         self.models.task_gw.task_gw_conf_mono(node, 9, 1000, 0)
@@ -10,4 +10,4 @@ class Battery(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        super().__init__(gateway, [])
+        super().__init__(gateway, {})
@@ -16,9 +16,10 @@ class Beacon(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        handlers = [
-            self.beacon_ack_handler,
-        ]
+        handlers = {
+            self.beacon_ack_handler: (EventType.BEACON_START_ACK,
+                EventType.BEACON_STOP_ACK),
+        }
         self.bcn_tid = 0
         super().__init__(gateway, handlers)
 
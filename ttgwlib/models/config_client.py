@@ -14,7 +14,7 @@ class ConfigurationClient(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        super().__init__(gateway, [])
+        super().__init__(gateway, {})
 
     def reset(self, node):
         message = self.NODE_RESET
@@ -1,6 +1,5 @@
 import struct
 import logging
-from datetime import datetime as dt
 
 import ttgwlib.events.time_events as te
 from ttgwlib.models.task import Task
@@ -18,9 +17,9 @@ class Datetime(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        handlers = [
-            self.datetime_req_handler,
-        ]
+        handlers = {
+            self.datetime_req_handler: (EventType.DATETIME_REQ,),
+        }
         super().__init__(gateway, handlers)
 
     def datetime(self, node, datetime):
@@ -45,8 +44,12 @@ class SendDatetimeTask(Task):
         self.retries = 0
         self.timeout = None
 
+    def coalesce_key(self):
+        # The datetime is read when the task is executed
+        return SendDatetimeTask
+
     def execute(self):
-        now = int(dt.now().timestamp())
+        now = int(self.model.gw.clock.time())
         self.model.datetime(self.node, now)
         self.timeout = te.TaskTimeout(self.node, 2.5, self.model.gw)
         self.retries += 1
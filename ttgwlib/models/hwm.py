@@ -14,9 +14,9 @@ class Hwm(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        handlers = [
-            self.hwm_data_handler
-        ]
+        handlers = {
+            self.hwm_data_handler: (EventType.HWM_DATA,),
+        }
         super().__init__(gateway, handlers)
 
     def hwm(self, node):
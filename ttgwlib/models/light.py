@@ -17,7 +17,7 @@ class Light(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        handlers = []
+        handlers = {}
         super().__init__(gateway, handlers)
 
     def light(self, node, color):
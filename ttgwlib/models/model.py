@@ -1,8 +1,16 @@
+from ttgwlib.tx_manager import TrafficClass
+
+
 class Model:
     def __init__(self, gateway, handlers):
+        """ Handlers: Dict[handler, event types it processes]. A list of
+        handlers is also accepted, each one processes every event type.
+        """
         self.gw = gateway
-        for handler in handlers:
-            gateway.add_event_handler(handler)
+        if not isinstance(handlers, dict):
+            handlers = dict.fromkeys(handlers)
+        for handler, event_types in handlers.items():
+            gateway.add_event_handler(handler, event_types)
 
     def add_task(self, task):
         self.gw.models.task_queue.add_task(task)
@@ -13,8 +21,9 @@ class Model:
     def reschedule_tasks(self, node):
         self.gw.models.task_queue.reschedule_tasks(node)
 
-    def send(self, data, node):
-        self.gw.tx_manager.send_node(data, node)
+    def send(self, data, node, traffic_class=TrafficClass.DATA,
+            deadline=None):
+        self.gw.tx_manager.send_node(data, node, traffic_class, deadline)
 
     def send_addr(self, data, addr, low_priority=False):
         self.gw.tx_manager.send_addr(data, addr, low_priority)
@@ -1,6 +1,5 @@
 import struct
 import logging
-from datetime import datetime as dt
 
 import ttgwlib.events.time_events as te
 from ttgwlib.models.task import Task
@@ -36,11 +35,12 @@ class NrfTemp(Model):
     def __init__(self, gateway):
         self.gw = gateway
         self.logger = logging.getLogger(__name__)
-        handlers = [
-            self.temp_data_handler,
-            self.iaq_data_handler,
-            self.co2_data_handler,
-        ]
+        handlers = {
+            self.temp_data_handler: (EventType.TEMP_DATA,
+                EventType.TEMP_DATA_RELIABLE),
+            self.iaq_data_handler: (EventType.IAQ_DATA,),
+            self.co2_data_handler: (EventType.CO2_DATA,),
+        }
         super().__init__(gateway, handlers)
 
     def ia(self, node, status, n):
@@ -95,7 +95,7 @@ class NrfTemp(Model):
                 event.data["src"], event.node.mac.hex(), event.data["temp"],
                 event.data["hum"], event.data["press"], event.data["rssi"],
                 event.data["ttl"])
-            event.node.msg_timestamp = int(dt.now().timestamp())
+            event.node.msg_timestamp = int(self.gw.clock.time())
 
     def iaq_data_handler(self, event):
         if event.event_type == EventType.IAQ_DATA:
@@ -158,6 +158,9 @@ class ChangeIaTask(Task):
         self.retries = 0
         self.timeout = None
 
+    def coalesce_key(self):
+        return ChangeIaTask
+
     def execute(self):
         self.model.ia(self.node, self.status, self.n)
         self.timeout = te.TaskTimeout(self.node, 2.5, self.model.gw)
@@ -188,6 +191,9 @@ class ChangeConfigTask(Task):
         self.retries = 0
         self.timeout = None
 
+    def coalesce_key(self):
+        return ChangeConfigTask
+
     def execute(self):
         self.model.config(self.node, self.mode)
         self.timeout = te.TaskTimeout(self.node, 2.5, self.model.gw)
@@ -222,6 +228,9 @@ class ChangeCalibrationTask(Task):
         self.retries = 0
         self.timeout = None
 
+    def coalesce_key(self):
+        return ChangeCalibrationTask
+
     def execute(self):
         self.model.calibrate(self.node, self.temp_offset, self.humd_offset,
                 self.press_offset)
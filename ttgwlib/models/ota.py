@@ -21,7 +21,7 @@ class Ota(Model):
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
         self.gw = gateway
-        handlers = []
+        handlers = {}
         super().__init__(gateway, handlers)
         self.current_update = {}
         self.pending_nodes = []
@@ -16,10 +16,10 @@ class Output(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        handlers = [
-            self.output_dac_ack_handler,
-            self.output_dig_ack_handler,
-        ]
+        handlers = {
+            self.output_dac_ack_handler: (EventType.OUTPUT_DAC_ACK,),
+            self.output_dig_ack_handler: (EventType.OUTPUT_DIG_ACK,),
+        }
         super().__init__(gateway, handlers)
 
     def output_dac(self, node, dac_value):
@@ -15,9 +15,9 @@ class Power(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        handlers = [
-            self.power_ack_handler,
-        ]
+        handlers = {
+            self.power_ack_handler: (EventType.POWER_ACK,),
+        }
         super().__init__(gateway, handlers)
 
     def power(self, node, radio_power, dcdc_mode):
@@ -1,6 +1,5 @@
 import struct
 import logging
-from datetime import datetime as dt
 
 import ttgwlib.events.time_events as te
 from ttgwlib.models.task import Task
@@ -20,9 +19,9 @@ class Pwmt(Model):
     def __init__(self, gateway):
         self.gw = gateway
         self.logger = logging.getLogger(__name__)
-        handlers = [
-            self.pwmt_data_handler,
-        ]
+        handlers = {
+            self.pwmt_data_handler: (EventType.PWMT_DATA,),
+        }
         super().__init__(gateway, handlers)
 
     def conf(self, node, phases, stats, values_ph, values_tot):
@@ -112,7 +111,7 @@ class Pwmt(Model):
                         event.data["src"], event.node.mac.hex(), phase_id,
                         value_type_str, calc_status, event.data["e"],
                         event.data["rssi"])
-            event.node.msg_timestamp = int(dt.now().timestamp())
+            event.node.msg_timestamp = int(self.gw.clock.time())
 
     def set_pwmt_rate(self, node, rate):
         self.gw.models.task_gw.set_rate(node, TaskOpcode.TASK_OP_PWMT_READ,
@@ -18,11 +18,11 @@ class Rssi(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        handlers = [
-            self.rssi_ping_handler,
-            self.rssi_ping_ack_handler,
-            self.rssi_status_handler
-        ]
+        handlers = {
+            self.rssi_ping_handler: (EventType.RSSI_PING,),
+            self.rssi_ping_ack_handler: (EventType.RSSI_PING_ACK,),
+            self.rssi_status_handler: (EventType.RSSI_STATUS_ACK,),
+        }
         super().__init__(gateway, handlers)
 
     def rssi_neghbr_req(self, node):
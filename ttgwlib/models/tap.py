@@ -15,7 +15,7 @@ class Tap(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        handlers = []
+        handlers = {}
         super().__init__(gateway, handlers)
 
     def state(self, node, state):
@@ -1,5 +1,6 @@
 class Task:
     MAX_RETRIES = 4
+    coalescing = True # False if its result is awaited, see TaskQueue
     def __init__(self, node, success_events, error_events):
         self.node = node
         self.success_events = success_events
@@ -13,6 +14,14 @@ class Task:
             self.error(event)
         return False
 
+    def coalesce_key(self):
+        """ Returns a key shared by the tasks superseded by this one: a
+        task added to a node removes its pending task with the same key,
+        so only the newest one is executed. None, the default, if every
+        task has to be executed.
+        """
+        return None
+
     def execute(self):
         raise NotImplementedError
 
@@ -1,6 +1,5 @@
 import struct
 import logging
-from datetime import datetime as dt
 
 import ttgwlib.events.time_events as te
 from ttgwlib.models.task import Task
@@ -75,9 +74,11 @@ class TaskGw(Model):
 
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
-        handlers = [
-            self.task_ack_handler,
-        ]
+        handlers = {
+            self.task_ack_handler: (EventType.TASK_ACK,
+                EventType.TASK_DELETE_ACK, EventType.TASK_DELETE_OP_ACK,
+                EventType.TASK_SEND_TASKS, EventType.WAKE_RESET),
+        }
         self.task_tid = 0
         self.node_tasks = {}
         super().__init__(gateway, handlers)
@@ -189,17 +190,17 @@ class TaskGw(Model):
         self.add_task(GetTasksGwTask(node, self))
 
     def set_rate(self, node, opcode, rate):
-        now = int(dt.now().timestamp())
+        now = int(self.gw.clock.time())
         self.change_task(node, opcode, now, rate, 0)
 
     def set_rate_legacy(self, node, opcode, rate):
         self.delete_task_op(node, opcode)
-        now = int(dt.now().timestamp())
+        now = int(self.gw.clock.time())
         self.new_task(node, opcode, now, rate, 0)
 
     def set_sleep_time(self, node):
         sleep_time = self.gw.models.wake_up.sleep_time
-        first_awake = int(dt.now().timestamp()) + sleep_time
+        first_awake = int(self.gw.clock.time()) + sleep_time
         self.change_task(node, TaskOpcode.TASK_OP_CONF, first_awake,
             sleep_time, 0)
 
@@ -207,7 +208,7 @@ class TaskGw(Model):
         if not first_time:
             self.delete_task_op(node, TaskOpcode.TASK_OP_CONF)
         sleep_time = self.gw.models.wake_up.sleep_time
-        first_awake = int(dt.now().timestamp()) + sleep_time
+        first_awake = int(self.gw.clock.time()) + sleep_time
         self.new_task(node, TaskOpcode.TASK_OP_CONF, first_awake, sleep_time, 0)
 
     def get_configured_tasks(self, node):
@@ -294,6 +295,10 @@ class ChangeTaskGwTask(TaskGwBase):
         self.retries = 0
         self.timeout = None
 
+    def coalesce_key(self):
+        # The last change of an opcode overrides the previous ones
+        return (ChangeTaskGwTask, self.opcode)
+
     def execute(self):
         if self.task_type == self.model.CLOCK_MONO:
             self.model.task_gw_change_mono(self.node, self.opcode,
@@ -1,5 +1,6 @@
 import threading
 import logging
+from contextlib import contextmanager
 
 import ttgwlib.events.time_events as te
 from ttgwlib.events.event import EventType
@@ -13,16 +14,23 @@ logger = logging.getLogger(__name__)
 class TaskQueue:
     CONFIG_TIMEOUT = 120 # 2 minutes
     MAX_CONFIG_NODES = 10 # Best experimental result
+    PREFETCH_TIME = 2 # Seconds before the expected wake up
+    LISTEN_TIME = 10 # Seconds a low power node listens after its messages
 
     def __init__(self, gateway):
         self.gw = gateway
         self.queue_lock = threading.RLock()
         self.queue = {} # Dict[node, List[Task]]
         self.gw.add_event_handler(self.task_handler)
-        self.gw.add_event_handler(self.config_timeout_handler)
+        self.gw.add_event_handler(self.config_timeout_handler,
+            (EventType.CONFIGURATION_TIMEOUT,))
         self.config_nodes = {} # Dict[node, timer] nodes to be configured
         self.configuring_nodes = set() # nodes being configured
         self.configuration_cb = lambda node: None
+        self.prefetch_calls = {} # Dict[node, scheduled call]
+        self.listen_deadlines = {} # Dict[node, gateway clock time]
+        self.coalesced = 0
+        self.local = threading.local() # Per thread no_coalescing flag
 
     def set_confifuration_cb(self, conf_cb):
         self.configuration_cb = conf_cb
@@ -32,11 +40,15 @@ class TaskQueue:
             return
         if not isinstance(task, Task):
             raise TypeError(f"Invalid task type {type(task)}")
+        if getattr(self.local, "no_coalescing", False):
+            task.coalescing = False
         with self.queue_lock:
+            self.coalesce(task)
             if task.node in self.config_nodes or task.node.is_low_power():
                 if task.node not in self.queue:
                     wake_task = WakeTask(task.node, self.gw.models.wake_up)
                     self.queue[task.node] = [wake_task]
+                    self.schedule_prefetch(task.node)
                 self.queue[task.node].append(task)
             else:
                 if task.node not in self.queue:
@@ -45,6 +57,95 @@ class TaskQueue:
                 else:
                     self.queue[task.node].append(task)
 
+    def coalesce(self, task):
+        """ Removes the pending task of the node with the same coalescing
+        key, if any, see :func:`~ttgwlib.models.task.Task.coalesce_key`.
+        The new task is queued at the end, as usual, so it is still
+        executed after the tasks queued in between. The first task of the
+        node is not removed, it may have been sent already, and neither
+        are the tasks whose result is awaited, see :func:`no_coalescing`.
+
+        :return: True if a pending task was removed.
+        :rtype: bool
+        """
+        key = task.coalesce_key()
+        if key is None or not task.coalescing or task.node not in self.queue:
+            return False
+        tasks = self.queue[task.node]
+        for i in range(1, len(tasks)):
+            if tasks[i].coalescing and tasks[i].coalesce_key() == key:
+                logger.debug("%s replaced for node %s", str(tasks[i]),
+                    task.node.mac.hex())
+                del tasks[i]
+                self.coalesced += 1
+                return True
+        return False
+
+    @contextmanager
+    def no_coalescing(self):
+        """ Context in which the tasks added by the calling thread neither
+        replace nor are replaced by other tasks, because the caller waits
+        for the acknowledgement of each one.
+        """
+        self.local.no_coalescing = True
+        try:
+            yield
+        finally:
+            self.local.no_coalescing = False
+
+    def get_stats(self):
+        """ Returns the task counters.
+
+        :return: Nodes with tasks, tasks pending, and tasks replaced by a
+            newer one with the same coalescing key, each one a mesh round
+            trip saved.
+        :rtype: dict
+        """
+        with self.queue_lock:
+            return {
+                "nodes": len(self.queue),
+                "tasks": sum(len(tasks) for tasks in self.queue.values()),
+                "coalesced": self.coalesced,
+            }
+
+    def schedule_prefetch(self, node):
+        """ Schedules the handles of a sleeping node to be added to the
+        device shortly before its expected wake up, so the messages sent to
+        it when it wakes up do not wait for them.
+        """
+        if node in self.prefetch_calls or not node.sleep_timestamp:
+            return
+        period = node.sleep_period or self.gw.models.wake_up.sleep_time
+        delay = (node.sleep_timestamp + period - self.PREFETCH_TIME
+            - self.gw.clock.time())
+        self.prefetch_calls[node] = self.gw.scheduler.schedule(max(delay, 0),
+            self.prefetch, node)
+
+    def prefetch(self, node):
+        with self.queue_lock:
+            del self.prefetch_calls[node]
+            if node not in self.queue:
+                return
+        self.gw.tx_manager.prefetch(node)
+
+    def get_deadline(self, node):
+        """ Returns the time a low power node stops listening, after its
+        last message, as a deadline for the messages sent to it, see
+        :func:`~ttgwlib.tx_manager.TxManager.send_node`. Messages that
+        miss it are dropped; the task sending them sends them again when
+        the node wakes up.
+
+        :param node: Destination node.
+        :type node: :class:`~ttgwlib.node.Node`
+
+        :return: Gateway clock time, or None if the node is not low power
+            or has not been heard yet.
+        :rtype: float
+        """
+        if not node.is_low_power():
+            return None
+        return self.listen_deadlines.get(node)
+
     def cancel_tasks(self, node):
         with self.queue_lock:
             if node in self.queue:
@@ -151,6 +252,10 @@ class TaskQueue:
             if not self.gw.whitelist.is_node_in_whitelist(event.node):
                 return
             with self.queue_lock:
+                if hasattr(event, "mesh_data") and event.node.is_low_power():
+                    self.listen_deadlines[event.node] = \
+                        self.gw.clock.monotonic() + self.LISTEN_TIME
+
                 if event.event_type == EventType.WAKE_RESET:
                     self.wake_reset_cb(event)
 
@@ -164,6 +269,9 @@ class TaskQueue:
                         and self.queue[event.node][0].handler(event)):
                     task = self.queue[event.node].pop(0)
                     if isinstance(task, (AliveTask, SleepTask, ResetTask)):
+                        if isinstance(task, SleepTask):
+                            # Not needed until it wakes up again
+                            self.gw.tx_manager.release(event.node)
                         if event.node in self.config_nodes:
                             self.config_nodes[event.node].cancel()
                             del self.config_nodes[event.node]
@@ -22,9 +22,10 @@ class TransportModel(Model):
     def __init__(self, gateway):
         self.gw = gateway
         self.logger = logging.getLogger(__name__)
-        handlers = [
-            self.data_handler,
-        ]
+        handlers = {
+            self.data_handler: (EventType.TRANSPORT_FR_START,
+                EventType.TRANSPORT_FR_DATA, EventType.TRANSPORT_FR_END),
+        }
 
         self.frpkt = {}
         super().__init__(gateway, handlers)
@@ -60,11 +61,7 @@ class TransportModel(Model):
             frag_packet = self.frpkt[event.data["src"]]
             if frag_packet.is_complete() and frag_packet.checksum(check):
                 rx_data = frag_packet.get_data()
-                mesh_data = {
-                    "rssi": event.data["rssi"],
-                    "ttl": event.data["ttl"],
-                    "src": event.data["src"]
-                }
+                mesh_data = event.data
                 recv_event = TransportRecv(mesh_data, rx_data, None, self.gw)
                 self.gw.event_handler.add_event(recv_event)
             else:
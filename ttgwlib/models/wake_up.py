@@ -1,10 +1,10 @@
 import logging
-from datetime import datetime as dt
 
 import ttgwlib.events.time_events as te
 from ttgwlib.models.model import Model
 from ttgwlib.models.task import Task
 from ttgwlib.events.event import EventType
+from ttgwlib.tx_manager import TrafficClass
 
 RESET_REASON = {
     0: "UNKNOWN",
@@ -33,7 +33,7 @@ class WakeUp(Model):
     def __init__(self, gateway):
         self.logger = logging.getLogger(__name__)
         self.gw = gateway
-        handlers = []
+        handlers = {}
         super().__init__(gateway, handlers)
         self.sleep_time = self.DEFAULT_SLEEP_TIME
 
@@ -47,24 +47,28 @@ class WakeUp(Model):
         msg = bytearray()
         msg += self.SLEEP
         msg += configured.to_bytes(1, "little")
-        self.send(msg, node)
+        self.send(msg, node, TrafficClass.WAKE,
+            self.gw.models.task_queue.get_deadline(node))
 
     def alive(self, node, configured):
         msg = bytearray()
         msg += self.ALIVE
         msg += configured.to_bytes(1, "little")
-        self.send(msg, node)
+        self.send(msg, node, TrafficClass.WAKE,
+            self.gw.models.task_queue.get_deadline(node))
 
     def wake_up(self, node):
         msg = bytearray()
         msg += self.WAIT
-        self.send(msg, node)
+        self.send(msg, node, TrafficClass.WAKE,
+            self.gw.models.task_queue.get_deadline(node))
 
     def wake_reset_ack(self, node):
         self.logger.debug("Wake reset ACK")
         msg = bytearray()
         msg += self.RESET_ACK
-        self.send(msg, node)
+        self.send(msg, node, TrafficClass.WAKE,
+            self.gw.models.task_queue.get_deadline(node))
 
 
 class WakeTask(Task):
@@ -97,7 +101,7 @@ class SleepTask(Task):
     def success(self, event):
         if self.timeout:
             self.timeout.cancel()
-        event.node.sleep_timestamp = int(dt.now().timestamp())
+        event.node.sleep_timestamp = int(self.model.gw.clock.time())
         self.model.logger.debug("Node %s slept %d seconds",
             self.node.mac.hex(), self.model.sleep_time)
 
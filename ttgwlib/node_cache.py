@@ -0,0 +1,127 @@
+import time
+import threading
+
+from ttgwlib.node_database import NodeDatabase
+
+
+class NodeCache(NodeDatabase):
+    """ Read through cache in front of the user node database. Nodes are
+    cached by unicast address and by mac the first time they are looked
+    up, so the event parser does not query the database for every received
+    packet.
+
+    Lookups that return no node are also cached, for *unknown_ttl*
+    seconds, so a stream of packets from an unknown source does not hit
+    the database either.
+
+    Nodes stored or removed through the cache are invalidated. If the
+    database is modified by other means, :func:`invalidate` must be
+    called.
+
+    :param node_db: Node database.
+    :type node_db: :class:`~ttgwlib.node_database.NodeDatabase`
+    :param unknown_ttl: Seconds an unknown address or mac is cached.
+    :type unknown_ttl: float
+    """
+    def __init__(self, node_db, unknown_ttl=30.0):
+        self.node_db = node_db
+        self.unknown_ttl = unknown_ttl
+        self.lock = threading.Lock()
+        self.by_address = {} # Dict[address, node]
+        self.by_mac = {} # Dict[mac, node]
+        self.unknown = {} # Dict[address or mac, expiration time]
+        self.generation = 0 # Incremented on every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.unknown_hits = 0
+
+    def get_address(self):
+        return self.node_db.get_address()
+
+    def get_netkey(self):
+        return self.node_db.get_netkey()
+
+    def get_nodes(self):
+        return self.node_db.get_nodes()
+
+    def get_node_by_address(self, address):
+        return self.lookup(self.by_address, address,
+            self.node_db.get_node_by_address)
+
+    def get_node_by_mac(self, mac):
+        return self.lookup(self.by_mac, bytes(mac),
+            self.node_db.get_node_by_mac)
+
+    def lookup(self, cache, key, load):
+        with self.lock:
+            node = cache.get(key)
+            if node is not None:
+                self.hits += 1
+                return node
+            expiration = self.unknown.get(key)
+            if expiration is not None:
+                if time.monotonic() < expiration:
+                    self.unknown_hits += 1
+                    return None
+                del self.unknown[key]
+            self.misses += 1
+            generation = self.generation
+        # The database is queried without the lock, it may be slow
+        node = load(key)
+        with self.lock:
+            if generation != self.generation:
+                # Invalidated while loading, the node may be outdated
+                pass
+            elif node is None:
+                self.unknown[key] = time.monotonic() + self.unknown_ttl
+            else:
+                self.by_address[node.unicast_addr] = node
+                self.by_mac[node.mac] = node
+        return node
+
+    def store_node(self, node):
+        self.node_db.store_node(node)
+        self.invalidate(node)
+
+    def remove_node(self, node):
+        self.node_db.remove_node(node)
+        self.invalidate(node)
+
+    def invalidate(self, node=None):
+        """ Removes a node from the cache, or every node, and every unknown
+        entry, if no node is given.
+
+        :param node: Node to be removed from the cache. Optional.
+        :type node: :class:`~ttgwlib.node.Node`
+        """
+        with self.lock:
+            self.generation += 1
+            if node is None:
+                self.by_address.clear()
+                self.by_mac.clear()
+                self.unknown.clear()
+                return
+            mac = node.mac
+            # The cached node may have a previous address
+            cached = self.by_mac.pop(mac, None)
+            if cached is not None:
+                self.by_address.pop(cached.unicast_addr, None)
+            cached = self.by_address.pop(node.unicast_addr, None)
+            if cached is not None:
+                self.by_mac.pop(cached.mac, None)
+            self.unknown.pop(node.unicast_addr, None)
+            self.unknown.pop(mac, None)
+
+    def get_stats(self):
+        """ Returns the cache counters.
+
+        :return: Cached nodes, hits, misses and unknown hits.
+        :rtype: dict
+        """
+        with self.lock:
+            return {
+                "nodes": len(self.by_address),
+                "hits": self.hits,
+                "misses": self.misses,
+                "unknown_hits": self.unknown_hits,
+            }
@@ -15,6 +15,8 @@ class Passthrough:
         self.host = host
         self.port = port
         self.uart = uart
+        # The device bytes are relayed unchanged, not as frames
+        self.uart.set_raw(True)
         self.programmer = programmer
         self.socket = None
         self.connected = False
@@ -51,9 +53,9 @@ class Passthrough:
             while self.running and self.connected:
                 msg = bytearray()
                 while len(msg) < 255:
-                    b = self.uart.get_byte(0.01)
-                    if b:
-                        msg += b
+                    data = self.uart.get_frame(0.01)
+                    if data:
+                        msg += data
                     else:
                         break
                 if msg:
@@ -13,6 +13,8 @@ class Platform(IntEnum):
     HEIMDALL_V2 = auto()
     CM_V1 = auto()
     CLOUD = auto()
+    REPLAY = auto()
+    SIMULATOR = auto()
 
     @classmethod
     def from_string(cls, platform):
@@ -26,4 +28,8 @@ class Platform(IntEnum):
             return cls.CM_V1
         if platform == "cloud":
             return cls.CLOUD
+        if platform == "replay":
+            return cls.REPLAY
+        if platform == "simulator":
+            return cls.SIMULATOR
         raise GatewayError("Invalid platform: " + str(platform))
@@ -56,6 +56,9 @@ class JLink(Programmer):
 
     def update_fw(self):
         """ Updates firmware to the lastest version.
+
+        :return: True if the device was flashed.
+        :rtype: bool
         """
         if (self.fw_id != self.FW_IDENTIFIER or
                 version.parse(FW_VERSION) > self.version):
@@ -63,6 +66,8 @@ class JLink(Programmer):
             self.flash()
             time.sleep(2)
             self.version = version.parse(FW_VERSION)
+            return True
+        return False
 
     def scan_devices(self):
         """ Looks for connected gateway devices.
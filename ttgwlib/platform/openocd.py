@@ -54,12 +54,15 @@ class OpenOCD(Programmer):
     def update_fw(self):
         """ Updates the device with the lastest firmware version. Connects to
         the device, then updates the firmware and disconnects from the device.
+
+        :return: True if the device was flashed.
+        :rtype: bool
         """
         if not self.initialized:
             raise GatewayError("OpenOCD not initialized")
         if (self.fw_id == self.FW_IDENTIFIER and
                 version.parse(FW_VERSION) <= self.version):
-            return
+            return False
         logger.info("Updating firmware")
         time.sleep(1)
         with tempfile.TemporaryDirectory() as tmp_dir:
@@ -78,6 +81,7 @@ class OpenOCD(Programmer):
             subprocess.run(update_cmd, capture_output=True, timeout=30,
                 check=False)
         logger.debug("Update completed")
+        return True
 
     def read_fw(self):
         """  Read device current firmware version
@@ -31,6 +31,9 @@ class Programmer:
 
     def update_fw(self):
         """ Updates the firmware of the device to the lastest version.
+
+        :return: True if the device was flashed.
+        :rtype: bool
         """
         raise NotImplementedError
 
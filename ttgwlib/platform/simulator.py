@@ -0,0 +1,456 @@
+"""
+ttgwlib.platform.simulator
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Simulated nRF52 gateway device, used to test the library without hardware.
+It speaks the same serial protocol as the device firmware, and simulates a
+Mesh net of virtual low power nodes.
+
+"""
+import os
+import pty
+import tty
+import time
+import heapq
+import random
+import socket
+import struct
+import logging
+import threading
+
+from ttgwlib.node import Node
+from ttgwlib.frame_buffer import FrameBuffer
+
+
+logger = logging.getLogger(__name__)
+
+
+# Command opcodes
+RESET = 0x0E
+ADVERTISING_ADDRESS_GET = 0x41
+STATE_CLEAR = 0xAC
+ECHO = 0x02
+APPLICATION = 0x20
+SUBNET_ADD = 0x92
+APPKEY_ADD = 0x97
+DEVKEY_ADD = 0x9C
+DEVKEY_DELETE = 0x9D
+ADDR_LOCAL_UNICAST_SET = 0x9F
+ADDR_SUBSCRIPTION_ADD = 0xA1
+ADDR_PUBLICATION_ADD = 0xA4
+ADDR_PUBLICATION_REMOVE = 0xA6
+PACKET_SEND = 0xAB
+
+# Commands that return a new handle
+HANDLE_COMMANDS = (SUBNET_ADD, APPKEY_ADD, DEVKEY_ADD, ADDR_SUBSCRIPTION_ADD,
+    ADDR_PUBLICATION_ADD)
+
+# Command response status
+STATUS_INVALID_PARAMETER = 0x85
+STATUS_REJECTED = 0x8E
+
+# Event opcodes
+DEVICE_STARTED = 0x81
+ECHO_RSP = 0x82
+CMD_RSP = 0x84
+APPLICATION_EVT = 0x8A
+MESH_MESSAGE_UNICAST = 0xD0
+MESH_MESSAGE_SUBSCRIPTION = 0xD1
+MESH_TX_COMPLETE = 0xD2
+
+# Application opcodes
+APP_CACHE_SIZE = 0x04
+
+# Model opcodes, as parsed by the event parser
+WAKE_NOTIFY = 0xC00000
+TEMP_DATA = 0xC00200
+WAKE_SLEEP = 0xC10000
+
+# Node response to every gateway request: Dict[request, (ACK, payload)]
+NODE_ACKS = {
+    0x8049: (0x804A, b""), # Config node reset
+    0xC20000: (0xC40000, b""), # Wake up: wait
+    0xC10000: (0xC30000, b""), # Wake up: sleep
+    0xC70000: (0xC80000, b""), # Wake up: alive
+    0xC20200: (0xC30200, b""), # NRFTemp: IA
+    0xC70200: (0xC80200, b""), # NRFTemp: config
+    0xC90200: (0xCA0200, b""), # NRFTemp: calibrate
+    0xCB0200: (0xCC0200, b""), # NRFTemp: calibration reset
+    0xC10600: (0xC20600, b""), # Tap: state
+    0xC00800: (0xC10800, b""), # Light
+    0xC10A00: (0xC20A00, b""), # Datetime
+    0xC90C00: (0xC10C00, b"\x00\x00"), # Task: conf real
+    0xCA0C00: (0xC10C00, b"\x00\x00"), # Task: conf mono
+    0xCB0C00: (0xCD0C00, b"\x00\x00"), # Task: change real
+    0xCC0C00: (0xCD0C00, b"\x00\x00"), # Task: change mono
+    0xC20C00: (0xC30C00, b"\x00\x00"), # Task: delete
+    0xC40C00: (0xC50C00, b"\x00\x00"), # Task: delete op
+    0xC60C00: (0xC80C00, b""), # Task: get tasks
+    0xC10E00: (0xC20E00, b""), # Rssi: neighbours
+    0xC30E00: (0xC40E00, b"\xc4"), # Rssi: status (-60 dBm)
+    0xC50E00: (0xC60E00, b""), # Rssi: ping
+    0xC01200: (0xC11200, b"\x00"), # Ota: notify
+    0xC21200: (0xC31200, b"\x00"), # Ota: status
+    0xC41200: (0xC51200, b"\x00"), # Ota: store
+    0xC61200: (0xC71200, b"\x00"), # Ota: relay
+    0xC01400: (0xC11400, b""), # Power
+    0xC11600: (0xC21600, b""), # Hwm
+    0xC01800: (0xC11800, b"\x00"), # Beacon: start
+    0xC21800: (0xC31800, b"\x00"), # Beacon: stop
+    0xC11C00: (0xC21C00, b""), # Pwmt: config
+    0xC31C00: (0xC41C00, b""), # Pwmt: conversion
+    0xC01E00: (0xC11E00, b""), # Output: dac
+    0xC21E00: (0xC31E00, b""), # Output: digital
+}
+
+WAKE_GROUP = 49156
+NRFTEMP_GROUP = 49400
+MODEL_HEADER = struct.Struct("<HHHHBB6sbHI")
+
+
+def opcode_to_bytes(opcode):
+    if opcode > 0xFFFF:
+        return opcode.to_bytes(3, "big")
+    if opcode > 0xFF:
+        return opcode.to_bytes(2, "big")
+    return opcode.to_bytes(1, "big")
+
+
+def get_opcode(data):
+    # Same encoding as EventParser.model_get_opcode
+    size = {0: 1, 1: 1, 2: 2, 3: 3}[(data[0] & 0xC0) >> 6]
+    return int.from_bytes(data[0:size], "big"), data[size:]
+
+
+class SimulatedNode:
+    """ Virtual low power node. It wakes up every *sleep_period* seconds,
+    sends a wake notification, and keeps awake answering the gateway
+    requests until it is sent to sleep, or for *awake_time* seconds at
+    most. Messages sent while it sleeps are lost. Independently, it sends
+    a temperature message every *data_period* seconds.
+
+    :ivar node: Library node, to be stored in the node database.
+    :vartype node: :class:`~ttgwlib.node.Node`
+    """
+    BOARD_ID = 1 # Iris
+
+    def __init__(self, unicast_addr, sleep_period, data_period,
+            awake_time):
+        mac = b"\xee\x51" + unicast_addr.to_bytes(4, "big")
+        uuid = bytes(2) + self.BOARD_ID.to_bytes(2, "big") + bytes(12)
+        devkey = bytes(12) + unicast_addr.to_bytes(4, "big")
+        self.node = Node(mac, uuid, unicast_addr, f"sim-{unicast_addr}",
+            devkey)
+        self.unicast_addr = unicast_addr
+        self.sleep_period = sleep_period
+        self.data_period = data_period
+        self.awake_time = awake_time
+        self.awake = False
+        self.awake_until = 0
+        self.seq = 0
+        self.tid = 0
+        self.rssi = -random.randint(40, 90)
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+
+class SimulatedDevice:
+    """ Simulated gateway device. It answers the serial commands sent by
+    the library like the device firmware:
+
+    * Reset is answered with a DeviceStarted event.
+    * Every other command is answered with a successful CmdResponse.
+      Commands that create keys or addresses return new handles. Device
+      keys and publication addresses are limited to :attr:`MAX_DEVKEYS`
+      and :attr:`MAX_PUBLICATIONS`; adding more is rejected.
+    * PacketSend returns a token, followed by MeshTxComplete, and the
+      packet is delivered to the destination virtual node, which answers
+      with the corresponding ACK.
+    * The replay cache size request is answered with an application event.
+
+    The device is connected to the library through a socket pair
+    (:func:`connect`), or a pseudo terminal (:func:`open_pty`), so the
+    library runs unchanged. :attr:`nodes` must be stored in the node
+    database for the virtual nodes messages to be accepted.
+
+    :param node_count: Number of virtual nodes.
+    :type node_count: int
+    :param sleep_period: Time between node wake ups, in seconds.
+    :type sleep_period: float
+    :param data_period: Time between node temperature messages, in seconds.
+    :type data_period: float
+    :param tx_delay: Time to transmit a mesh packet, in seconds.
+    :type tx_delay: float
+    :param first_address: Unicast address of the first node.
+    :type first_address: int
+
+    :ivar nodes: Virtual nodes.
+    :vartype nodes: list of :class:`SimulatedNode`
+    :ivar stats: Number of messages sent and received by the virtual
+        nodes, and number of commands received.
+    :vartype stats: dict
+    """
+    DATA_CREDIT = 255
+    CACHE_SIZE = 64
+    AWAKE_TIME = 10
+    RX_BUFFER_SIZE = 4096
+    MAX_DEVKEYS = 10
+    MAX_PUBLICATIONS = 30
+
+    def __init__(self, node_count=10, sleep_period=60, data_period=60,
+            tx_delay=0.01, first_address=100):
+        self.tx_delay = tx_delay
+        self.nodes = [SimulatedNode(first_address + i, sleep_period,
+            data_period, self.AWAKE_TIME) for i in range(node_count)]
+        self.nodes_by_addr = {n.unicast_addr: n for n in self.nodes}
+        self.stats = {"commands": 0, "node_tx": 0, "node_rx": 0,
+            "node_lost": 0}
+        self.stats_lock = threading.Lock()
+
+        self.handle = 0
+        self.token = 0
+        self.addr_handles = {} # Dict[handle, address]
+        self.subscriptions = set()
+        self.devkeys = set() # Set[handle]
+        self.publications = set() # Set[handle]
+        self.gw_addr = 1
+        self.address = bytes(random.getrandbits(8) for _ in range(6))
+
+        self.fd = None
+        self.socket = None
+        self.write_lock = threading.Lock()
+        self.rx_buffer = FrameBuffer(self.RX_BUFFER_SIZE)
+
+        self.timers = [] # Heap[(time, order, function, args)]
+        self.timers_cond = threading.Condition()
+        self.timer_order = 0
+        self.running = False
+
+    def connect(self):
+        """ Starts the device, connected through a socket pair.
+
+        :return: Library side socket, to be used by
+            :class:`~ttgwlib.uart_socket.UartSocket`.
+        :rtype: :class:`socket.socket`
+        """
+        device_side, library_side = socket.socketpair()
+        self.socket = device_side
+        self.fd = device_side.fileno()
+        self.start()
+        return library_side
+
+    def open_pty(self):
+        """ Starts the device, connected through a pseudo terminal.
+
+        :return: Serial port, to be given as the port of the simulator
+            platform, so the gateway uses a :class:`~ttgwlib.uart.Uart`.
+        :rtype: str
+        """
+        master, slave = pty.openpty()
+        # Raw mode, the serial protocol is binary
+        tty.setraw(slave)
+        self.fd = master
+        self.start()
+        return os.ttyname(slave)
+
+    def count(self, name):
+        # Counted from the device and the node threads
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._read, name="SimDevice",
+            daemon=True).start()
+        threading.Thread(target=self._run_timers, name="SimNodes",
+            daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        with self.timers_cond:
+            self.timers_cond.notify()
+
+    def _read(self):
+        while self.running:
+            try:
+                data = os.read(self.fd, self.rx_buffer.free())
+            except OSError:
+                break
+            if not data:
+                break
+            self.rx_buffer.feed(data)
+            for frame in self.rx_buffer.frames():
+                self.process_command(bytes(frame))
+        self.running = False
+
+    def _write(self, frame):
+        with self.write_lock:
+            view = memoryview(frame)
+            while view:
+                try:
+                    written = os.write(self.fd, view)
+                except OSError:
+                    return
+                view = view[written:]
+
+    def send_event(self, opcode, data=b""):
+        self._write(bytes([len(data) + 1, opcode]) + data)
+
+    def send_response(self, opcode, data=b"", status=0):
+        self.send_event(CMD_RSP, bytes([opcode, status]) + data)
+
+    def schedule(self, delay, function, *args):
+        with self.timers_cond:
+            self.timer_order += 1
+            heapq.heappush(self.timers, (time.monotonic() + delay,
+                self.timer_order, function, args))
+            self.timers_cond.notify()
+
+    def _run_timers(self):
+        while self.running:
+            with self.timers_cond:
+                while self.running:
+                    if self.timers:
+                        timeout = self.timers[0][0] - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self.timers_cond.wait(timeout)
+                if not self.running:
+                    return
+                _, _, function, args = heapq.heappop(self.timers)
+            try:
+                function(*args)
+            except Exception: # pylint: disable=broad-except
+                logger.exception("Simulation error")
+
+    def process_command(self, frame):
+        opcode = frame[1]
+        data = frame[2:]
+        self.count("commands")
+        if opcode == RESET:
+            self.reset()
+        elif opcode == ECHO:
+            self.send_event(ECHO_RSP, data)
+        elif opcode == ADVERTISING_ADDRESS_GET:
+            self.send_response(opcode, b"\x00" + self.address)
+        elif opcode == STATE_CLEAR:
+            self.clear_state()
+            self.send_response(opcode)
+        elif opcode == PACKET_SEND:
+            self.packet_send(data)
+        elif opcode == APPLICATION:
+            self.send_response(opcode)
+            if data[0] == APP_CACHE_SIZE:
+                self.schedule(0.1, self.send_event, APPLICATION_EVT,
+                    struct.pack("<BH", APP_CACHE_SIZE, self.CACHE_SIZE))
+        elif ((opcode == DEVKEY_ADD
+                    and len(self.devkeys) >= self.MAX_DEVKEYS)
+                or (opcode == ADDR_PUBLICATION_ADD
+                    and len(self.publications) >= self.MAX_PUBLICATIONS)):
+            self.send_response(opcode, status=STATUS_REJECTED)
+        elif opcode in HANDLE_COMMANDS:
+            self.handle = (self.handle + 1) & 0xFFFF
+            if opcode == DEVKEY_ADD:
+                self.devkeys.add(self.handle)
+            if opcode == ADDR_PUBLICATION_ADD:
+                self.publications.add(self.handle)
+            if opcode in (ADDR_SUBSCRIPTION_ADD, ADDR_PUBLICATION_ADD):
+                self.addr_handles[self.handle], = struct.unpack("<H",
+                    data[0:2])
+            if opcode == ADDR_SUBSCRIPTION_ADD:
+                self.subscriptions.add(self.addr_handles[self.handle])
+            self.send_response(opcode, struct.pack("<H", self.handle))
+        else:
+            if opcode == ADDR_LOCAL_UNICAST_SET:
+                self.gw_addr, = struct.unpack("<H", data[0:2])
+            elif opcode == DEVKEY_DELETE:
+                handle, = struct.unpack("<H", data[0:2])
+                self.devkeys.discard(handle)
+            elif opcode == ADDR_PUBLICATION_REMOVE:
+                handle, = struct.unpack("<H", data[0:2])
+                self.publications.discard(handle)
+                self.addr_handles.pop(handle, None)
+            self.send_response(opcode)
+
+    def clear_state(self):
+        self.handle = 0
+        self.addr_handles.clear()
+        self.subscriptions.clear()
+        self.devkeys.clear()
+        self.publications.clear()
+
+    def reset(self):
+        # Keys and addresses are kept in flash, like in the firmware
+        with self.timers_cond:
+            self.timers.clear()
+        self.send_event(DEVICE_STARTED, bytes([0x02, 0x00, self.DATA_CREDIT]))
+        # Nodes wake up spread over their periods
+        for node in self.nodes:
+            self.schedule(random.uniform(0, node.sleep_period),
+                self.node_wake_up, node)
+            self.schedule(random.uniform(0, node.data_period),
+                self.node_data, node)
+
+    def packet_send(self, data):
+        _, _, dst_handle = struct.unpack("<HHH", data[0:6])
+        if dst_handle not in self.addr_handles:
+            self.send_response(PACKET_SEND, status=STATUS_INVALID_PARAMETER)
+            return
+        payload = bytes(data[10:])
+        self.token = (self.token + 1) & 0xFFFFFFFF
+        token = struct.pack("<I", self.token)
+        self.send_response(PACKET_SEND, token)
+        self.schedule(self.tx_delay, self.send_event, MESH_TX_COMPLETE,
+            token)
+        node = self.nodes_by_addr.get(self.addr_handles.get(dst_handle))
+        if node is not None:
+            self.schedule(self.tx_delay, self.node_receive, node, payload)
+
+    def node_send(self, node, opcode, data, dst=None):
+        if dst is None:
+            dst = self.gw_addr
+            event = MESH_MESSAGE_UNICAST
+        elif dst in self.subscriptions:
+            event = MESH_MESSAGE_SUBSCRIPTION
+        else:
+            # Group messages are only received once subscribed
+            return
+        model_data = opcode_to_bytes(opcode) + data
+        adv_addr = node.node.mac[::-1]
+        header = MODEL_HEADER.pack(node.unicast_addr, dst, 0, 0, 5, 0,
+            adv_addr, node.rssi, len(model_data), node.next_seq())
+        self.count("node_tx")
+        self.send_event(event, header + model_data)
+
+    def node_receive(self, node, payload):
+        if not node.awake or time.monotonic() > node.awake_until:
+            node.awake = False
+            self.count("node_lost")
+            return
+        self.count("node_rx")
+        opcode, _ = get_opcode(payload)
+        if opcode in NODE_ACKS:
+            ack, data = NODE_ACKS[opcode]
+            self.schedule(self.tx_delay, self.node_send, node, ack, data)
+        if opcode == WAKE_SLEEP:
+            node.awake = False
+
+    def node_wake_up(self, node):
+        node.awake = True
+        node.awake_until = time.monotonic() + node.awake_time
+        node.tid = (node.tid + 1) & 0xFF
+        # Configured node
+        self.node_send(node, WAKE_NOTIFY, bytes([node.tid, 1]), WAKE_GROUP)
+        self.schedule(node.sleep_period, self.node_wake_up, node)
+
+    def node_data(self, node):
+        node.tid = (node.tid + 1) & 0xFF
+        temp = random.randint(1800, 2600)
+        data = struct.pack("<HB3sB", temp, random.randint(30, 60),
+            random.randint(95000, 105000).to_bytes(3, "little"), node.tid)
+        self.node_send(node, TEMP_DATA, data, NRFTEMP_GROUP)
+        self.schedule(node.data_period, self.node_data, node)
@@ -44,9 +44,11 @@ class ProvManager:
 
         if timeout > 0:
             time_events.ScanTimeout(timeout, self.gw)
-            self.gw.add_event_handler(self.scan_timeout_handler)
+            self.gw.add_event_handler(self.scan_timeout_handler,
+                (EventType.SCAN_TIMEOUT,))
 
-        self.gw.add_event_handler(self.unprov_handler)
+        self.gw.add_event_handler(self.unprov_handler,
+            (EventType.UNPROV_DISC,))
         msg = commands.ScanStart()
         self.gw.uart.send_msg(msg.serialize())
 
@@ -40,7 +40,10 @@ class Provisioner:
         unicast_address = self.node.unicast_addr
         msg = commands.Provision(uuid, netkey, netkey_index, unicast_address)
 
-        self.gw.add_event_handler(self.prov_handler)
+        self.gw.add_event_handler(self.prov_handler, (
+            EventType.PROV_LINK_ESTABLISHED, EventType.PROV_LINK_CLOSED,
+            EventType.PROV_CAPS, EventType.PROV_ECDH,
+            EventType.PROV_COMPLETE, EventType.PROV_FAILED))
         self.gw.uart.send_msg(msg.serialize())
 
     def oob_use(self):
@@ -0,0 +1,135 @@
+import os
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class SeqNumberStore:
+    """ Sequence number file, written by a background thread.
+
+    The file does not keep the last sequence number reported by the
+    device, but the start of the next block of *block* numbers, so it only
+    needs to be written when the device enters a new block. On start, the
+    device continues from the block after the stored one; as long as the
+    file is at most one block behind the device, no sequence number is
+    reused after a crash. Updates that would leave the file further behind
+    are written synchronously.
+
+    The file is replaced atomically, so a crash while writing leaves the
+    previous value.
+
+    :param path: File path.
+    :type path: str
+    :param block: Sequence numbers reserved by each write.
+    :type block: int
+    """
+    def __init__(self, path, block):
+        self.path = path
+        self.block = block
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.stored = None # Value in the file
+        self.pending = None # Value waiting to be written
+        self.updates = 0
+        self.writes = 0
+        self.sync_writes = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="SeqStore")
+        self.thread.start()
+
+    def start(self):
+        """ Reserves the block after the stored one, and returns its first
+        sequence number, to be set in the device. It is written before
+        returning.
+
+        :return: Sequence number to start from.
+        :rtype: int
+        """
+        try:
+            with open(self.path) as f:
+                seq = int(f.read())
+            seq = self.block * (seq // self.block + 1)
+        except (FileNotFoundError, ValueError):
+            seq = 0
+        with self.condition:
+            self.pending = None
+        self.write(seq, force=True)
+        return seq
+
+    def update(self, seq):
+        """ Updates the sequence number reported by the device. It does not
+        wait for the file to be written, unless the file is more than one
+        block behind.
+
+        :param seq: Sequence number.
+        :type seq: int
+        """
+        reservation = self.block * (seq // self.block + 1)
+        with self.condition:
+            self.updates += 1
+            if self.pending is not None and reservation <= self.pending:
+                return
+            if self.stored is not None and reservation <= self.stored:
+                return
+            if self.stored is None or seq < self.stored + self.block:
+                self.pending = reservation
+                self.condition.notify()
+                return
+            self.sync_writes += 1
+        self.write(reservation)
+
+    def write(self, seq, force=False):
+        with self.write_lock:
+            # A newer value may have been written by another thread
+            if not force and self.stored is not None and seq <= self.stored:
+                return
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(seq))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            with self.condition:
+                self.stored = seq
+                self.writes += 1
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                seq = self.pending
+                self.pending = None
+            if seq is not None:
+                try:
+                    self.write(seq)
+                except OSError:
+                    logger.exception("Error writing sequence number")
+            elif not self.running:
+                break
+
+    def get_stats(self):
+        """ Returns the store counters.
+
+        :return: Updates received, file writes and writes done
+            synchronously, and stored value.
+        :rtype: dict
+        """
+        with self.condition:
+            return {
+                "updates": self.updates,
+                "writes": self.writes,
+                "sync_writes": self.sync_writes,
+                "stored": self.stored,
+            }
+
+    def stop(self):
+        """ Stops the thread, and waits until the pending value, if any,
+        is written.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
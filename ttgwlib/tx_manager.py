@@ -1,93 +1,576 @@
+import heapq
 import queue
 import threading
 import logging
+from enum import IntEnum
+import itertools
+from collections import deque, OrderedDict
 
 from ttgwlib import commands
 from ttgwlib.events.event import EventType
+from ttgwlib.platform.exception import GatewayError
 
 
 logger = logging.getLogger(__name__)
 
 
+class TrafficClass(IntEnum):
+    """ Mesh packet classes, each with its own share of the sending. """
+    WAKE = 0 # Replies to awake nodes, which go back to sleep soon
+    DATA = 1
+    BULK = 2 # Low priority, like transport fragments
+
+
+class DrrQueue:
+    """ Deficit round robin queue. Items are queued in flows, and flows
+    are served in turns: each turn, a flow adds its quantum to its
+    deficit, and items are taken while their cost fits in the deficit.
+    Flows are removed, and their deficit reset, once empty.
+
+    :param quantum: Function returning the quantum of a flow, by key.
+    :type quantum: Callable
+    """
+    def __init__(self, quantum):
+        self.quantum = quantum
+        self.flows = OrderedDict() # Dict[key, deque[(cost, item)]], in turn
+        self.deficits = {}
+        self.turn = None # Flow whose turn is being served
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def put(self, key, item, cost):
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = self.flows[key] = deque()
+            self.deficits[key] = 0
+        flow.append((cost, item))
+        self.size += 1
+
+    def get(self):
+        """ Returns the next item and its flow key. The queue must not be
+        empty.
+        """
+        while True:
+            key, flow = next(iter(self.flows.items()))
+            if key != self.turn:
+                self.turn = key
+                self.deficits[key] += self.quantum(key)
+            cost, item = flow[0]
+            if cost <= self.deficits[key]:
+                self.deficits[key] -= cost
+                flow.popleft()
+                self.size -= 1
+                if not flow:
+                    del self.flows[key]
+                    del self.deficits[key]
+                    self.turn = None
+                return key, item
+            self.flows.move_to_end(key)
+            self.turn = None
+
+
+class FairQueue:
+    """ Mesh packets waiting to be sent, scheduled with deficit round
+    robin at two levels, so no destination or traffic class can take
+    over the sending:
+
+    * Traffic classes share the packets sent in proportion to their
+      weights, among the classes with packets waiting.
+    * In each class, destinations share the bytes sent equally.
+
+    Packets with a deadline, like the replies to a low power node that
+    only listens for a while, are sent before the rest, earliest deadline
+    first. Packets that can no longer be sent before their deadline are
+    dropped, instead of wasting airtime.
+
+    :param weights: Packets per turn of each traffic class, at least 1.
+    :type weights: Dict[:class:`TrafficClass`, int]
+    :param clock: Clock the deadlines refer to.
+    :type clock: :class:`~ttgwlib.clock.SystemClock` or
+        :class:`~ttgwlib.clock.VirtualClock`
+
+    :raises ValueError: A weight is lower than 1.
+    """
+    QUANTUM = 12 # Bytes per turn of each destination, an unsegmented packet
+
+    def __init__(self, weights, clock):
+        for traffic_class, weight in weights.items():
+            # A class that never gets a packet per turn blocks the queue
+            if not weight >= 1:
+                raise ValueError(f"Invalid weight of {traffic_class.name} "
+                    f"traffic: {weight}")
+        self.weights = weights
+        self.clock = clock
+        # Heap[(deadline, sequence, class, data, dst, timestamp)]
+        self.deadlines = []
+        self.sequence = itertools.count()
+        self.classes = DrrQueue(lambda c: self.weights[c])
+        self.destinations = {c: DrrQueue(lambda d: self.QUANTUM)
+            for c in TrafficClass}
+        self.condition = threading.Condition()
+        self.sent = dict.fromkeys(TrafficClass, 0)
+        self.latency_total = dict.fromkeys(TrafficClass, 0)
+        self.latency_max = dict.fromkeys(TrafficClass, 0)
+        self.expired = dict.fromkeys(TrafficClass, 0)
+
+    def put(self, traffic_class, dst, data, deadline=None):
+        """ Queues a packet.
+
+        :param traffic_class: Packet class.
+        :type traffic_class: :class:`TrafficClass`
+        :param dst: Node or address.
+        :type dst: :class:`~ttgwlib.node.Node` or int
+        :param data: Packet data.
+        :type data: bytes
+        :param deadline: Clock time, as returned by its ``monotonic``
+            function, the packet has to be sent before. Optional, defaults
+            to no deadline.
+        :type deadline: float
+        """
+        key = dst if isinstance(dst, int) else dst.unicast_addr
+        timestamp = self.clock.monotonic()
+        with self.condition:
+            if deadline is not None:
+                heapq.heappush(self.deadlines, (deadline,
+                    next(self.sequence), traffic_class, data, dst,
+                    timestamp))
+            else:
+                self.classes.put(traffic_class, None, 1)
+                self.destinations[traffic_class].put(key,
+                    (data, dst, timestamp), len(data))
+            self.condition.notify()
+
+    def wait(self, timeout):
+        """ Waits until a packet is queued.
+
+        :return: False if the timeout expired.
+        :rtype: bool
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.deadlines or self.classes, timeout)
+
+    def get(self, delay=0):
+        """ Returns the next packet data and destination, or None if the
+        queue is empty.
+
+        :param delay: Seconds the packet is expected to take to be sent.
+            Packets with a deadline sooner than that are dropped.
+        :type delay: float
+        """
+        now = self.clock.monotonic()
+        with self.condition:
+            while self.deadlines:
+                deadline, _, traffic_class, data, dst, timestamp = \
+                    heapq.heappop(self.deadlines)
+                if deadline >= now + delay:
+                    return self.sent_packet(traffic_class, data, dst,
+                        now - timestamp)
+                self.expired[traffic_class] += 1
+                logger.debug("Packet to %s dropped, %.3f s late",
+                    dst if isinstance(dst, int) else dst.mac.hex(),
+                    now + delay - deadline)
+            if not self.classes:
+                return None
+            traffic_class, _ = self.classes.get()
+            _, (data, dst, timestamp) = \
+                self.destinations[traffic_class].get()
+            return self.sent_packet(traffic_class, data, dst,
+                now - timestamp)
+
+    def sent_packet(self, traffic_class, data, dst, latency):
+        self.sent[traffic_class] += 1
+        self.latency_total[traffic_class] += latency
+        if latency > self.latency_max[traffic_class]:
+            self.latency_max[traffic_class] = latency
+        return data, dst
+
+    def get_stats(self):
+        """ Returns the counters of each traffic class. Latencies are in
+        seconds, from the packet being queued until it is sent.
+
+        :return: Dict[class name, queued, sent and expired packets, and
+            average and maximum latency].
+        :rtype: dict
+        """
+        with self.condition:
+            stats = {}
+            for traffic_class in TrafficClass:
+                sent = self.sent[traffic_class]
+                queued = len(self.destinations[traffic_class])
+                queued += sum(1 for entry in self.deadlines
+                    if entry[2] == traffic_class)
+                stats[traffic_class.name.lower()] = {
+                    "queued": queued,
+                    "sent": sent,
+                    "expired": self.expired[traffic_class],
+                    "latency_avg": (self.latency_total[traffic_class] / sent
+                        if sent else 0),
+                    "latency_max": self.latency_max[traffic_class],
+                }
+            return stats
+
+
+class SendWindow:
+    """ Limits the mesh packets being sent by the device at the same time,
+    with additive increase, multiplicative decrease congestion control.
+
+    The window grows by one packet per window of packets completed in
+    time, and is halved when the device rejects a packet, a packet takes
+    more than *slow_time* seconds to complete, or its completion is lost.
+    It is kept between 1 and *max_size* packets, the most the device
+    firmware can handle.
+
+    :param size: Initial window size.
+    :type size: int
+    :param max_size: Maximum window size.
+    :type max_size: int
+    :param slow_time: Completion time, in seconds, considered congestion.
+    :type slow_time: float
+    """
+    def __init__(self, size=3, max_size=5, slow_time=1.0):
+        self.size = float(min(size, max_size))
+        self.max_size = max_size
+        self.slow_time = slow_time
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.completed = 0
+        self.failed = 0
+        self.decreases = 0
+        self.reclaimed = 0
+        self.resets = 0
+        self.latency_total = 0
+        self.latency_max = 0
+        self.latency_recent = 0 # Moving average, weight of 1/8 for the last
+
+    def acquire(self, timeout=None):
+        """ Waits until a packet can be sent, and counts it as in flight.
+
+        :param timeout: Seconds to wait. Optional, defaults to no limit.
+        :type timeout: float
+
+        :return: False if the timeout expired.
+        :rtype: bool
+        """
+        with self.condition:
+            if not self.condition.wait_for(
+                    lambda: self.in_flight < int(self.size), timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def complete(self, latency):
+        """ Releases a packet completed after *latency* seconds. """
+        with self.condition:
+            self.completed += 1
+            self.latency_total += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+            self.latency_recent += (latency - self.latency_recent) / 8
+            if latency > self.slow_time:
+                self.decrease()
+            else:
+                self.size = min(self.size + 1 / self.size, self.max_size)
+            self.release()
+
+    def cancel(self):
+        """ Releases a packet that was not sent. """
+        with self.condition:
+            self.release()
+
+    def fail(self):
+        """ Releases a packet rejected by the device. """
+        with self.condition:
+            self.failed += 1
+            self.decrease()
+            self.release()
+
+    def reclaim(self, count, congestion=True):
+        """ Releases packets whose completion was lost.
+
+        :param count: Packets to release.
+        :type count: int
+        :param congestion: Decrease the window. Optional, defaults to True;
+            false if the packets were lost by a device reset.
+        :type congestion: bool
+        """
+        with self.condition:
+            self.reclaimed += count
+            if congestion:
+                self.decrease()
+            else:
+                self.resets += 1
+            self.in_flight -= count
+            self.condition.notify_all()
+
+    def decrease(self):
+        self.decreases += 1
+        self.size = max(self.size / 2, 1.0)
+
+    def release(self):
+        self.in_flight -= 1
+        self.condition.notify()
+
+    def get_stats(self):
+        """ Returns the window state and counters.
+
+        :return: Window size, packets in flight, packets completed and
+            failed, window decreases, packets reclaimed and device resets,
+            and average, maximum and recent average completion time, in
+            seconds.
+        :rtype: dict
+        """
+        with self.condition:
+            return {
+                "window": int(self.size),
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "decreases": self.decreases,
+                "reclaimed": self.reclaimed,
+                "resets": self.resets,
+                "latency_avg": (self.latency_total / self.completed
+                    if self.completed else 0),
+                "latency_max": self.latency_max,
+                "latency_recent": self.latency_recent,
+            }
+
+
 class TxManager:
     TTL = 127
     FORCE_SEGMENTED = False
     TRANSMIC_SIZE = 0
+    # Seconds until a packet without response or completion is lost
+    TX_TIMEOUT = 5
+    RECLAIM_PERIOD = 1
+    # Packets per turn of each traffic class, see FairQueue
+    WEIGHTS = {
+        TrafficClass.WAKE: 4,
+        TrafficClass.DATA: 2,
+        TrafficClass.BULK: 1,
+    }
 
-    def __init__(self, gateway):
+    def __init__(self, gateway, max_window=5, weights=None):
         self.gw = gateway
         self.handles = self.gw.dev_manager.handles
-        self.gw.add_event_handler(self.rsp_handler)
-        self.gw.add_event_handler(self.sent_handler)
+        self.gw.add_event_handler(self.sent_handler,
+            (EventType.MESH_TX_COMPLETE,))
+        self.gw.add_event_handler(self.reset_handler, (EventType.DEV_RESET,))
 
-        # Size 10 already fails on a nRF52832. 5 works, 3 for safety
-        self.semaphore = threading.Semaphore(3)
-        self.pending = set()
+        # Size 10 already fails on a nRF52832. 5 works, start with 3
+        self.window = SendWindow(3, max_window)
+        # Dict[command future, send time], packets waiting for RSP_SEND
+        self.sending = {}
+        self.pending = {} # Dict[token, send time], in send order
+        self.lock = threading.Lock()
+        self.next_reclaim = 0
 
-        self.send_queue = queue.Queue()
-        self.low_priority_queue = queue.Queue()
+        self.send_queue = FairQueue(dict(self.WEIGHTS, **(weights or {})),
+            self.gw.clock)
+        self.handle_queue = queue.Queue() # Queue[(function, node)]
         self.running = True
         threading.Thread(target=self._run, name="TxManager").start()
 
-    def rsp_handler(self, event):
-        if event.event_type == EventType.RSP_SEND:
-            if event.data["result"] == 0:
-                self.pending.add(event.data["token"])
-            else:
-                logger.warning("SEND failed: %d", event.data["result"])
-                self.semaphore.release()
+    def send_done(self, future):
+        """ Handles the response of a packet send, see
+        :func:`~ttgwlib.dev_manager.DeviceManager.send_cmd`.
+        """
+        with self.lock:
+            sent = self.sending.pop(future, None)
+        if sent is None:
+            # Reclaimed, its slot has been released already
+            return
+        error = future.exception()
+        if isinstance(error, GatewayError):
+            # Device reset, the packet was not sent
+            self.window.cancel()
+        elif error is not None:
+            logger.warning("SEND response lost")
+            self.window.reclaim(1)
+        elif future.result()["result"] != 0:
+            logger.warning("SEND failed: %d", future.result()["result"])
+            self.window.fail()
+        else:
+            with self.lock:
+                self.pending[future.result()["token"]] = sent
 
     def sent_handler(self, event):
         if event.event_type == EventType.MESH_TX_COMPLETE:
-            if event.data["token"] in self.pending:
-                self.pending.remove(event.data["token"])
-                self.semaphore.release()
+            with self.lock:
+                sent = self.pending.pop(event.data["token"], None)
+            if sent is not None:
+                self.window.complete(self.gw.clock.monotonic() - sent)
+
+    def reset_handler(self, event):
+        if event.event_type == EventType.DEV_RESET:
+            # Responses and completions of the packets in flight are lost
+            with self.lock:
+                lost = len(self.sending) + len(self.pending)
+                self.sending.clear()
+                self.pending.clear()
+            if lost:
+                logger.info("Device reset, %d packets in flight lost", lost)
+            self.window.reclaim(lost, congestion=False)
+
+    def reclaim(self):
+        """ Releases the window slots of the packets without response or
+        completion after :attr:`TX_TIMEOUT` seconds, so lost events do not
+        stall the sending.
+        """
+        deadline = self.gw.clock.monotonic() - self.TX_TIMEOUT
+        lost = 0
+        with self.lock:
+            # A late response is still given to its packet, and ignored
+            missing = [future for future, sent in self.sending.items()
+                if sent < deadline]
+            for future in missing:
+                del self.sending[future]
+            lost += len(missing)
+            expired = []
+            for token, sent in self.pending.items():
+                if sent >= deadline:
+                    break
+                expired.append(token)
+            for token in expired:
+                del self.pending[token]
+            lost += len(expired)
+        if lost:
+            logger.warning("%d packets not completed, reclaimed", lost)
+            self.window.reclaim(lost)
+
+    def get_stats(self):
+        """ Returns the send window state and counters, see
+        :func:`SendWindow.get_stats`, and the counters of each traffic
+        class, see :func:`FairQueue.get_stats`, in *classes*.
 
-    def send_node(self, data, node):
+        :return: Window and traffic class counters.
+        :rtype: dict
+        """
+        stats = self.window.get_stats()
+        stats["classes"] = self.send_queue.get_stats()
+        return stats
+
+    def send_node(self, data, node, traffic_class=TrafficClass.DATA,
+            deadline=None):
+        """ Queues a packet to a node.
+
+        :param data: Packet data.
+        :type data: bytes
+        :param node: Destination node.
+        :type node: :class:`~ttgwlib.node.Node`
+        :param traffic_class: Packet class. Optional, defaults to
+            :attr:`TrafficClass.DATA`.
+        :type traffic_class: :class:`TrafficClass`
+        :param deadline: Gateway clock time, as returned by its
+            ``monotonic`` function, the packet has to be sent before, see
+            :class:`FairQueue`. Optional, defaults to no deadline.
+        :type deadline: float
+        """
         if not self.gw.is_listener() and not self.gw.is_provisioner_mode():
-            self.send_queue.put((data, node))
+            self.send_queue.put(traffic_class, node, data, deadline)
 
     def send_addr(self, data, addr, low_priority=False):
         if low_priority:
-            self.low_priority_queue.put((data, addr))
+            self.send_queue.put(TrafficClass.BULK, addr, data)
         else:
-            self.send_queue.put((data, addr))
+            self.send_queue.put(TrafficClass.DATA, addr, data)
+
+    def prefetch(self, node):
+        """ Adds the handles of a node to the device in the background,
+        before sending messages to it, see
+        :func:`~ttgwlib.dev_manager.HandleManager.prefetch`.
+
+        :param node: Node expected to receive messages soon.
+        :type node: :class:`~ttgwlib.node.Node`
+        """
+        self.handle_queue.put((self.handles.prefetch, node))
+
+    def release(self, node):
+        """ Marks the handles of a node as the first to be removed, see
+        :func:`~ttgwlib.dev_manager.HandleManager.release`.
+
+        :param node: Node not expected to receive messages soon.
+        :type node: :class:`~ttgwlib.node.Node`
+        """
+        self.handle_queue.put((self.handles.release, node))
 
     def _run(self):
         while self.running:
-            try:
-                data, dst = self.send_queue.get(timeout=0.1)
-            except queue.Empty:
+            now = self.gw.clock.monotonic()
+            if now >= self.next_reclaim:
+                self.next_reclaim = now + self.RECLAIM_PERIOD
+                self.reclaim()
+
+            # Handles are changed from this thread only
+            while not self.handle_queue.empty():
+                function, node = self.handle_queue.get()
                 try:
-                    data, dst = self.low_priority_queue.get(timeout=0.1)
-                except queue.Empty:
-                    continue
+                    function(node)
+                except Exception:
+                    logger.exception("Handle update of node %s failed",
+                        node.unicast_addr)
 
-            while not self.semaphore.acquire(timeout=1):
+            if not self.send_queue.wait(timeout=0.1):
+                continue
+
+            while not self.window.acquire(timeout=1):
                 if not self.running:
-                    break
+                    return
+                self.reclaim()
 
-            if isinstance(dst, int):
-                self._send_addr(data, dst)
-            else:
-                self._send_node(data, dst)
+            # The packet is chosen once it can be sent, so packets queued
+            # while waiting are taken into account
+            packet = self.send_queue.get(self.window.latency_recent)
+            if packet is None:
+                # Every packet queued was dropped
+                self.window.cancel()
+                continue
+            data, dst = packet
+
+            try:
+                if isinstance(dst, int):
+                    msg = self._addr_packet(data, dst)
+                else:
+                    msg = self._node_packet(data, dst)
+            except Exception:
+                # The packet is dropped, the next one may be sent
+                logger.exception("Packet to %s failed",
+                    dst if isinstance(dst, int) else dst.unicast_addr)
+                self.window.cancel()
+                continue
+            self._send(msg)
 
-    def _send_node(self, data, node):
+    def _node_packet(self, data, node):
         key_handle = self.handles.get_devkey_handle(node)
         addr_handle = self.handles.get_address_handle(node.unicast_addr)
 
-        msg = commands.PacketSend(key_handle, self.gw.node_db.get_address(),
-            addr_handle, self.TTL, self.FORCE_SEGMENTED, self.TRANSMIC_SIZE,
-            data)
-        self.gw.dev_manager.send_cmd_wait_rsp(msg)
+        return commands.PacketSend(key_handle,
+            self.gw.node_db.get_address(), addr_handle, self.TTL,
+            self.FORCE_SEGMENTED, self.TRANSMIC_SIZE, data)
 
-    def _send_addr(self, data, addr):
+    def _addr_packet(self, data, addr):
         addr_handle = self.handles.get_address_handle(addr)
 
-        msg = commands.PacketSend(self.handles.appkey,
+        return commands.PacketSend(self.handles.appkey,
             self.gw.node_db.get_address(), addr_handle, self.TTL,
             self.FORCE_SEGMENTED, self.TRANSMIC_SIZE, data)
-        self.gw.dev_manager.send_cmd_wait_rsp(msg)
+
+    def _send(self, msg):
+        # The response is handled by send_done, so the next packet can be
+        # sent without waiting for it
+        sent = self.gw.clock.monotonic()
+        try:
+            future = self.gw.dev_manager.send_cmd(msg)
+        except Exception:
+            logger.exception("Packet send failed")
+            self.window.cancel()
+            return
+        with self.lock:
+            self.sending[future] = sent
+        # Called at once if already answered
+        future.add_done_callback(self.send_done)
 
     def stop(self):
         self.running = False
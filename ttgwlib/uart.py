@@ -13,6 +13,9 @@ import threading
 
 import serial
 
+from ttgwlib.frame_buffer import FrameBuffer, START_FRAME
+from ttgwlib.capture import RX, TX
+
 
 class Uart:
     """ Class to communicate with a device through UART, using the
@@ -20,21 +23,32 @@ class Uart:
     RTS/CTS flow control.
 
     The class initializes to threads, one for reading the port and
-    another one for writing. The reading thread reads the bytes one at
-    a time, and stores them in a queue. They can be get by the function
-    :function:`get_byte`. To write, a bytearray object can be passed
-    to the function :function:`send_msg`, which will store the message
-    in another queue. The messages will be sent one at a time, in
-    blocks of 40 bytes at maximun.
+    another one for writing. The reading thread reads every byte waiting
+    in the port at once into a :class:`~ttgwlib.frame_buffer.FrameBuffer`,
+    which splits them into frames. Complete frames are stored in a queue,
+    and they can be get by the function :function:`get_frame`. To write,
+    a bytearray object can be passed to the function :function:`send_msg`,
+    which will store the message in another queue. Every time the writing
+    thread wakes up, it takes all the queued messages at once and writes
+    them in blocks of :attr:`tx_chunk_size` bytes at maximun. The block
+    size is 40 bytes until the device reports its receive buffer size,
+    see :func:`set_tx_chunk_size`.
 
     :param logger: Logger.
     :type logger: :class:`logging.Logger`
     """
+    RX_BUFFER_SIZE = 4096
+    TX_CHUNK_SIZE = 40
+    TX_MAX_BURST = 4096
+
     def __init__(self, port):
         self.logger = logging.getLogger(__name__)
         self.serial = serial.Serial(port, baudrate=115200, rtscts=True,
             timeout=0.5)
         self.port = port
+        self.tx_chunk_size = self.TX_CHUNK_SIZE
+        self.capture = None
+        self.raw = False
         self.read_running = False
         self.write_running = False
         self.connected = False
@@ -48,6 +62,10 @@ class Uart:
         self.connected = True
         self.read_queue = queue.Queue()
         self.write_queue = queue.Queue()
+        self.rx_buffer = FrameBuffer(self.RX_BUFFER_SIZE, START_FRAME)
+        self.rx_pending = bytes()
+        self.rx_pending_index = 0
+        self.rx_discard = False # Set by clean, applied by the reader
         self.read_thd = threading.Thread(target=self.read, name='Reader')
         self.write_thd = threading.Thread(target=self.write, name='Writer')
         self.read_thd.start()
@@ -66,45 +84,88 @@ class Uart:
         """ Read loop function, executed by the thread. """
         self.serial.reset_input_buffer()
         while self.read_running:
-            msg = self.serial.read()
-            if msg:
+            # Blocks until at least one byte is received (or timeout)
+            size = max(self.serial.in_waiting, 1)
+            msg = self.serial.read(min(size, self.rx_buffer.free()))
+            if msg and self.raw:
                 self.read_queue.put(msg)
+            elif msg:
+                if self.rx_discard:
+                    self.rx_discard = False
+                    self.rx_buffer.discard()
+                self.rx_buffer.feed(msg)
+                # Frame views are only valid until the next read
+                for frame in self.rx_buffer.frames():
+                    if self.capture:
+                        self.capture.write(RX, frame)
+                    self.read_queue.put(bytes(frame))
 
     def write(self):
         """ Write loop function, excuted by the thread. """
         while self.write_running:
             try:
                 msg = self.write_queue.get(timeout=1)
-                for i in range(0, len(msg), 40):
-                    split = msg[i: i + 40]
-                    self.serial.write(split)
             except queue.Empty:
                 continue
+            self.write_burst(msg)
         # When the write_thread is closed, wait for read_thread to end
         self.read_thd.join()
         # Then, send any messages left
         while not self.write_queue.empty():
+            self.write_burst(self.write_queue.get())
+        self.serial.flush()
+        self.serial.close()
+
+    def write_burst(self, msg):
+        """ Writes the given message, together with every message already
+        waiting in the queue, in blocks of :attr:`tx_chunk_size` bytes.
+        The RTS/CTS flow control blocks the writes while the device is
+        not ready.
+        """
+        burst = bytearray(msg)
+        while len(burst) < self.TX_MAX_BURST:
             try:
-                msg = self.write_queue.get(timeout=1)
-                for i in range(0, len(msg), 40):
-                    split = msg[i: i + 40]
-                    self.serial.write(split)
+                burst += self.write_queue.get_nowait()
             except queue.Empty:
                 break
-        self.serial.flush()
-        self.serial.close()
+        view = memoryview(burst)
+        chunk_size = self.tx_chunk_size
+        for i in range(0, len(burst), chunk_size):
+            self.serial.write(view[i:i + chunk_size])
 
-    def get_byte(self, timeout=None):
-        """ Returns read bytes in order, one at a time.
+    def get_frame(self, timeout=None):
+        """ Returns read frames in order, one at a time. Each frame
+        includes its length byte.
 
-        :return: Read byte.
-        :rtype: bytearray
+        :return: Read frame, or empty if the timeout expires.
+        :rtype: bytes
         """
+        if self.rx_pending_index < len(self.rx_pending):
+            frame = self.rx_pending[self.rx_pending_index:]
+            self.rx_pending = bytes()
+            self.rx_pending_index = 0
+            return frame
         try:
             return self.read_queue.get(timeout=timeout)
         except queue.Empty:
             return bytes()
 
+    def get_byte(self, timeout=None):
+        """ Returns read bytes in order, one at a time. Kept for
+        compatibility, :function:`get_frame` should be used instead.
+
+        :return: Read byte, or empty if the timeout expires.
+        :rtype: bytes
+        """
+        if self.rx_pending_index >= len(self.rx_pending):
+            self.rx_pending = self.get_frame(timeout)
+            self.rx_pending_index = 0
+            if not self.rx_pending:
+                return bytes()
+        index = self.rx_pending_index
+        self.rx_pending_index += 1
+        return self.rx_pending[index:index + 1]
+
     def send_msg(self, msg):
         """ Sends a message.
 
@@ -112,10 +173,50 @@ class Uart:
         :type msg: bytes or bytearray
         """
         self.logger.log(9, f"TX: {msg.hex()}")
+        if self.capture:
+            self.capture.write(TX, msg)
         self.write_queue.put(msg)
 
+    def set_capture(self, capture):
+        """ Sets a capture, where every frame sent and received is
+        written. None to stop capturing.
+
+        :param capture: Capture writer.
+        :type capture: :class:`~ttgwlib.capture.CaptureWriter`
+        """
+        self.capture = capture
+
+    def set_raw(self, raw):
+        """ Enables the raw mode, where the bytes are queued as they are
+        received, without splitting them into frames, and
+        :func:`get_frame` returns them in the same chunks. Used to relay
+        the device bytes unchanged.
+
+        :param raw: Raw mode enabled.
+        :type raw: bool
+        """
+        self.raw = raw
+
+    def set_tx_chunk_size(self, size):
+        """ Sets the maximum number of bytes written at once. It should
+        not exceed the data credit reported by the device on start.
+
+        :param size: Block size, in bytes. Ignored if it is 0.
+        :type size: int
+        """
+        if size > 0:
+            self.tx_chunk_size = size
+
     def is_connected(self):
         return self.connected
 
     def clean(self):
+        """ Discards every byte received and not read yet, including a
+        partial frame in the receive buffer.
+        """
+        # The buffer is owned by the reader thread, which discards its
+        # bytes before adding the next ones received
+        self.rx_discard = True
         self.read_queue.queue.clear()
+        self.rx_pending = bytes()
+        self.rx_pending_index = 0
@@ -0,0 +1,288 @@
+"""
+ttgwlib.uart_async
+~~~~~~~~~~~~~~~~~~
+
+Asyncio communication module. Equivalent to :mod:`ttgwlib.uart` and
+:mod:`ttgwlib.uart_socket`, but driven by an asyncio event loop instead
+of reading and writing threads.
+
+"""
+import os
+import logging
+import socket
+
+import serial
+
+from ttgwlib.frame_buffer import FrameBuffer, START_FRAME
+from ttgwlib.capture import RX, TX
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTransport:
+    """ Base class for the asyncio transports. The file descriptor is
+    registered in the event loop, and it is read and written only when it
+    is ready, so no thread is needed. Received bytes are split into frames
+    by a :class:`~ttgwlib.frame_buffer.FrameBuffer`, and every complete
+    frame is passed to the receive handler, in the event loop thread. The
+    frames received before the handler is set are kept, and passed to it
+    once it is set.
+
+    Messages can be sent from any thread with :func:`send_msg`. They are
+    written in the event loop, in blocks of :attr:`tx_chunk_size` bytes at
+    maximun (see :func:`set_tx_chunk_size`).
+
+    It uses :func:`asyncio.AbstractEventLoop.add_reader`, so it needs a
+    selector based event loop (any POSIX platform).
+
+    :param loop: Event loop.
+    :type loop: :class:`asyncio.AbstractEventLoop`
+    """
+    RX_BUFFER_SIZE = 4096
+    TX_CHUNK_SIZE = 40
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.connected = False
+        self.rx_buffer = FrameBuffer(self.RX_BUFFER_SIZE, START_FRAME)
+        self.tx_buffer = bytearray()
+        self.tx_chunk_size = self.TX_CHUNK_SIZE
+        self.writing = False
+        self.closed = False
+        self.capture = None
+        self.rx_handler = None
+        self.rx_pending = [] # Frames waiting for the receive handler
+        self.disconnect_handler = lambda: None
+
+    def set_handlers(self, rx_handler, disconnect_handler):
+        """ Sets the functions called, in the event loop, when a frame is
+        received and when the connection is lost.
+
+        :param rx_handler: Receives every complete frame (bytes).
+        :type rx_handler: Callable
+        :param disconnect_handler: Called without parameters.
+        :type disconnect_handler: Callable
+        """
+        self.rx_handler = rx_handler
+        self.disconnect_handler = disconnect_handler
+        self.loop.call_soon_threadsafe(self._deliver_pending)
+
+    def start(self):
+        """ Registers the transport in the event loop. Thread safe. """
+        self.connected = True
+        self.loop.call_soon_threadsafe(self._attach)
+
+    def stop(self):
+        """ Sends any pending message and unregisters the transport from
+        the event loop. Thread safe.
+        """
+        self.connected = False
+        self.loop.call_soon_threadsafe(self._detach)
+
+    def send_msg(self, msg):
+        """ Sends a message. Thread safe.
+
+        :param msg: Message to be sent.
+        :type msg: bytes or bytearray
+        """
+        logger.log(9, f"TX: {msg.hex()}")
+        if self.capture:
+            self.capture.write(TX, msg)
+        self.loop.call_soon_threadsafe(self._write, bytes(msg))
+
+    def set_capture(self, capture):
+        """ Sets a capture, where every frame sent and received is
+        written. None to stop capturing.
+
+        :param capture: Capture writer.
+        :type capture: :class:`~ttgwlib.capture.CaptureWriter`
+        """
+        self.capture = capture
+
+    def set_tx_chunk_size(self, size):
+        """ Sets the maximum number of bytes written at once. It should
+        not exceed the data credit reported by the device on start.
+
+        :param size: Block size, in bytes. Ignored if it is 0.
+        :type size: int
+        """
+        if size > 0:
+            self.tx_chunk_size = size
+
+    def is_connected(self):
+        return self.connected
+
+    def clean(self):
+        self.rx_buffer.clear()
+
+    def fileno(self):
+        raise NotImplementedError
+
+    def _recv(self):
+        """ Reads the available bytes into the frame buffer. Returns False
+        if the connection has been closed.
+        """
+        raise NotImplementedError
+
+    def _send(self, data):
+        """ Writes as many bytes as possible without blocking, and returns
+        the number of bytes written.
+        """
+        raise NotImplementedError
+
+    def _flush(self):
+        """ Writes the pending messages, blocking. """
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    def _attach(self):
+        self.loop.add_reader(self.fileno(), self._on_readable)
+
+    def _detach(self):
+        self.loop.remove_reader(self.fileno())
+        if self.writing:
+            self.loop.remove_writer(self.fileno())
+            self.writing = False
+        if self.tx_buffer:
+            self._flush()
+        self._close()
+        self.closed = True
+
+    def _on_readable(self):
+        try:
+            alive = self._recv()
+        except (OSError, serial.SerialException):
+            logger.exception("Receive error")
+            alive = False
+        if not alive:
+            self.connected = False
+            self.loop.remove_reader(self.fileno())
+            self.disconnect_handler()
+            return
+        for frame in self.rx_buffer.frames():
+            if self.capture:
+                self.capture.write(RX, frame)
+            # Frame views are only valid until the next read
+            if self.rx_handler is None or self.rx_pending:
+                # Received before the handler, or before the frames kept
+                # are delivered
+                self.rx_pending.append(bytes(frame))
+            else:
+                self.rx_handler(bytes(frame))
+
+    def _deliver_pending(self):
+        frames, self.rx_pending = self.rx_pending, []
+        for frame in frames:
+            self.rx_handler(frame)
+
+    def _write(self, msg):
+        if self.closed:
+            return
+        self.tx_buffer += msg
+        if not self.writing:
+            self._on_writable()
+
+    def _on_writable(self):
+        while self.tx_buffer:
+            chunk = self.tx_buffer[:self.tx_chunk_size]
+            try:
+                sent = self._send(chunk)
+            except BlockingIOError:
+                sent = 0
+            del self.tx_buffer[:sent]
+            if sent < len(chunk):
+                break
+        if self.tx_buffer and not self.writing:
+            self.loop.add_writer(self.fileno(), self._on_writable)
+            self.writing = True
+        elif not self.tx_buffer and self.writing:
+            self.loop.remove_writer(self.fileno())
+            self.writing = False
+
+
+class AsyncUart(AsyncTransport):
+    """ Asyncio transport for a serial port, with the same configuration
+    as :class:`~ttgwlib.uart.Uart` (115200 bauds, RTS/CTS flow control).
+
+    :param port: Serial port.
+    :type port: str
+    :param loop: Event loop.
+    :type loop: :class:`asyncio.AbstractEventLoop`
+    """
+    def __init__(self, port, loop):
+        super().__init__(loop)
+        self.port = port
+        # Timeout 0: non blocking reads
+        self.serial = serial.Serial(port, baudrate=115200, rtscts=True,
+            timeout=0)
+        self.serial.reset_input_buffer()
+        self.start()
+
+    def fileno(self):
+        return self.serial.fileno()
+
+    def _recv(self):
+        size = max(self.serial.in_waiting, 1)
+        msg = self.serial.read(min(size, self.rx_buffer.free()))
+        if msg:
+            self.rx_buffer.feed(msg)
+        return True
+
+    def _send(self, data):
+        # The port is opened in non blocking mode by PySerial
+        return os.write(self.serial.fileno(), data)
+
+    def _flush(self):
+        self.serial.write(self.tx_buffer)
+        self.tx_buffer.clear()
+        self.serial.flush()
+
+    def _close(self):
+        self.serial.close()
+
+
+class AsyncUartSocket(AsyncTransport):
+    """ Asyncio transport for a connected network socket, equivalent to
+    :class:`~ttgwlib.uart_socket.UartSocket`.
+
+    :param _socket: Connected socket.
+    :type _socket: :class:`socket.socket`
+    :param loop: Event loop.
+    :type loop: :class:`asyncio.AbstractEventLoop`
+    """
+    def __init__(self, _socket, loop):
+        super().__init__(loop)
+        self.socket = _socket
+        self.socket.setblocking(False)
+        self.start()
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def _recv(self):
+        try:
+            size = self.socket.recv_into(self.rx_buffer.reserve())
+        except (BlockingIOError, InterruptedError):
+            return True
+        if not size:
+            logger.error("Receive error")
+            return False
+        self.rx_buffer.commit(size)
+        return True
+
+    def _send(self, data):
+        return self.socket.send(data)
+
+    def _flush(self):
+        self.socket.setblocking(True)
+        try:
+            self.socket.sendall(self.tx_buffer)
+        except socket.error:
+            logger.error("Send error: %d bytes lost", len(self.tx_buffer))
+        self.tx_buffer.clear()
+
+    def _close(self):
+        self.socket.close()
@@ -3,11 +3,16 @@ import logging
 import threading
 import socket
 
+from ttgwlib.frame_buffer import FrameBuffer, START_FRAME
+from ttgwlib.capture import RX, TX
+
 
 logger = logging.getLogger(__name__)
 
 
 class UartSocket:
+    RX_BUFFER_SIZE = 4096
+
     def __init__(self, _socket):
         self.socket = _socket
         self.socket.settimeout(20)
@@ -16,6 +21,12 @@ class UartSocket:
         self.connected = False
         self.read_queue = queue.Queue()
         self.write_queue = queue.Queue()
+        self.rx_buffer = FrameBuffer(self.RX_BUFFER_SIZE, START_FRAME)
+        self.rx_pending = bytes()
+        self.rx_pending_index = 0
+        self.rx_discard = False # Set by clean, applied by the reader
+        self.capture = None
+        self.raw = False
         self.read_thd = threading.Thread(target=self.read, name='Reader')
         self.write_thd = threading.Thread(target=self.write, name='Writer')
         self.start()
@@ -36,13 +47,24 @@ class UartSocket:
         """ Read loop function, executed by the thread. """
         while self.read_running:
             try:
-                msg = self.socket.recv(4096)
-                if not msg:
+                view = self.rx_buffer.reserve()
+                size = self.socket.recv_into(view)
+                if not size:
                     logger.error("Receive error")
                     self.connected = False
                     break
-                for b in msg:
-                    self.read_queue.put(int.to_bytes(b, 1, "little"))
+                if self.raw:
+                    self.read_queue.put(bytes(view[:size]))
+                    continue
+                if self.rx_discard:
+                    self.rx_discard = False
+                    self.rx_buffer.discard()
+                self.rx_buffer.commit(size)
+                # Frame views are only valid until the next receive
+                for frame in self.rx_buffer.frames():
+                    if self.capture:
+                        self.capture.write(RX, frame)
+                    self.read_queue.put(bytes(frame))
             except socket.timeout:
                 continue
 
@@ -65,15 +87,72 @@ class UartSocket:
             self.socket.sendall(msg)
         self.socket.close()
 
-    def get_byte(self, timeout=None):
+    def get_frame(self, timeout=None):
+        """ Returns read frames in order, one at a time. Each frame
+        includes its length byte.
+
+        :return: Read frame, or empty if the timeout expires.
+        :rtype: bytes
+        """
+        if self.rx_pending_index < len(self.rx_pending):
+            frame = self.rx_pending[self.rx_pending_index:]
+            self.rx_pending = bytes()
+            self.rx_pending_index = 0
+            return frame
         try:
             return self.read_queue.get(timeout=timeout)
         except queue.Empty:
             return bytes()
 
+    def get_byte(self, timeout=None):
+        """ Returns read bytes in order, one at a time. Kept for
+        compatibility, :function:`get_frame` should be used instead.
+
+        :return: Read byte, or empty if the timeout expires.
+        :rtype: bytes
+        """
+        if self.rx_pending_index >= len(self.rx_pending):
+            self.rx_pending = self.get_frame(timeout)
+            self.rx_pending_index = 0
+            if not self.rx_pending:
+                return bytes()
+        index = self.rx_pending_index
+        self.rx_pending_index += 1
+        return self.rx_pending[index:index + 1]
+
     def send_msg(self, msg):
         logger.log(9, f"TX: {msg.hex()}")
+        if self.capture:
+            self.capture.write(TX, msg)
         self.write_queue.put(msg)
 
+    def set_capture(self, capture):
+        self.capture = capture
+
+    def set_raw(self, raw):
+        """ Enables the raw mode, where the bytes are queued as they are
+        received, without splitting them into frames, see
+        :func:`~ttgwlib.uart.Uart.set_raw`.
+
+        :param raw: Raw mode enabled.
+        :type raw: bool
+        """
+        self.raw = raw
+
+    def set_tx_chunk_size(self, size):
+        # The remote end writes to the device, the socket is not split
+        pass
+
     def is_connected(self):
         return self.connected
+
+    def clean(self):
+        """ Discards every byte received and not read yet, including a
+        partial frame in the receive buffer.
+        """
+        # The buffer is owned by the reader thread, which discards its
+        # bytes before adding the next ones received
+        self.rx_discard = True
+        self.read_queue.queue.clear()
+        self.rx_pending = bytes()
+        self.rx_pending_index = 0